@@ -0,0 +1,177 @@
+import asyncio
+import itertools
+import time
+from collections import defaultdict
+
+import psycopg
+
+from metrics import metrics
+from pipeline_io import iter_json_file
+
+# =============================================================================
+# LOADER ASSÍNCRONO EM PIPELINE
+# Três estágios ligados por filas limitadas, rodando ao mesmo tempo:
+#   decodificação (thread) -> roteamento por tabela -> writers (AsyncConnection em pipeline mode)
+# Os writers usam COPY para staging + INSERT ... ON CONFLICT em vez de executemany: no psycopg
+# assíncrono o executemany paga uma espera no socket por linha e fica bem mais lento que o síncrono.
+# As filas limitadas fazem o backpressure: se o banco atrasa, a leitura do arquivo espera.
+# =============================================================================
+
+DEFAULT_DECODE_BLOCK = 2_000
+DEFAULT_ROWS_PER_WRITE = 5_000
+DEFAULT_QUEUE_SIZE = 4
+DEFAULT_WRITERS = 5
+
+# Marcador de fim de fluxo entre os estágios
+_END = object()
+
+def _next_block(iterator, size: int) -> list:
+    return list(itertools.islice(iterator, size))
+
+async def decode_stage(path: str, decoded_queue: asyncio.Queue, block_size: int):
+    # Lê e decodifica o lote em blocos numa thread, para não travar o event loop
+    iterator = iter_json_file(path)
+    try:
+        while True:
+            start_time = time.perf_counter()
+            block = await asyncio.to_thread(_next_block, iterator, block_size)
+            if not block:
+                break
+            metrics.observe_stage("read_parse", time.perf_counter() - start_time)
+            metrics.inc("events_read", len(block))
+            await decoded_queue.put(block)
+    finally:
+        iterator.close()
+        await decoded_queue.put(_END)
+
+async def route_stage(decoded_queue: asyncio.Queue, writer_queues: list, registry: dict,
+                      rows_per_write: int, stats: dict):
+    # Agrupa as linhas por tabela e envia blocos de rows_per_write para o writer dono da tabela.
+    # Cada tabela pertence a um único writer, então cada tabela fica em uma única transação.
+    routes = list(registry.values())
+    writer_for_table = {route.table: writer_queues[i % len(writer_queues)] for i, route in enumerate(routes)}
+    buffers = defaultdict(list)
+
+    while True:
+        block = await decoded_queue.get()
+        if block is _END:
+            break
+        start_time = time.perf_counter()
+        ready = []
+        days = stats["days"]
+        for event in block:
+            stats["events"] += 1
+            days.add(event.get('envelope_eventTimestamp', '')[:10])
+            route = registry.get(event.get('envelope_eventName'))
+            if route is None:
+                stats["unmatched"] += 1
+                continue
+            rows = buffers[route.table]
+            rows.append(route.extract(event))
+            if len(rows) >= rows_per_write:
+                ready.append((route, rows))
+                buffers[route.table] = []
+        # O tempo medido é só o de roteamento; a espera nas filas dos writers fica de fora
+        metrics.observe_stage("route", time.perf_counter() - start_time)
+        for route, rows in ready:
+            await writer_for_table[route.table].put((route, rows))
+
+    for route in routes:
+        queue = writer_for_table[route.table]
+        if buffers[route.table]:
+            await queue.put((route, buffers[route.table]))
+        # Avisa o writer que a tabela terminou (permite o commit por tabela)
+        await queue.put((route, _END))
+    for queue in writer_queues:
+        await queue.put(_END)
+
+async def write_rows(aconn, route, rows: list, staged_tables: set) -> int:
+    # COPY do bloco para uma tabela de staging da conexão (formatação das linhas feita em C pelo
+    # psycopg) e, em seguida, merge + limpeza do staging enviados juntos pelo pipeline mode
+    stage_table = f"stage_{route.table}"
+    column_list = ", ".join(route.columns)
+
+    async with aconn.cursor() as cur:
+        if route.table not in staged_tables:
+            await cur.execute(f"CREATE TEMP TABLE {stage_table} (LIKE {route.table} INCLUDING DEFAULTS)")
+            staged_tables.add(route.table)
+
+        async with cur.copy(f"COPY {stage_table} ({column_list}) FROM STDIN") as copy:
+            for row in rows:
+                await copy.write_row(row)
+
+        async with aconn.pipeline():
+            await cur.execute(
+                f"INSERT INTO {route.table} ({column_list}) SELECT {column_list} FROM {stage_table} "
+                f"ON CONFLICT DO NOTHING"
+            )
+            await aconn.execute(f"TRUNCATE {stage_table}")
+        return cur.rowcount
+
+async def writer_stage(conninfo: dict, queue: asyncio.Queue, commit_per_table: bool, stats: dict):
+    # Cada writer tem sua própria AsyncConnection e consome os blocos das tabelas que lhe pertencem
+    staged_tables = set()
+    async with await psycopg.AsyncConnection.connect(**conninfo) as aconn:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            route, rows = item
+            if rows is _END:
+                if commit_per_table:
+                    await aconn.commit()
+                continue
+
+            start_time = time.perf_counter()
+            inserted = await write_rows(aconn, route, rows, staged_tables)
+            table_stats = stats["tables"][route.table]
+            table_stats["rows"] += len(rows)
+            table_stats["inserted"] += inserted
+            elapsed = time.perf_counter() - start_time
+            table_stats["seconds"] += elapsed
+            metrics.observe_stage("db_insert", elapsed, table=route.table)
+            metrics.inc("rows_inserted", inserted, table=route.table)
+        await aconn.commit()
+
+async def load_file_pipelined(path: str, registry: dict, conninfo: dict, writers: int = DEFAULT_WRITERS,
+                              commit_per_table: bool = False, block_size: int = DEFAULT_DECODE_BLOCK,
+                              rows_per_write: int = DEFAULT_ROWS_PER_WRITE,
+                              queue_size: int = DEFAULT_QUEUE_SIZE) -> dict:
+    writers = max(1, min(writers, len(registry)))
+    decoded_queue = asyncio.Queue(maxsize=queue_size)
+    writer_queues = [asyncio.Queue(maxsize=queue_size) for _ in range(writers)]
+    stats = {
+        "events": 0,
+        "unmatched": 0,
+        "days": set(),  # dias (prefixo AAAA-MM-DD do timestamp) presentes no lote, para os rollups
+        "tables": defaultdict(lambda: {"rows": 0, "inserted": 0, "seconds": 0.0}),
+    }
+
+    tasks = [
+        asyncio.create_task(decode_stage(path, decoded_queue, block_size)),
+        asyncio.create_task(route_stage(decoded_queue, writer_queues, registry, rows_per_write, stats)),
+    ]
+    tasks += [asyncio.create_task(writer_stage(conninfo, queue, commit_per_table, stats)) for queue in writer_queues]
+
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # Se um estágio falha, os outros ficariam presos nas filas: cancela tudo
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return stats
+
+def run_pipelined_load(path: str, registry: dict, conninfo: dict, **options) -> tuple:
+    # Versão síncrona para o load_to_dw: retorna (eventos, inseridos, sem correspondência, dias do lote)
+    stats = asyncio.run(load_file_pipelined(path, registry, conninfo, **options))
+
+    for table, table_stats in stats["tables"].items():
+        seconds = table_stats["seconds"]
+        rate = table_stats["rows"] / seconds if seconds > 0 else float("inf")
+        print(f"   📦 {table}: {table_stats['inserted']} linhas em {seconds:.2f}s de escrita ({rate:,.0f} linhas/s)")
+
+    inserted = sum(table_stats["inserted"] for table_stats in stats["tables"].values())
+    metrics.inc("events_unmatched", stats["unmatched"])
+    return stats["events"], inserted, stats["unmatched"], stats["days"]
@@ -0,0 +1,196 @@
+import json
+import os
+import re
+
+from pipeline_io import MemberWriter, dump_ndjson_record, encoded_size
+
+# =============================================================================
+# LOTES EM SEGMENTOS
+# A saída NDJSON de uma execução é dividida em segmentos limitados por eventos e/ou bytes (antes da
+# compressão), com nomes numerados e únicos por execução:
+#   lote_processado_<execução>_<seq>.ndjson[.gz|.zst]
+#   lote_processado_<execução>@<parte>_<seq>.ndjson[.gz|.zst] -> ingestão distribuída: a parte é o arquivo de origem
+#   lote_processado_<execução>_<seq>.ndjson[.gz|.zst].index -> índice do segmento (JSON): eventos, bytes,
+#                                                          eventos por eventName, timestamps mín./máx. e dias
+# Cada segmento é um lote independente: loaders diferentes assumem segmentos diferentes e os carregam em
+# paralelo, com memória proporcional ao tamanho do segmento. Os segmentos só são publicados no close (o
+# índice antes do segmento), então a saída de um arquivo de origem com erro é descartada mesmo que já tenha
+# passado para o segmento seguinte.
+# =============================================================================
+
+SEGMENT_FORMAT = "unframed-segment"
+SEGMENT_VERSION = 1
+SEGMENT_INDEX_SUFFIX = ".index"
+DEFAULT_SEGMENT_EVENTS = 500_000
+
+# Nome de um lote numerado: prefixo da execução + parte opcional + sequência de 5 dígitos + extensão(ões)
+_SEGMENT_NAME = re.compile(r'^(?P<run>[^@]+?)(@(?P<part>[^@]+))?_\d{5}(?P<extension>(\.[A-Za-z0-9]+)+)$')
+# Campos lidos de uma linha NDJSON já serializada (merge das partes dos workers)
+_EVENT_NAME_FIELD = re.compile(r'"envelope_eventName":"([^"]*)"')
+_EVENT_TIMESTAMP_FIELD = re.compile(r'"envelope_eventTimestamp":"([^"]*)"')
+
+def segment_index_path(path: str) -> str:
+    return path + SEGMENT_INDEX_SUFFIX
+
+def segment_run(path: str) -> str:
+    # Execução que gravou o lote: o nome sem a sequência e a extensão (lotes não numerados são a própria execução)
+    name = os.path.basename(path)
+    match = _SEGMENT_NAME.match(name)
+    return match.group("run") if match else name.split('.', 1)[0]
+
+def segment_part(path: str) -> str:
+    # Parte de uma execução distribuída a que o segmento pertence, ou None
+    match = _SEGMENT_NAME.match(os.path.basename(path))
+    return match.group("part") if match else None
+
+def read_segment_index(path: str) -> dict:
+    # Índice de um segmento, ou None para lotes sem índice (colunares, JSON ou anteriores aos segmentos)
+    index_path = segment_index_path(path)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get("format") != SEGMENT_FORMAT or index.get("version") != SEGMENT_VERSION:
+        return None
+    return index
+
+class SegmentStats:
+    __slots__ = ("events", "bytes", "event_types", "days", "min_timestamp", "max_timestamp")
+
+    def __init__(self):
+        self.events = 0
+        self.bytes = 0
+        self.event_types = {}
+        self.days = set()
+        self.min_timestamp = None
+        self.max_timestamp = None
+
+    def add(self, event_name: str, timestamp: str, size: int):
+        self.events += 1
+        self.bytes += size
+        self.event_types[event_name] = self.event_types.get(event_name, 0) + 1
+        if timestamp:
+            self.days.add(timestamp[:10])
+            if self.min_timestamp is None or timestamp < self.min_timestamp:
+                self.min_timestamp = timestamp
+            if self.max_timestamp is None or timestamp > self.max_timestamp:
+                self.max_timestamp = timestamp
+
+    def copy(self):
+        stats = SegmentStats()
+        stats.events, stats.bytes = self.events, self.bytes
+        stats.event_types, stats.days = dict(self.event_types), set(self.days)
+        stats.min_timestamp, stats.max_timestamp = self.min_timestamp, self.max_timestamp
+        return stats
+
+    def to_index(self, path: str) -> dict:
+        return {
+            "format": SEGMENT_FORMAT,
+            "version": SEGMENT_VERSION,
+            "segment": os.path.basename(path),
+            "events": self.events,
+            "bytes": self.bytes,
+            "eventTypes": dict(sorted(self.event_types.items(), key=lambda item: str(item[0]))),
+            "minTimestamp": self.min_timestamp,
+            "maxTimestamp": self.max_timestamp,
+            "days": sorted(self.days),
+        }
+
+class SegmentWriter:
+    # Mesma interface do MemberWriter (begin/rollback_to/close), trocando de segmento ao atingir max_events
+    # ou max_bytes. path_for(sequência) devolve o caminho final de cada segmento. Com auto_roll=False o
+    # segmento só termina quando quem escreve chama roll (ex.: entre trechos, nos checkpoints).
+    def __init__(self, path_for, compression: str = None, max_events: int = None, max_bytes: int = None,
+                 auto_roll: bool = True):
+        self.path_for = path_for
+        self.compression = compression
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.auto_roll = auto_roll
+        self.segments = []  # [caminho final, SegmentStats]
+        self._writer = None
+        self._open_segment()
+
+    def _open_segment(self):
+        path = self.path_for(len(self.segments))
+        self._writer = MemberWriter(f"{path}.tmp", self.compression)
+        self.segments.append([path, SegmentStats()])
+
+    @property
+    def events(self) -> int:
+        return sum(stats.events for _, stats in self.segments)
+
+    def is_full(self) -> bool:
+        stats = self.segments[-1][1]
+        return (self.max_events is not None and stats.events >= self.max_events) or \
+               (self.max_bytes is not None and stats.bytes >= self.max_bytes)
+
+    def roll(self):
+        # Fecha o segmento atual (ainda como temporário) e abre o próximo, já com um membro aberto
+        if not self.segments[-1][1].events:
+            return
+        self._writer.close()
+        self._open_segment()
+        self._writer.begin()
+
+    # stream_file_to chama encode_record(evento achatado) e depois write(resultado)
+    def encode_record(self, record: dict) -> tuple:
+        return dump_ndjson_record(record), record.get('envelope_eventName'), record.get('envelope_eventTimestamp')
+
+    def write(self, item: tuple):
+        line, event_name, timestamp = item
+        self._writer.write(line)
+        self.segments[-1][1].add(event_name, timestamp, encoded_size(line))
+        if self.auto_roll and self.is_full():
+            self.roll()
+
+    def write_line(self, line: str):
+        # Linha NDJSON já serializada: o tipo e o timestamp do evento vêm da própria linha
+        event_name = _EVENT_NAME_FIELD.search(line)
+        timestamp = _EVENT_TIMESTAMP_FIELD.search(line)
+        self.write((line, event_name and event_name.group(1), timestamp and timestamp.group(1)))
+
+    # --- Savepoints: descartar a saída de um arquivo de origem que foi para a pasta de erro ---
+
+    def begin(self) -> tuple:
+        segment = len(self.segments) - 1
+        return segment, self._writer.begin(), self.segments[segment][1].copy()
+
+    def rollback_to(self, savepoint: tuple):
+        segment, position, stats = savepoint
+        if segment == len(self.segments) - 1:
+            self._writer.rollback_to(position)
+        else:
+            # A saída passou para segmentos seguintes: eles são apagados e o segmento do savepoint é reaberto
+            self._writer.close()
+            for path, _ in self.segments[segment + 1:]:
+                os.remove(f"{path}.tmp")
+            del self.segments[segment + 1:]
+            self._writer = MemberWriter(f"{self.segments[segment][0]}.tmp", self.compression, position=position)
+        self.segments[segment][1] = stats
+
+    # --- Publicação ---
+
+    def close(self) -> list:
+        # Publica os segmentos com eventos (índice primeiro, depois o segmento) e descarta os vazios.
+        # Devolve os caminhos publicados, na ordem.
+        self._writer.close()
+        published = []
+        for path, stats in self.segments:
+            temp_path = f"{path}.tmp"
+            if not stats.events:
+                os.remove(temp_path)
+                continue
+            index_path = segment_index_path(path)
+            with open(f"{index_path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(stats.to_index(path), f, ensure_ascii=False, indent=2)
+            os.replace(f"{index_path}.tmp", index_path)
+            os.replace(temp_path, path)
+            published.append(path)
+        return published
+
+    def abort(self):
+        self._writer.close()
+        for path, _ in self.segments:
+            if os.path.exists(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
@@ -0,0 +1,353 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from datetime import date, datetime, timedelta
+
+# =============================================================================
+# BENCHMARK PONTA A PONTA
+# Gera datasets determinísticos (seed fixa) com o gerador de jornadas e mede cada
+# estágio separadamente: geração, parse + transformação, serialização da saída e
+# carga em um banco PostgreSQL descartável. Cada estágio roda em um processo novo
+# (spawn) para que o pico de RSS seja só dele. O resultado é salvo em JSON e pode
+# ser comparado com uma execução anterior, falhando em caso de regressão.
+# =============================================================================
+
+BENCHMARKS_PATH = "benchmarks"
+DEFAULT_SIZES = "10k"
+DEFAULT_SEED = 42
+DEFAULT_MAX_REGRESSION = 0.10
+
+# Forma do dataset: jornadas por dia a partir de BENCH_START_DATE, em arquivos de até FILE_EVENTS eventos
+BENCH_START_DATE = date(2025, 1, 1)
+BENCH_JOURNEYS_PER_DAY = 10_000
+BENCH_FILE_EVENTS = 250_000
+
+SIZE_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+def parse_size(label: str) -> int:
+    # '10k' -> 10_000, '1m' -> 1_000_000, '2500' -> 2_500
+    label = label.strip().lower()
+    if label and label[-1] in SIZE_SUFFIXES:
+        return int(float(label[:-1]) * SIZE_SUFFIXES[label[-1]])
+    return int(label)
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+# =============================================================================
+# ESTÁGIOS (executados dentro do processo filho)
+# =============================================================================
+
+def generate_stage(landing_path: str, num_events: int, engine: str, seed: int) -> dict:
+    # Gera exatamente num_events eventos, dia após dia, com a seed derivada de cada dia
+    from event_generatorv3 import build_value_pools, iter_day_events
+    from pipeline_io import RotatingNdjsonWriter
+
+    pools = build_value_pools(seed) if engine == "bulk" else None
+    start_time = time.perf_counter()
+    days = (BENCH_START_DATE + timedelta(days=offset) for offset in itertools.count())
+    events = itertools.chain.from_iterable(
+        iter_day_events(day, BENCH_JOURNEYS_PER_DAY, engine, seed, pools) for day in days
+    )
+    with RotatingNdjsonWriter(landing_path, "bench", max_events=BENCH_FILE_EVENTS) as writer:
+        for event in itertools.islice(events, num_events):
+            writer.write(event)
+    return {
+        "generate": {
+            "events": writer.total_events,
+            "seconds": time.perf_counter() - start_time,
+            "bytes_written": directory_size(landing_path),
+        }
+    }
+
+def decoder_stage_suffix(decoder: str) -> str:
+    # A cadeia original mantém os nomes de estágio de antes (comparáveis com referências antigas)
+    return "" if decoder == "chain" else f"_{decoder}"
+
+def ingest_stage(landing_path: str, output_path: str, decoder: str = "chain") -> dict:
+    # Mesmo caminho do ingest_and_process em streaming, separando o tempo de parse + transformação
+    # (dentro do gerador transform_events, ou decode_events com o decodificador tipado) do tempo de
+    # serialização e escrita da saída. Os estágios do decodificador tipado ganham o sufixo _typed.
+    from event_decoder import EventDecoder
+    from ingest_and_process import decode_events, transform_events
+    from pipeline_io import dump_ndjson_record, iter_json_file, iter_json_lines
+
+    event_decoder = EventDecoder() if decoder == "typed" else None
+
+    clock = time.perf_counter
+    transform_seconds = 0.0
+    serialize_seconds = 0.0
+    events = 0
+
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for file_name in sorted(os.listdir(landing_path)):
+            source_path = os.path.join(landing_path, file_name)
+            if event_decoder is not None:
+                transformed = decode_events(iter_json_lines(source_path), event_decoder)
+            else:
+                transformed = transform_events(iter_json_file(source_path))
+            while True:
+                transform_start = clock()
+                flattened_event = next(transformed, None)
+                serialize_start = clock()
+                transform_seconds += serialize_start - transform_start
+                if flattened_event is None:
+                    break
+                out.write(dump_ndjson_record(flattened_event))
+                serialize_seconds += clock() - serialize_start
+                events += 1
+
+    suffix = decoder_stage_suffix(decoder)
+    return {
+        f"transform{suffix}": {"events": events, "seconds": transform_seconds},
+        f"serialize{suffix}": {"events": events, "seconds": serialize_seconds, "bytes_written": os.path.getsize(output_path)},
+    }
+
+def load_stage(batch_path: str, dbname: str, mode: str) -> dict:
+    # Recria as tabelas no banco descartável e carrega o lote com o modo pedido
+    import load_to_dw
+    from async_loader import run_pipelined_load
+    from event_schema import load_registry, render_ddl
+
+    load_to_dw.DB_NAME = dbname
+    registry = load_registry()
+    with load_to_dw.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(render_ddl())
+            load_to_dw.ensure_partitions(cur, load_to_dw.scan_batch_days(batch_path))
+        conn.commit()
+
+        start_time = time.perf_counter()
+        if mode == "pipeline":
+            events, inserted, _, _ = run_pipelined_load(batch_path, registry, load_to_dw.connection_params())
+        else:
+            batch = load_to_dw.read_batch(batch_path, registry)
+            events = batch.events
+            with conn.cursor() as cur:
+                inserted, _ = load_to_dw.load_events(cur, batch, registry, mode)
+            conn.commit()
+        seconds = time.perf_counter() - start_time
+
+    return {f"load_{mode}": {"events": events, "seconds": seconds, "rows_inserted": inserted}}
+
+STAGE_FUNCTIONS = {
+    "generate": generate_stage,
+    "ingest": ingest_stage,
+    "load": load_stage,
+}
+
+def _child_main(connection, stage: str, args: tuple, verbose: bool):
+    # Ponto de entrada do processo filho: roda o estágio e devolve o resultado com o pico de RSS
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+    try:
+        results = STAGE_FUNCTIONS[stage](*args)
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB no Linux
+        for result in results.values():
+            result["peak_rss_mb"] = round(peak_rss_mb, 1)
+        connection.send(("ok", results))
+    except BaseException:
+        connection.send(("error", traceback.format_exc()))
+    finally:
+        connection.close()
+
+def run_stage(stage: str, *args, verbose: bool = False) -> dict:
+    # Roda um estágio em um interpretador novo (spawn), isolando o pico de memória
+    context = multiprocessing.get_context("spawn")
+    parent_connection, child_connection = context.Pipe(duplex=False)
+    process = context.Process(target=_child_main, args=(child_connection, stage, args, verbose))
+    process.start()
+    child_connection.close()
+    try:
+        status, payload = parent_connection.recv()
+    except EOFError:
+        status, payload = "error", f"processo do estágio '{stage}' terminou sem resposta (código {process.exitcode})"
+    process.join()
+    if status != "ok":
+        raise RuntimeError(f"Estágio '{stage}' falhou:\n{payload}")
+
+    for result in payload.values():
+        seconds = result["seconds"]
+        result["events_per_s"] = round(result["events"] / seconds, 1) if seconds > 0 else None
+        result["seconds"] = round(seconds, 4)
+    return payload
+
+# =============================================================================
+# BANCO DESCARTÁVEL
+# =============================================================================
+
+def create_throwaway_database(name: str):
+    import psycopg
+    import load_to_dw
+
+    with psycopg.connect(**load_to_dw.connection_params(), autocommit=True) as conn:
+        conn.execute(f"DROP DATABASE IF EXISTS {name}")
+        conn.execute(f"CREATE DATABASE {name} ENCODING 'UTF8' TEMPLATE template0")
+
+def drop_throwaway_database(name: str):
+    import psycopg
+    import load_to_dw
+
+    with psycopg.connect(**load_to_dw.connection_params(), autocommit=True) as conn:
+        conn.execute(f"DROP DATABASE IF EXISTS {name}")
+
+# =============================================================================
+# RELATÓRIO E COMPARAÇÃO
+# =============================================================================
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results: dict):
+    print(f"\n{'tamanho':>8} {'estágio':<16} {'eventos':>11} {'segundos':>9} {'eventos/s':>12} {'pico RSS':>10} {'bytes':>14}")
+    for size_label, stages in results.items():
+        for stage, result in stages.items():
+            rate = f"{result['events_per_s']:,.0f}" if result["events_per_s"] else "-"
+            written = f"{result['bytes_written']:,}" if "bytes_written" in result else "-"
+            print(f"{size_label:>8} {stage:<16} {result['events']:>11,} {result['seconds']:>9.2f} {rate:>12} "
+                  f"{result['peak_rss_mb']:>8.0f}MB {written:>14}")
+
+def compare_with_baseline(results: dict, baseline: dict, max_regression: float) -> list:
+    # Uma regressão é um estágio cujo eventos/s caiu mais que max_regression em relação à referência
+    regressions = []
+    for size_label, stages in results.items():
+        for stage, result in stages.items():
+            reference = baseline.get("results", {}).get(size_label, {}).get(stage)
+            if not reference or not reference.get("events_per_s") or not result["events_per_s"]:
+                continue
+            change = result["events_per_s"] / reference["events_per_s"] - 1
+            flag = "❌" if change < -max_regression else "✅"
+            print(f"{flag} {size_label:>6} {stage:<16} {reference['events_per_s']:>12,.0f} -> "
+                  f"{result['events_per_s']:>12,.0f} eventos/s ({change:+.1%})")
+            if change < -max_regression:
+                regressions.append((size_label, stage, change))
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta do pipeline com datasets determinísticos.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help="Tamanhos dos datasets em eventos, separados por vírgula (ex.: 10k,1m,10m).")
+    parser.add_argument("--engine", choices=("classic", "bulk"), default="classic",
+                        help="Motor do gerador: 'classic' usa generate_random_journey; 'bulk' o motor vetorizado.")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--decoders", default="chain,typed",
+                        help="Decodificadores da ingestão medidos, separados por vírgula (chain, typed). "
+                             "A carga usa o lote do primeiro.")
+    parser.add_argument("--load-modes", default="pipeline",
+                        help="Modos de carga medidos, separados por vírgula (copy, insert, pipeline).")
+    parser.add_argument("--skip-load", action="store_true", help="Não mede a carga no PostgreSQL.")
+    parser.add_argument("--output", default=None,
+                        help=f"Arquivo JSON de resultado (padrão: {BENCHMARKS_PATH}/bench_<data>.json).")
+    parser.add_argument("--baseline", default=None, help="Resultado anterior (JSON) para comparação.")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION,
+                        help="Queda máxima de eventos/s tolerada por estágio em relação à referência (0.10 = 10%%).")
+    parser.add_argument("--keep-data", action="store_true", help="Mantém os arquivos gerados na pasta temporária.")
+    parser.add_argument("--verbose", action="store_true", help="Mostra a saída dos estágios.")
+    args = parser.parse_args(argv)
+
+    args.size_labels = [label.strip().lower() for label in args.sizes.split(",") if label.strip()]
+    try:
+        [parse_size(label) for label in args.size_labels]
+    except ValueError:
+        parser.error(f"--sizes inválido: {args.sizes}")
+    args.decoders = [decoder.strip() for decoder in args.decoders.split(",") if decoder.strip()]
+    invalid_decoders = [decoder for decoder in args.decoders if decoder not in ("chain", "typed")]
+    if invalid_decoders or not args.decoders:
+        parser.error(f"--decoders inválido: {args.decoders}")
+    args.load_modes = [mode.strip() for mode in args.load_modes.split(",") if mode.strip()]
+    invalid_modes = [mode for mode in args.load_modes if mode not in ("copy", "insert", "pipeline")]
+    if invalid_modes:
+        parser.error(f"--load-modes inválido: {invalid_modes}")
+    return args
+
+def main(argv=None):
+    from event_decoder import resolve_json_backend
+
+    args = parse_args(argv)
+    work_path = tempfile.mkdtemp(prefix="unframed_bench_")
+    database = f"unframed_bench_{os.getpid()}"
+    results = {}
+
+    try:
+        if not args.skip_load:
+            create_throwaway_database(database)
+
+        for size_label in args.size_labels:
+            num_events = parse_size(size_label)
+            landing_path = os.path.join(work_path, size_label, "landing_zone")
+            batch_paths = [os.path.join(work_path, size_label, f"lote_processado_{decoder}.ndjson") for decoder in args.decoders]
+            batch_path = batch_paths[0]
+            os.makedirs(landing_path)
+            stages = results[size_label] = {}
+
+            print(f"\n=== Dataset {size_label} ({num_events:,} eventos, seed {args.seed}, motor '{args.engine}') ===")
+            print("Gerando...")
+            stages.update(run_stage("generate", landing_path, num_events, args.engine, args.seed, verbose=args.verbose))
+            for decoder, decoder_batch_path in zip(args.decoders, batch_paths):
+                print(f"Transformando e serializando (decodificador '{decoder}')...")
+                stages.update(run_stage("ingest", landing_path, decoder_batch_path, decoder, verbose=args.verbose))
+            if not args.skip_load:
+                for mode in args.load_modes:
+                    print(f"Carregando (modo '{mode}')...")
+                    stages.update(run_stage("load", batch_path, database, mode, verbose=args.verbose))
+    finally:
+        if not args.skip_load:
+            drop_throwaway_database(database)
+        if args.keep_data:
+            print(f"\nArquivos do benchmark mantidos em '{work_path}'")
+        else:
+            shutil.rmtree(work_path, ignore_errors=True)
+
+    print_results(results)
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "engine": args.engine,
+            "decoders": args.decoders,
+            "json_backend": resolve_json_backend()[0] if "typed" in args.decoders else None,
+            "seed": args.seed,
+            "journeys_per_day": BENCH_JOURNEYS_PER_DAY,
+            "file_events": BENCH_FILE_EVENTS,
+            "load_modes": [] if args.skip_load else args.load_modes,
+        },
+        "results": results,
+    }
+    output_path = args.output or os.path.join(BENCHMARKS_PATH, f"bench_{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.json")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📊 Resultado salvo em '{output_path}'")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("config", {}).get("engine") != args.engine:
+            print("⚠️  A referência foi gerada com outro motor; a comparação pode não ser justa.")
+        print(f"\nComparando com '{args.baseline}' (queda máxima tolerada: {args.max_regression:.0%})...")
+        regressions = compare_with_baseline(results, baseline, args.max_regression)
+        if regressions:
+            print(f"\n❌ {len(regressions)} estágios com regressão acima de {args.max_regression:.0%}.")
+            sys.exit(1)
+        print("\n✅ Nenhuma regressão acima do limite.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import json
+import os
+
+# =============================================================================
+# JOURNAL DE CHECKPOINTS DA INGESTÃO
+# Arquivo NDJSON só de acréscimo (write-ahead) com o progresso de uma execução longa (backfill):
+#   {"type": "run", "id": ...}            -> execução que nomeia os chunks; uma retomada continua com o mesmo id
+#   {"type": "chunk", "path": ...}        -> chunk de saída aberto; se a execução cair, o .tmp dele é descartado
+#   {"type": "checkpoint", "chunk": ..., "events": n,
+#    "files": {nome: {"size": bytes, "offset": bytes, "done": bool}}}
+#                                         -> chunk publicado e estado (duplicados e jornadas) gravado
+#   {"type": "moved", "file": nome, "to": "archive" | "error"}
+# Cada linha é gravada com fsync e só depois do que ela descreve, então tudo o que o journal diz já está
+# em processed_data. Uma execução reiniciada retoma cada arquivo do último offset confirmado, move os
+# arquivos já concluídos sem reprocessá-los e perde no máximo o trabalho feito desde o último checkpoint.
+# Quando a execução termina, o journal é apagado.
+# =============================================================================
+
+DEFAULT_JOURNAL_PATH = "ingest_checkpoint.jsonl"
+DEFAULT_CHECKPOINT_INTERVAL = 60.0
+
+class CheckpointJournal:
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self.files = {}        # nome -> progresso do último checkpoint ({"size", "offset", "done"})
+        self.moved = {}        # nome -> destino ("archive" ou "error")
+        self.run_id = None     # execução dos chunks (lote_processado_<execução>_<seq>)
+        self.open_chunk = None
+        self.chunks = 0        # chunks já abertos (numeração dos próximos)
+        self.checkpoints = 0
+        self.resumed = os.path.exists(path)
+        self._load()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not self.resumed:
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # última linha cortada por uma queda durante a escrita
+                if entry["type"] == "run":
+                    self.run_id = entry["id"]
+                elif entry["type"] == "chunk":
+                    self.open_chunk = entry["path"]
+                    self.chunks += 1
+                elif entry["type"] == "checkpoint":
+                    self.files.update(entry["files"])
+                    self.open_chunk = None
+                    self.checkpoints += 1
+                elif entry["type"] == "moved":
+                    self.moved[entry["file"]] = entry["to"]
+
+    def _append(self, entry: dict):
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    # --- Consulta do progresso de uma execução anterior ---
+
+    def _entry(self, file_name: str, size: int) -> dict:
+        # Um arquivo com o mesmo nome mas outro tamanho é outro arquivo: começa do zero
+        entry = self.files.get(file_name)
+        return entry if entry is not None and entry["size"] == size else None
+
+    def is_done(self, file_name: str, size: int) -> bool:
+        entry = self._entry(file_name, size)
+        return entry is not None and entry["done"]
+
+    def resume_offset(self, file_name: str, size: int) -> int:
+        entry = self._entry(file_name, size)
+        return entry["offset"] if entry is not None and not entry["done"] else None
+
+    def discard_stale_chunk(self):
+        # O chunk aberto quando a execução anterior caiu nunca foi publicado
+        if self.open_chunk is not None:
+            for stale_path in (f"{self.open_chunk}.tmp", f"{self.open_chunk}.index"):
+                if os.path.exists(stale_path) and not os.path.exists(self.open_chunk):
+                    os.remove(stale_path)
+            self.open_chunk = None
+
+    # --- Registro do progresso desta execução ---
+
+    def run_started(self, run_id: str):
+        self._append({"type": "run", "id": run_id})
+        self.run_id = run_id
+
+    def chunk_opened(self, path: str):
+        self._append({"type": "chunk", "path": path})
+        self.open_chunk = path
+        self.chunks += 1
+
+    def checkpoint(self, chunk_path: str, events: int, progress: dict):
+        self._append({"type": "checkpoint", "chunk": chunk_path, "events": events, "files": progress})
+        self.files.update(progress)
+        self.open_chunk = None
+        self.checkpoints += 1
+
+    def file_moved(self, file_name: str, destination: str):
+        self._append({"type": "moved", "file": file_name, "to": destination})
+        self.moved[file_name] = destination
+
+    def finish(self):
+        # Execução concluída: nada a retomar
+        self._file.close()
+        os.remove(self.path)
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,214 @@
+import json
+import os
+import shutil
+from datetime import datetime
+
+from event_schema import extract_compact
+from pipeline_io import COMPRESSION_EXTENSIONS, dump_ndjson_record, open_text
+
+# =============================================================================
+# LOTE COLUNAR PARTICIONADO
+# Alternativa ao lote NDJSON: um diretório lote_processado_<instante>.cols com
+#   _manifest.json            -> lista dos chunks com tabela, dia, linhas e timestamps mín./máx.
+#   <tabela>_<dia>_<seq>.chunk -> eventos de um tipo e um dia (UTC), coluna por coluna
+#                                (.chunk.gz/.chunk.zst quando o lote é gravado com compressão)
+#   _unrouted.ndjson          -> eventos sem tabela no esquema (só existe se houver algum)
+# Cada chunk é autodescritivo: a primeira linha é um cabeçalho JSON (colunas, linhas, mín./máx.) e
+# cada linha seguinte é uma coluna inteira em JSON. Colunas categóricas são gravadas codificadas por
+# dicionário ({"dictionary": [...], "codes": [...]}). O loader lê os chunks já separados por tabela,
+# sem parse nem roteamento de eventos, e sabe pelo manifesto quais partições diárias o lote toca.
+# =============================================================================
+
+COLUMNAR_SUFFIX = ".cols"
+COLUMNAR_FORMAT = "unframed-columnar"
+COLUMNAR_VERSION = 1
+MANIFEST_FILE = "_manifest.json"
+UNROUTED_FILE = "_unrouted.ndjson"
+
+# Linhas por chunk: um tipo de evento em um dia com mais linhas que isso é dividido em vários chunks
+DEFAULT_CHUNK_ROWS = 100_000
+
+def is_columnar_batch(path: str) -> bool:
+    return path.endswith(COLUMNAR_SUFFIX) and os.path.isdir(path)
+
+def _dump_line(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+def dictionary_encode(values) -> dict:
+    codes_by_value = {}
+    dictionary = []
+    codes = []
+    for value in values:
+        code = codes_by_value.get(value)
+        if code is None:
+            code = codes_by_value[value] = len(dictionary)
+            dictionary.append(value)
+        codes.append(code)
+    return {"dictionary": dictionary, "codes": codes}
+
+def decode_column(column) -> list:
+    if isinstance(column, dict):
+        dictionary = column["dictionary"]
+        return [dictionary[code] for code in column["codes"]]
+    return column
+
+class ColumnarBatchWriter:
+    # Acumula as linhas de cada (tipo de evento, dia) e grava um chunk quando o grupo atinge
+    # chunk_rows (só entre arquivos de origem, ver flush_full_chunks) ou quando o lote é fechado.
+    # O lote é montado em um diretório temporário e publicado com um único os.replace.
+    def __init__(self, output_path: str, registry: dict, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                 compression: str = None):
+        self.output_path = output_path
+        self.temp_path = f"{output_path}.tmp"
+        self.registry = registry
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.chunks = []
+        self.events = 0
+        self._buffers = {}     # (eventName, dia) -> [linha]
+        self._sequence = {}    # (eventName, dia) -> próximo número de chunk
+        self._values = {}      # instância única de cada valor categórico
+        self._unrouted = None
+        self._unrouted_count = 0
+        os.makedirs(self.temp_path)
+
+    # stream_file_to chama encode_record(evento achatado) e depois write(resultado)
+    def encode_record(self, record: dict) -> tuple:
+        route = self.registry.get(record.get('envelope_eventName'))
+        if route is None:
+            return None, record
+        timestamp = record.get('envelope_eventTimestamp') or ''
+        return (route.event_name, timestamp[:10]), extract_compact(route, record, self._values)
+
+    def write(self, item: tuple):
+        key, row = item
+        if key is None:
+            if self._unrouted is None:
+                self._unrouted = open(os.path.join(self.temp_path, UNROUTED_FILE), 'w', encoding='utf-8')
+            self._unrouted.write(dump_ndjson_record(row))
+            self._unrouted_count += 1
+        else:
+            rows = self._buffers.get(key)
+            if rows is None:
+                rows = self._buffers[key] = []
+            rows.append(row)
+        self.events += 1
+
+    # --- Savepoints: descartar as linhas de um arquivo de origem que foi para a pasta de erro ---
+
+    def savepoint(self) -> tuple:
+        unrouted_position = self._unrouted.tell() if self._unrouted is not None else 0
+        return {key: len(rows) for key, rows in self._buffers.items()}, self.events, self._unrouted_count, unrouted_position
+
+    def rollback_to(self, savepoint: tuple):
+        lengths, self.events, self._unrouted_count, unrouted_position = savepoint
+        for key in list(self._buffers):
+            if key in lengths:
+                del self._buffers[key][lengths[key]:]
+            else:
+                del self._buffers[key]
+        if self._unrouted is not None:
+            self._unrouted.seek(unrouted_position)
+            self._unrouted.truncate()
+
+    # --- Escrita dos chunks ---
+
+    def _write_chunk(self, key: tuple):
+        event_name, day = key
+        rows = self._buffers.pop(key)
+        if not rows:
+            return
+        route = self.registry[event_name]
+        sequence = self._sequence.get(key, 0)
+        self._sequence[key] = sequence + 1
+        file_name = f"{route.table}_{day or 'sem-data'}_{sequence:03d}.chunk{COMPRESSION_EXTENSIONS[self.compression]}"
+
+        columns = list(zip(*rows))
+        timestamps = [timestamp for timestamp in columns[route.columns.index('envelope_eventTimestamp')] if timestamp]
+        header = {
+            "format": COLUMNAR_FORMAT,
+            "version": COLUMNAR_VERSION,
+            "table": route.table,
+            "eventName": event_name,
+            "day": day or None,
+            "rows": len(rows),
+            "minTimestamp": min(timestamps) if timestamps else None,
+            "maxTimestamp": max(timestamps) if timestamps else None,
+            "columns": route.columns,
+        }
+        chunk_path = os.path.join(self.temp_path, file_name)
+        with open_text(chunk_path, 'w', self.compression) as f:
+            f.write(_dump_line(header))
+            for position, values in enumerate(columns):
+                f.write(_dump_line(dictionary_encode(values) if position in route.categorical else values))
+
+        entry = {field: header[field] for field in ("table", "eventName", "day", "rows", "minTimestamp", "maxTimestamp")}
+        entry["file"] = file_name
+        entry["bytes"] = os.path.getsize(chunk_path)
+        self.chunks.append(entry)
+
+    def flush_full_chunks(self):
+        # Grava os grupos que já atingiram chunk_rows, limitando a memória do lote
+        for key in [key for key, rows in self._buffers.items() if len(rows) >= self.chunk_rows]:
+            self._write_chunk(key)
+
+    def close(self) -> bool:
+        # Grava os grupos restantes e o manifesto e publica o lote. Um lote vazio é descartado.
+        # Devolve True se o lote foi publicado.
+        for key in sorted(self._buffers):
+            self._write_chunk(key)
+        if self._unrouted is not None:
+            self._unrouted.close()
+            self._unrouted = None
+        if not self.events:
+            shutil.rmtree(self.temp_path)
+            return False
+
+        manifest = {
+            "format": COLUMNAR_FORMAT,
+            "version": COLUMNAR_VERSION,
+            "createdAt": datetime.now().isoformat(timespec='seconds'),
+            "events": self.events,
+            "unrouted": self._unrouted_count,
+            "chunks": self.chunks,
+        }
+        with open(os.path.join(self.temp_path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(self.temp_path, self.output_path)
+        return True
+
+    def abort(self):
+        if self._unrouted is not None:
+            self._unrouted.close()
+            self._unrouted = None
+        shutil.rmtree(self.temp_path, ignore_errors=True)
+
+# --- Leitura ---
+
+def read_manifest(path: str) -> dict:
+    with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get("format") != COLUMNAR_FORMAT or manifest.get("version") != COLUMNAR_VERSION:
+        raise ValueError(f"Lote colunar '{path}' em formato desconhecido: {manifest.get('format')} v{manifest.get('version')}")
+    return manifest
+
+def read_chunk(path: str, columns: list = None) -> tuple:
+    # Devolve (cabeçalho, linhas). Com columns, as linhas saem nessa ordem de colunas
+    # (colunas ausentes no chunk viram None).
+    with open_text(path) as f:
+        header = json.loads(f.readline())
+        data = [decode_column(json.loads(line)) for line in f]
+    if columns is not None and columns != header["columns"]:
+        by_name = dict(zip(header["columns"], data))
+        missing = [None] * header["rows"]
+        data = [by_name.get(column, missing) for column in columns]
+    return header, list(zip(*data))
+
+def batch_size(path: str, manifest: dict = None) -> int:
+    # Bytes de um lote colunar: soma dos chunks, do manifesto e dos eventos sem rota
+    manifest = manifest or read_manifest(path)
+    size = sum(chunk["bytes"] for chunk in manifest["chunks"]) + os.path.getsize(os.path.join(path, MANIFEST_FILE))
+    unrouted_path = os.path.join(path, UNROUTED_FILE)
+    if os.path.exists(unrouted_path):
+        size += os.path.getsize(unrouted_path)
+    return size
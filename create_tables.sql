@@ -1,3 +1,7 @@
+DROP TABLE IF EXISTS daily_activation;
+DROP TABLE IF EXISTS daily_active_users;
+DROP TABLE IF EXISTS load_manifest;
+DROP TABLE IF EXISTS journey_funnel;
 DROP TABLE IF EXISTS login_failed;
 DROP TABLE IF EXISTS login_succeeded;
 DROP TABLE IF EXISTS playback_started;
@@ -5,7 +9,7 @@ DROP TABLE IF EXISTS user_created;
 DROP TABLE IF EXISTS visitor_landed;
 
 CREATE TABLE visitor_landed (
-    envelope_eventId UUID PRIMARY KEY,
+    envelope_eventId UUID NOT NULL,
     envelope_eventTimestamp TIMESTAMPTZ NOT NULL,
     envelope_eventName VARCHAR(255) NOT NULL,
     envelope_eventVersion VARCHAR(50),
@@ -22,64 +26,119 @@ CREATE TABLE visitor_landed (
     payload_geolocation_country VARCHAR(100),
     payload_geolocation_region VARCHAR(100),
     payload_geolocation_city VARCHAR(255),
-    payload_browserLanguage VARCHAR(50)
-);
+    payload_browserLanguage VARCHAR(50),
+    PRIMARY KEY (envelope_eventId, envelope_eventTimestamp)
+) PARTITION BY RANGE (envelope_eventTimestamp);
 
 CREATE TABLE user_created (
-	envelope_eventId UUID PRIMARY KEY,
-	envelope_eventTimestamp TIMESTAMPTZ NOT NULL,
-	envelope_eventName VARCHAR(255) NOT NULL,
-	envelope_eventVersion VARCHAR(50),
-	envelope_source VARCHAR(255),
-	envelope_domain VARCHAR(255),
-	payload_userId TEXT NOT NULL,
-	payload_anonymousId TEXT NOT NULL,
-	payload_emailHash VARCHAR(255),
-	payload_initialPlanId VARCHAR(100),
-	payload_acquisitionChannel VARCHAR(100)
-);
+    envelope_eventId UUID NOT NULL,
+    envelope_eventTimestamp TIMESTAMPTZ NOT NULL,
+    envelope_eventName VARCHAR(255) NOT NULL,
+    envelope_eventVersion VARCHAR(50),
+    envelope_source VARCHAR(255),
+    envelope_domain VARCHAR(255),
+    payload_userId TEXT NOT NULL,
+    payload_anonymousId TEXT NOT NULL,
+    payload_emailHash VARCHAR(255),
+    payload_initialPlanId VARCHAR(100),
+    payload_acquisitionChannel VARCHAR(100),
+    PRIMARY KEY (envelope_eventId, envelope_eventTimestamp)
+) PARTITION BY RANGE (envelope_eventTimestamp);
 
 CREATE TABLE playback_started (
-	envelope_eventId UUID PRIMARY KEY,
-	envelope_eventTimestamp TIMESTAMPTZ NOT NULL,
-	envelope_eventName VARCHAR(255) NOT NULL,
-	envelope_eventVersion VARCHAR(50),
-	envelope_source VARCHAR(255),
-	envelope_domain VARCHAR(255),
-	payload_userId TEXT NOT NULL,
-	payload_profileId TEXT NOT NULL,
-	payload_playback_sessionid TEXT NOT NULL,
-	payload_videoId INTEGER NOT NULL,
-	payload_videoType VARCHAR(255),
-	payload_device_type VARCHAR(100),
-	payload_device_manufacturer VARCHAR(100),
-	payload_device_os VARCHAR(100),
-	payload_trigger VARCHAR(100),
-	payload_playbackStartTime INTEGER
-);
+    envelope_eventId UUID NOT NULL,
+    envelope_eventTimestamp TIMESTAMPTZ NOT NULL,
+    envelope_eventName VARCHAR(255) NOT NULL,
+    envelope_eventVersion VARCHAR(50),
+    envelope_source VARCHAR(255),
+    envelope_domain VARCHAR(255),
+    payload_userId TEXT NOT NULL,
+    payload_profileId TEXT NOT NULL,
+    payload_playbackSessionId TEXT NOT NULL,
+    payload_videoId INTEGER NOT NULL,
+    payload_videoType VARCHAR(255),
+    payload_device_type VARCHAR(100),
+    payload_device_manufacturer VARCHAR(100),
+    payload_device_os VARCHAR(100),
+    payload_trigger VARCHAR(100),
+    payload_playbackStartTime INTEGER,
+    PRIMARY KEY (envelope_eventId, envelope_eventTimestamp)
+) PARTITION BY RANGE (envelope_eventTimestamp);
 
 CREATE TABLE login_succeeded (
-	envelope_eventId UUID PRIMARY KEY,
-	envelope_eventTimestamp TIMESTAMPTZ NOT NULL,
-	envelope_eventName VARCHAR(255) NOT NULL,
-	envelope_eventVersion VARCHAR(50),
-	envelope_source VARCHAR(255),
-	envelope_domain VARCHAR(255),
-	payload_userId TEXT NOT NULL,
-	payload_loginType VARCHAR(100),
-	payload_isNewDevice BOOLEAN
-);
+    envelope_eventId UUID NOT NULL,
+    envelope_eventTimestamp TIMESTAMPTZ NOT NULL,
+    envelope_eventName VARCHAR(255) NOT NULL,
+    envelope_eventVersion VARCHAR(50),
+    envelope_source VARCHAR(255),
+    envelope_domain VARCHAR(255),
+    payload_userId TEXT NOT NULL,
+    payload_loginType VARCHAR(100),
+    payload_isNewDevice BOOLEAN,
+    PRIMARY KEY (envelope_eventId, envelope_eventTimestamp)
+) PARTITION BY RANGE (envelope_eventTimestamp);
 
 CREATE TABLE login_failed (
-	envelope_eventId UUID PRIMARY KEY,
-	envelope_eventTimestamp TIMESTAMPTZ NOT NULL,
-	envelope_eventName VARCHAR(255) NOT NULL,
-	envelope_eventVersion VARCHAR(50),
-	envelope_source VARCHAR(255),
-	envelope_domain VARCHAR(255),
-	payload_emailAttempted VARCHAR(100) NOT NULL,
-	payload_failureReason VARCHAR(100) NOT NULL,
-	payload_consecutiveFailureCount INTEGER
+    envelope_eventId UUID NOT NULL,
+    envelope_eventTimestamp TIMESTAMPTZ NOT NULL,
+    envelope_eventName VARCHAR(255) NOT NULL,
+    envelope_eventVersion VARCHAR(50),
+    envelope_source VARCHAR(255),
+    envelope_domain VARCHAR(255),
+    payload_emailAttempted VARCHAR(100) NOT NULL,
+    payload_failureReason VARCHAR(100) NOT NULL,
+    payload_consecutiveFailureCount INTEGER,
+    PRIMARY KEY (envelope_eventId, envelope_eventTimestamp)
+) PARTITION BY RANGE (envelope_eventTimestamp);
+
+CREATE TABLE journey_funnel (
+    envelope_eventId UUID NOT NULL,
+    envelope_eventTimestamp TIMESTAMPTZ NOT NULL,
+    envelope_eventName VARCHAR(255) NOT NULL,
+    envelope_eventVersion VARCHAR(50),
+    envelope_source VARCHAR(255),
+    envelope_domain VARCHAR(255),
+    payload_anonymousId TEXT NOT NULL,
+    payload_userId TEXT,
+    payload_funnelStage VARCHAR(20) NOT NULL,
+    payload_landedAt TIMESTAMPTZ,
+    payload_signedUpAt TIMESTAMPTZ,
+    payload_firstLoginAt TIMESTAMPTZ,
+    payload_firstPlaybackAt TIMESTAMPTZ,
+    payload_attribution_source VARCHAR(255),
+    payload_attribution_medium VARCHAR(255),
+    payload_attribution_campaign TEXT,
+    payload_device_type VARCHAR(100),
+    payload_geolocation_country VARCHAR(100),
+    PRIMARY KEY (envelope_eventId, envelope_eventTimestamp)
+) PARTITION BY RANGE (envelope_eventTimestamp);
+
+CREATE TABLE load_manifest (
+    batch_file TEXT NOT NULL,
+    batch_checksum CHAR(64) NOT NULL,
+    file_size BIGINT NOT NULL,
+    event_count INTEGER NOT NULL,
+    inserted_count INTEGER NOT NULL,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (batch_file, batch_checksum)
 );
 
+CREATE TABLE daily_active_users (
+    day DATE NOT NULL,
+    event_family VARCHAR(50) NOT NULL,
+    active_users INTEGER NOT NULL,
+    PRIMARY KEY (day, event_family)
+);
+
+CREATE TABLE daily_activation (
+    day DATE PRIMARY KEY,
+    signups INTEGER NOT NULL,
+    activated INTEGER NOT NULL
+);
 
+CREATE INDEX IF NOT EXISTS idx_user_created_user_ts ON user_created (payload_userId, envelope_eventTimestamp);
+CREATE INDEX IF NOT EXISTS idx_user_created_ts ON user_created (envelope_eventTimestamp);
+CREATE INDEX IF NOT EXISTS idx_playback_started_user_ts ON playback_started (payload_userId, envelope_eventTimestamp);
+CREATE INDEX IF NOT EXISTS idx_playback_started_ts ON playback_started (envelope_eventTimestamp);
+CREATE INDEX IF NOT EXISTS idx_login_succeeded_user_ts ON login_succeeded (payload_userId, envelope_eventTimestamp);
+CREATE INDEX IF NOT EXISTS idx_login_succeeded_ts ON login_succeeded (envelope_eventTimestamp);
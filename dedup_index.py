@@ -0,0 +1,242 @@
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+# =============================================================================
+# ÍNDICE PERSISTENTE DE eventIds JÁ VISTOS
+# Um shard por dia do evento (envelope.eventTimestamp), cada um com:
+#   <dia>.bloom.npy -> filtro de Bloom (bits), mantido inteiro em memória
+#   <dia>.ids.npy   -> array ordenado dos UUIDs (2 x n uint64: parte alta, parte baixa), lido via mmap
+# O filtro responde em O(1) "com certeza nunca visto" para quase todo evento novo; só quando ele
+# diz "talvez" a busca binária no array exato (mmap) decide. A retenção é por tempo de evento:
+# shards mais antigos que retention_days em relação ao dia mais recente são apagados.
+# =============================================================================
+
+DEFAULT_DEDUP_PATH = "dedup_index"
+DEFAULT_RETENTION_DAYS = 30
+
+# ~10 bits por id e 7 funções de hash: ~1% de falsos positivos no filtro (resolvidos pelo array exato)
+BLOOM_BITS_PER_ID = 10
+BLOOM_HASHES = 7
+BLOOM_MIN_BITS = 1 << 13
+# Um filtro reconstruído é dimensionado para BLOOM_GROWTH vezes os ids do shard: os commits seguintes
+# só ligam os bits dos ids novos, até o shard passar dessa capacidade
+BLOOM_GROWTH = 2
+MASK64 = (1 << 64) - 1
+
+class InvalidEventKey(ValueError):
+    # eventId ou timestamp que não servem de chave do índice: quem consulta trata o evento como inválido.
+    # column é a coluna do evento achatado com o problema.
+    def __init__(self, column: str):
+        super().__init__(column)
+        self.column = column
+
+def uuid_key(event_id: str) -> int:
+    # UUID textual -> inteiro de 128 bits (levanta ValueError se não for um UUID)
+    if len(event_id) != 36:
+        raise ValueError(f"eventId inválido: {event_id!r}")
+    return int(event_id.replace('-', ''), 16)
+
+def _bloom_positions(high, low, num_bits: int):
+    # Posições dos bits de cada id (vetorizado). Os UUIDs já são aleatórios, então as próprias
+    # metades servem de hash (double hashing: low + i * high), com aritmética uint64 que dá a volta.
+    hashes = np.arange(BLOOM_HASHES, dtype=np.uint64)[:, None]
+    with np.errstate(over='ignore'):
+        return (low[None, :] + hashes * high[None, :]) % np.uint64(num_bits)
+
+def build_bloom(ids: np.ndarray, capacity: int = None) -> np.ndarray:
+    num_bits = max(BLOOM_MIN_BITS, -(-max(capacity or 0, ids.shape[1]) * BLOOM_BITS_PER_ID // 8) * 8)
+    bitset = np.zeros(num_bits, dtype=bool)
+    bitset[_bloom_positions(ids[0], ids[1], num_bits).ravel()] = True
+    return np.packbits(bitset, bitorder='little')
+
+def extend_bloom(bits: bytearray, num_bits: int, ids: np.ndarray) -> np.ndarray:
+    # Filtro existente com os bits dos ids novos ligados (sem recalcular os ids antigos)
+    packed = np.frombuffer(bytes(bits), dtype=np.uint8).copy()
+    positions = _bloom_positions(ids[0], ids[1], num_bits).ravel()
+    np.bitwise_or.at(packed, (positions >> np.uint64(3)).astype(np.intp),
+                     np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+    return packed
+
+# Chave (parte alta, parte baixa) comparável como um valor só, para o merge de arrays ordenados
+_KEY_DTYPE = np.dtype([('high', '<u8'), ('low', '<u8')])
+
+def _as_keys(ids: np.ndarray) -> np.ndarray:
+    keys = np.empty(ids.shape[1], dtype=_KEY_DTYPE)
+    keys['high'], keys['low'] = ids[0], ids[1]
+    return keys
+
+def merge_sorted_ids(ids: np.ndarray, new_ids: np.ndarray) -> np.ndarray:
+    # Intercala os ids novos (já ordenados) no array ordenado do shard, sem reordenar o array inteiro
+    positions = np.searchsorted(_as_keys(ids), _as_keys(new_ids))
+    return np.insert(ids, positions, new_ids, axis=1)
+
+def _save_atomic(path: str, array: np.ndarray):
+    temp_path = f"{path}.tmp.npy"
+    np.save(temp_path, array)
+    os.replace(temp_path, path)
+
+class EventIdIndex:
+    def __init__(self, path: str = DEFAULT_DEDUP_PATH, retention_days: int = DEFAULT_RETENTION_DAYS,
+                 read_only: bool = False):
+        self.path = path
+        self.retention_days = retention_days
+        self.read_only = read_only
+        self._blooms = {}    # dia -> (bytearray com os bits, número de bits)
+        self._ids = {}       # dia -> array 2 x n (mmap)
+        self._pending = {}   # dia -> set de ids aceitos ainda não persistidos
+        self._journal = []   # (dia, id) na ordem em que foram aceitos, para savepoint/rollback
+        self._valid_days = set()
+        self._horizon = None
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+        if os.path.isdir(path):
+            for file_name in sorted(os.listdir(path)):
+                if file_name.endswith(".ids.npy"):
+                    self._load_shard(file_name[:-len(".ids.npy")])
+        self._update_horizon()
+
+    def _shard_paths(self, day: str) -> tuple:
+        return os.path.join(self.path, f"{day}.bloom.npy"), os.path.join(self.path, f"{day}.ids.npy")
+
+    def _load_shard(self, day: str):
+        bloom_path, ids_path = self._shard_paths(day)
+        bits = np.load(bloom_path)
+        self._blooms[day] = (bytearray(bits.tobytes()), len(bits) * 8)
+        self._ids[day] = np.load(ids_path, mmap_mode='r')
+        self._valid_days.add(day)
+
+    def _update_horizon(self):
+        days = set(self._ids) | set(self._pending)
+        if days:
+            newest = date.fromisoformat(max(days))
+            self._horizon = (newest - timedelta(days=self.retention_days)).isoformat()
+
+    def __len__(self) -> int:
+        return sum(ids.shape[1] for ids in self._ids.values()) + sum(len(ids) for ids in self._pending.values())
+
+    def _in_shard(self, day: str, value: int) -> bool:
+        bloom = self._blooms.get(day)
+        if bloom is None:
+            return False
+        bits, num_bits = bloom
+        high, low = value >> 64, value & MASK64
+        for i in range(BLOOM_HASHES):
+            position = ((low + i * high) & MASK64) % num_bits
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+
+        # O filtro diz "talvez": confirma no array exato
+        ids = self._ids[day]
+        start = int(np.searchsorted(ids[0], np.uint64(high), side='left'))
+        while start < ids.shape[1] and int(ids[0, start]) == high:
+            if int(ids[1, start]) == low:
+                return True
+            start += 1
+        return False
+
+    def check_key(self, day: str, value: int) -> bool:
+        # True se o id já foi visto (duplicado); caso contrário registra o id como pendente.
+        # Ids de dias além da retenção não podem ser verificados e passam como novos, sem entrar no
+        # índice. Todo id aceito vai para o journal, na mesma ordem dos eventos emitidos.
+        if day not in self._valid_days:
+            try:
+                date.fromisoformat(day)  # valida o dia só na primeira vez que aparece
+            except (TypeError, ValueError):
+                raise InvalidEventKey("envelope_eventTimestamp") from None
+            self._valid_days.add(day)
+        if self._horizon is not None and day < self._horizon:
+            self._journal.append((day, value))
+            return False
+
+        pending = self._pending.get(day)
+        if pending is not None and value in pending:
+            return True
+        if self._in_shard(day, value):
+            return True
+
+        if pending is None:
+            pending = self._pending[day] = set()
+            self._update_horizon()
+        pending.add(value)
+        self._journal.append((day, value))
+        return False
+
+    def seen_or_add(self, event_id: str, event_timestamp: str) -> bool:
+        # Levanta InvalidEventKey (sem alterar o índice) se o eventId ou o timestamp forem malformados
+        try:
+            value = uuid_key(event_id)
+        except (TypeError, ValueError):
+            raise InvalidEventKey("envelope_eventId") from None
+        if event_timestamp.__class__ is not str:
+            raise InvalidEventKey("envelope_eventTimestamp")
+        return self.check_key(event_timestamp[:10], value)
+
+    def is_expired(self, event_timestamp: str) -> bool:
+        return self._horizon is not None and event_timestamp[:10] < self._horizon
+
+    # --- Savepoints: descartar os ids de um arquivo que foi para a pasta de erro ---
+
+    def savepoint(self) -> int:
+        return len(self._journal)
+
+    def journal_since(self, savepoint: int) -> list:
+        return self._journal[savepoint:]
+
+    def rollback_to(self, savepoint: int):
+        for day, value in self._journal[savepoint:]:
+            pending = self._pending.get(day)
+            if pending is not None:
+                pending.discard(value)
+        del self._journal[savepoint:]
+
+    # --- Persistência ---
+
+    def commit(self):
+        # Grava os ids pendentes nos shards. O filtro é salvo antes do array exato: se o processo
+        # cair entre as duas escritas, o filtro fica com bits a mais (nunca a menos).
+        if self.read_only:
+            raise RuntimeError("Índice de deduplicação aberto somente para leitura.")
+
+        # Só os ids novos são ordenados e passados pelo filtro; o shard existente recebe um merge linear e o
+        # filtro só é reconstruído (com folga de BLOOM_GROWTH) quando o shard passa da capacidade dele.
+        for day, pending in self._pending.items():
+            if not pending:
+                continue
+            new_ids = np.array([
+                np.fromiter((value >> 64 for value in pending), dtype=np.uint64, count=len(pending)),
+                np.fromiter((value & MASK64 for value in pending), dtype=np.uint64, count=len(pending)),
+            ])
+            new_ids = new_ids[:, np.lexsort((new_ids[1], new_ids[0]))]
+            if day in self._ids:
+                ids = merge_sorted_ids(np.asarray(self._ids[day]), new_ids)
+                bits, num_bits = self._blooms[day]
+                if ids.shape[1] * BLOOM_BITS_PER_ID <= num_bits:
+                    bloom = extend_bloom(bits, num_bits, new_ids)
+                else:
+                    bloom = build_bloom(ids, ids.shape[1] * BLOOM_GROWTH)
+            else:
+                ids = new_ids
+                bloom = build_bloom(ids, ids.shape[1] * BLOOM_GROWTH)
+
+            bloom_path, ids_path = self._shard_paths(day)
+            self._ids.pop(day, None)  # libera o mmap antes de substituir o arquivo
+            _save_atomic(bloom_path, bloom)
+            _save_atomic(ids_path, ids)
+            self._load_shard(day)
+
+        self._pending.clear()
+        self._journal.clear()
+        self._update_horizon()
+        self.expire()
+
+    def expire(self) -> list:
+        # Retenção: apaga os shards de dias anteriores ao horizonte
+        expired = [day for day in self._ids if self._horizon is not None and day < self._horizon]
+        for day in expired:
+            self._ids.pop(day)
+            self._blooms.pop(day)
+            for shard_path in self._shard_paths(day):
+                os.remove(shard_path)
+        return expired
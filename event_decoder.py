@@ -0,0 +1,287 @@
+import argparse
+import json
+import re
+from collections import Counter
+from datetime import datetime, timezone
+
+from event_schema import ENVELOPE_FIELDS, EVENT_NAME_CORRECTIONS, EVENT_SPECS, column_name
+from metrics import metrics, rate_limited_print
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional: sem o pacote, o decodificador usa o json da biblioteca padrão
+    orjson = None
+
+# =============================================================================
+# DECODIFICADOR TIPADO DE EVENTOS
+# Substitui a cadeia json.loads -> validate_event -> clean_event -> flatten_event da ingestão por uma
+# única passada por evento. Para cada eventName da especificação (event_schema.EVENT_SPECS) é gerada uma
+# função Python própria, com os campos do envelope e do payload desenrolados em sequência:
+#   - lê cada campo direto do objeto decodificado pelo backend JSON e grava na linha achatada
+#     (chave = coluna da tabela, a mesma do flatten_event), sem recursão nem cópia intermediária
+#   - campos NOT NULL ausentes ou nulos, tipos errados e textos maiores que o VARCHAR invalidam o evento
+#   - UUID, timestamp, inteiro e booleano são convertidos quando chegam em outra forma aceitável
+#     (UUID em maiúsculas, timestamp em epoch, número em string, "true"/"false")
+# O eventName é corrigido pela tabela EVENT_NAME_CORRECTIONS antes de escolher a função. Campos fora da
+# especificação não vão para a linha (o loader não tem coluna para eles); eventos de um eventName sem
+# especificação são achatados por inteiro, como na cadeia original, com o envelope validado.
+# O código gerado de um evento pode ser inspecionado com: python event_decoder.py --show <eventName>
+# =============================================================================
+
+# Backends JSON disponíveis (nome -> função loads que aceita bytes ou str) e ordem de preferência do 'auto'
+JSON_BACKENDS = {"json": json.loads}
+if orjson is not None:
+    JSON_BACKENDS["orjson"] = orjson.loads
+JSON_BACKEND_PREFERENCE = ("orjson", "json")
+JSON_BACKEND_CHOICES = ("auto",) + JSON_BACKEND_PREFERENCE
+
+# Faixas dos tipos inteiros do PostgreSQL
+INTEGER_RANGES = {
+    "SMALLINT": (-(1 << 15), (1 << 15) - 1),
+    "INTEGER": (-(1 << 31), (1 << 31) - 1),
+    "BIGINT": (-(1 << 63), (1 << 63) - 1),
+}
+
+# Motivo de rejeição de um evento sem envelope/payload em forma de objeto
+STRUCTURE = "estrutura"
+
+_UUID = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}').fullmatch
+_TIMESTAMP = re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(:\d{2}(\.\d{1,9})?)?(Z|[+-]\d{2}(:?\d{2})?)?').fullmatch
+_LENGTH_LIMIT = re.compile(r'^(?:VARCHAR|CHAR)\((\d+)\)$')
+
+def register_json_backend(name: str, loads):
+    # Permite plugar outro parser JSON (ex.: msgspec.json.decode); loads recebe bytes ou str
+    JSON_BACKENDS[name] = loads
+
+def resolve_json_backend(name: str = "auto") -> tuple:
+    # Devolve (nome, loads) do backend pedido; 'auto' escolhe o primeiro instalado da ordem de preferência
+    if name == "auto":
+        name = next(backend for backend in JSON_BACKEND_PREFERENCE if backend in JSON_BACKENDS)
+    if name not in JSON_BACKENDS:
+        raise RuntimeError(f"Backend JSON '{name}' indisponível (pip install {name}).")
+    return name, JSON_BACKENDS[name]
+
+class InvalidEvent(ValueError):
+    # Evento rejeitado pelo decodificador; column é a coluna (ou parte do evento) que falhou
+    def __init__(self, column: str):
+        super().__init__(column)
+        self.column = column
+
+# --- Conversões fora do caminho rápido (o valor não chegou no tipo esperado) ---
+
+def _coerce_text(value, column: str) -> str:
+    if value.__class__ is int or value.__class__ is float:
+        return str(value)
+    raise InvalidEvent(column)
+
+def _coerce_integer(value, column: str) -> int:
+    if value.__class__ is float and value.is_integer():
+        return int(value)
+    if value.__class__ is str:
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise InvalidEvent(column)
+
+def _coerce_boolean(value, column: str) -> bool:
+    if value.__class__ is str:
+        lowered = value.lower()
+        if lowered == "true" or lowered == "false":
+            return lowered == "true"
+    raise InvalidEvent(column)
+
+def _coerce_uuid(value, column: str) -> str:
+    if value.__class__ is str:
+        value = value.lower()
+        if _UUID(value):
+            return value
+    raise InvalidEvent(column)
+
+def _coerce_timestamp(value, column: str) -> str:
+    # Epoch em segundos -> ISO 8601 em UTC, no mesmo formato do gerador
+    if value.__class__ is int or value.__class__ is float:
+        try:
+            return datetime.fromtimestamp(value, timezone.utc).isoformat().replace('+00:00', 'Z')
+        except (OverflowError, OSError, ValueError):
+            pass
+    raise InvalidEvent(column)
+
+def _flatten(d: dict, prefix: str = '', flattened: dict = None) -> dict:
+    # Achatamento genérico (mesmas chaves do flatten_event), só para eventos sem especificação
+    if flattened is None:
+        flattened = {}
+    for key, value in d.items():
+        if value.__class__ is dict:
+            _flatten(value, f"{prefix}{key}_", flattened)
+        else:
+            flattened[f"{prefix}{key}"] = value
+    return flattened
+
+# =============================================================================
+# GERAÇÃO DO CÓDIGO
+# =============================================================================
+
+def field_type(sql_type: str) -> tuple:
+    # (tipo do campo, limite, obrigatório) a partir do tipo SQL da especificação
+    required = "NOT NULL" in sql_type.upper()
+    base = sql_type.split()[0].upper()
+    if base == "UUID":
+        return "uuid", None, required
+    if base in ("TIMESTAMPTZ", "TIMESTAMP"):
+        return "timestamp", None, required
+    if base in INTEGER_RANGES:
+        return "integer", INTEGER_RANGES[base], required
+    if base == "BOOLEAN":
+        return "boolean", None, required
+    if base == "TEXT":
+        return "text", None, required
+    match = _LENGTH_LIMIT.match(base)
+    if match:
+        return "text", int(match.group(1)), required
+    raise ValueError(f"Tipo SQL sem decodificação: {sql_type}")
+
+def _coerce_lines(kind: str, limit, column: str) -> list:
+    if kind == "text":
+        lines = ["if value.__class__ is not str:", f"    value = _coerce_text(value, {column!r})"]
+        if limit is not None:
+            lines += [f"if len(value) > {limit}:", f"    raise InvalidEvent({column!r})"]
+        return lines
+    if kind == "integer":
+        low, high = limit
+        return ["if value.__class__ is not int:", f"    value = _coerce_integer(value, {column!r})",
+                f"if not {low} <= value <= {high}:", f"    raise InvalidEvent({column!r})"]
+    if kind == "boolean":
+        return ["if value.__class__ is not bool:", f"    value = _coerce_boolean(value, {column!r})"]
+    if kind == "uuid":
+        return ["if value.__class__ is not str or _UUID(value) is None:", f"    value = _coerce_uuid(value, {column!r})"]
+    return ["if value.__class__ is not str or _TIMESTAMP(value) is None:",
+            f"    value = _coerce_timestamp(value, {column!r})"]
+
+def _field_tree(fields: list) -> dict:
+    # [(caminho com pontos, tipo SQL)] -> árvore {chave: tipo SQL | subárvore}, na ordem da especificação
+    tree = {}
+    for path, sql_type in fields:
+        node = tree
+        *parents, leaf = path.split('.')
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[leaf] = sql_type
+    return tree
+
+def _has_required(node) -> bool:
+    if isinstance(node, dict):
+        return any(_has_required(child) for child in node.values())
+    return "NOT NULL" in node.upper()
+
+def _tree_lines(tree: dict, container: str, prefix: str, path: str, counter: list) -> list:
+    lines = []
+    for key, node in tree.items():
+        key_path = f"{path}.{key}" if path else key
+        column = column_name(prefix, key_path)
+        if isinstance(node, dict):
+            # Objeto aninhado: obrigatório se algum campo dentro dele for
+            counter[0] += 1
+            group = f"group{counter[0]}"
+            lines.append(f"{group} = {container}.get({key!r})")
+            inner = _tree_lines(node, group, prefix, key_path, counter)
+            if _has_required(node):
+                lines += [f"if {group}.__class__ is not dict:", f"    raise InvalidEvent({column!r})"] + inner
+            else:
+                lines += [f"if {group} is not None:", f"    if {group}.__class__ is not dict:",
+                          f"        raise InvalidEvent({column!r})"] + [f"    {line}" for line in inner]
+            continue
+
+        kind, limit, required = field_type(node)
+        body = _coerce_lines(kind, limit, column) + [f"row[{column!r}] = value"]
+        lines.append(f"value = {container}.get({key!r})")
+        if required:
+            lines += ["if value is None:", f"    raise InvalidEvent({column!r})"] + body
+        else:
+            lines += ["if value is not None:"] + [f"    {line}" for line in body]
+    return lines
+
+def decoder_source(event_name: str = None) -> str:
+    # Código da função de um eventName (sem eventName: só o envelope, para eventos sem especificação).
+    # O eventName chega já conferido e corrigido pelo EventDecoder.
+    spec = EVENT_SPECS[event_name] if event_name is not None else {"table": "unrouted", "payload": []}
+    counter = [0]
+    body = ["row = {}"]
+    for path, sql_type in ENVELOPE_FIELDS:
+        if path == "eventName":
+            body.append(f"row[{column_name('envelope', path)!r}] = event_name")
+        else:
+            body += _tree_lines(_field_tree([(path, sql_type)]), "envelope", "envelope", "", counter)
+    body += _tree_lines(_field_tree(spec["payload"]), "payload", "payload", "", counter)
+    body.append("return row")
+    lines = [f"def decode_{spec['table']}(envelope, payload, event_name):"] + [f"    {line}" for line in body]
+    return "\n".join(lines) + "\n"
+
+def compile_decoders() -> tuple:
+    # Compila as funções de todos os eventos da especificação (os derivados da ingestão ficam de fora).
+    # Devolve ({eventName: função}, função do envelope para eventos sem especificação).
+    namespace = {
+        "InvalidEvent": InvalidEvent, "_UUID": _UUID, "_TIMESTAMP": _TIMESTAMP, "_coerce_text": _coerce_text,
+        "_coerce_integer": _coerce_integer, "_coerce_boolean": _coerce_boolean, "_coerce_uuid": _coerce_uuid,
+        "_coerce_timestamp": _coerce_timestamp,
+    }
+    event_names = [event_name for event_name, spec in EVENT_SPECS.items() if not spec.get("derived")]
+    source = "\n".join(decoder_source(event_name) for event_name in event_names) + "\n" + decoder_source()
+    exec(compile(source, "<event_decoder>", "exec"), namespace)
+    decoders = {event_name: namespace[f"decode_{EVENT_SPECS[event_name]['table']}"] for event_name in event_names}
+    return decoders, namespace["decode_unrouted"]
+
+class EventDecoder:
+    def __init__(self, json_backend: str = "auto"):
+        self.json_backend, self._loads = resolve_json_backend(json_backend)
+        self._decoders, self._decode_envelope = compile_decoders()
+        self.rejected = Counter()  # coluna que invalidou o evento -> eventos rejeitados (somado às métricas por quem lê)
+
+    def _reject(self, column: str):
+        self.rejected[column] += 1
+        return None
+
+    def decode(self, raw) -> dict:
+        # Registro cru (bytes/str de uma linha NDJSON, ou dict já decodificado de um array JSON) -> linha
+        # achatada e tipada, ou None se o evento for inválido. JSON malformado levanta o erro do backend.
+        event = raw if raw.__class__ is dict else self._loads(raw)
+        if event.__class__ is not dict:
+            return self._reject(STRUCTURE)
+        envelope = event.get("envelope")
+        payload = event.get("payload")
+        if envelope.__class__ is not dict or payload is None:
+            return self._reject(STRUCTURE)
+        event_name = envelope.get("eventName")
+        if event_name.__class__ is not str:
+            return self._reject("envelope_eventName")
+
+        decoder = self._decoders.get(event_name)
+        if decoder is None:
+            corrected_name = EVENT_NAME_CORRECTIONS.get(event_name)
+            if corrected_name is not None:
+                metrics.inc("events_corrected", rule="eventName")
+                rate_limited_print("correcao_eventName", f"=== Corrigindo eventName para o eventId: {envelope.get('eventId')}")
+                event_name = corrected_name
+                decoder = self._decoders.get(event_name)
+        try:
+            if decoder is not None:
+                if payload.__class__ is not dict:
+                    return self._reject(STRUCTURE)
+                return decoder(envelope, payload, event_name)
+            # Sem especificação: envelope validado e o resto achatado como na cadeia original
+            row = _flatten(event)
+            row.update(self._decode_envelope(envelope, payload, event_name))
+            return row
+        except InvalidEvent as e:
+            return self._reject(e.column)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mostra o código gerado pelo decodificador tipado para um eventName.")
+    parser.add_argument("--show", metavar="EVENT_NAME", choices=[name for name, spec in EVENT_SPECS.items() if not spec.get("derived")],
+                        help="eventName cujo decodificador será impresso (padrão: todos).")
+    args = parser.parse_args()
+    names = [args.show] if args.show else [name for name, spec in EVENT_SPECS.items() if not spec.get("derived")]
+    for name in names:
+        print(f"# {name}")
+        print(decoder_source(name))
+    print(f"# backend JSON: {resolve_json_backend()[0]} (disponíveis: {', '.join(sorted(JSON_BACKENDS))})")
@@ -1,9 +1,17 @@
 import uuid
 from datetime import datetime, timezone, date, time, timedelta
-import json
 from faker import Faker
 import random
 import os
+import argparse
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+import numpy as np
+
+from metrics import DEFAULT_METRICS_DIR, EVENT_SAMPLE_MASK, metrics
+from pipeline_io import COMPRESSIONS, RotatingNdjsonWriter
 
 fake = Faker('pt_BR')
 
@@ -53,6 +61,26 @@ CONTENT_TYPES = [
     "movie", "series", "miniseries", "short-film", "documentary-series", "anime", "reality-show", "talk-show"
 ]
 
+# Valores categóricos dos payloads (compartilhados pelo gerador clássico e pelo motor em lote)
+GENERIC_LANDING_PATHS = ("/", "/planos", "/ajuda")
+ATTRIBUTION_SOURCES = ('google', 'instagram', 'facebook', 'organic')
+ATTRIBUTION_MEDIUMS = ('cpc', 'social_paid', 'referral')
+VISITOR_DEVICE_TYPES = ('desktop', 'mobile')
+VISITOR_DEVICE_OS = ('Windows', 'MacOS', 'Linux', 'Android', 'iOS')
+INITIAL_PLANS = ('premium_monthly', 'basic_annual')
+ACQUISITION_CHANNELS = ('google_cpc', 'instagram_social_paid', 'organic')
+VIDEO_TYPES = ('movie', 'series_episode')
+PLAYBACK_DEVICE_TYPES = ('smart_tv', 'mobile', 'desktop', 'tablet')
+PLAYBACK_MANUFACTURERS = ('Samsung', 'LG', 'Apple', 'Sony')
+PLAYBACK_DEVICE_OS = ('Tizen', 'webOS', 'iOS', 'Android', 'Windows')
+PLAYBACK_TRIGGERS = ('user_click_on_recommendation', 'autoplay', 'search_result')
+LOGIN_TYPES = ('password', 'google_sso')
+FAILURE_REASONS = ('WRONG_PASSWORD', 'ACCOUNT_NOT_FOUND', 'ACCOUNT_LOCKED')
+
+def random_uuid4() -> str:
+    # UUID v4 a partir do módulo random, para que uma seed torne os ids reprodutíveis
+    return str(uuid.UUID(int=random.getrandbits(128), version=4))
+
 def generate_envelope(event_name: str, event_time: datetime, version: str = "1.0.0") -> dict:
     # Extraindo o domínio a partir do nome do evento e convertendo para Uppercase o primeiro caractere
     domain = event_name.split('.')[0].capitalize()
@@ -62,7 +90,7 @@ def generate_envelope(event_name: str, event_time: datetime, version: str = "1.0
     final_event_time = event_time + random_delta
 
     envelope = {
-        "eventId": str(uuid.uuid4()),
+        "eventId": random_uuid4(),
         "eventTimestamp": final_event_time.isoformat().replace('+00:00', 'Z'),
         "eventName": event_name,
         "eventVersion": version,
@@ -81,21 +109,20 @@ def generate_payload_visitor_landed() -> dict: # Gerando o payload realista para
         video_id = fake.random_int(min=1000, max=9999)
         landing_page_url = f"https://unframed.com/genre/{genre}/{content_type}/{video_id}"
     else:
-        possible_paths = ["/", "/planos", "/ajuda"] # 30% de chance de ser genérica
-        landing_page_url = f"https://unframed.com{random.choice(possible_paths)}"
+        landing_page_url = f"https://unframed.com{random.choice(GENERIC_LANDING_PATHS)}" # 30% de chance de ser genérica
 
     payload = {
         "anonymousId": f"session_{fake.uuid4()}",
         "landingPageUrl": landing_page_url,
         "attribution": {
-            "source": fake.random_element(elements=('google', 'instagram', 'facebook', 'organic')),
-            "medium": fake.random_element(elements=('cpc', 'social_paid', 'referral')),
+            "source": fake.random_element(elements=ATTRIBUTION_SOURCES),
+            "medium": fake.random_element(elements=ATTRIBUTION_MEDIUMS),
             "campaign": fake.bs().replace(' ', '_').lower() # Gera um jargão de negócios
         },
         "device": {
-            "type": fake.random_element(elements=('desktop', 'mobile')),
+            "type": fake.random_element(elements=VISITOR_DEVICE_TYPES),
             "browser": fake.user_agent().split(' ')[0], # Pega a primeira parte do User Agent
-            "os": fake.random_element(elements=('Windows', 'MacOS', 'Linux', 'Android', 'iOS'))
+            "os": fake.random_element(elements=VISITOR_DEVICE_OS)
         },
         "geolocation": {
             "country": "BR",
@@ -112,8 +139,8 @@ def generate_payload_user_created(anonymous_id: str) -> dict:
         "userId": f"usr_{fake.uuid4()}",
         "anonymousId": anonymous_id, # ID da sessão que levou a pessoa ao cadastro (ponto de costura)
         "emailHash": fake.sha256(),
-        "initialPlanId": fake.random_element(elements=('premium_monthly', 'basic_annual')),
-        "acquisitionChannel": fake.random_element(elements=('google_cpc', 'instagram_social_paid', 'organic')),
+        "initialPlanId": fake.random_element(elements=INITIAL_PLANS),
+        "acquisitionChannel": fake.random_element(elements=ACQUISITION_CHANNELS),
     }
     return payload
 
@@ -122,15 +149,15 @@ def generate_payload_playback_started(user: dict) -> dict:
     payload = {
         "userId": user["userId"],
         "profileId": user["profileId"],
-        "playbackSessionId": f"play_{uuid.uuid4()}",
+        "playbackSessionId": f"play_{random_uuid4()}",
         "videoId": fake.random_int(min=10000, max=99999),
-        "videoType": fake.random_element(elements=('movie', 'series_episode')),
+        "videoType": fake.random_element(elements=VIDEO_TYPES),
         "device": {
-            "type": fake.random_element(elements=('smart_tv', 'mobile', 'desktop', 'tablet')),
-            "manufacturer": fake.random_element(elements=('Samsung', 'LG', 'Apple', 'Sony')),
-            "os": fake.random_element(elements=('Tizen', 'webOS', 'iOS', 'Android', 'Windows'))
+            "type": fake.random_element(elements=PLAYBACK_DEVICE_TYPES),
+            "manufacturer": fake.random_element(elements=PLAYBACK_MANUFACTURERS),
+            "os": fake.random_element(elements=PLAYBACK_DEVICE_OS)
         },
-        "trigger": fake.random_element(elements=('user_click_on_recommendation', 'autoplay', 'search_result')),
+        "trigger": fake.random_element(elements=PLAYBACK_TRIGGERS),
         "playbackStartTime": 0
     }
     return payload
@@ -139,7 +166,7 @@ def generate_payload_playback_started(user: dict) -> dict:
 def generate_payload_login_succeeded(user: dict) -> dict:
     payload = {
         "userId": user["userId"], # Mantendo a coerência do userId
-        "loginType": fake.random_element(elements=('password', 'google_sso')),
+        "loginType": fake.random_element(elements=LOGIN_TYPES),
         "isNewDevice": fake.boolean(chance_of_getting_true=15) # 15% de chance de um novo aparelho
     }
     return payload
@@ -148,7 +175,7 @@ def generate_payload_login_succeeded(user: dict) -> dict:
 def generate_payload_login_failed() -> dict:
     payload = {
         "emailAttempted": fake.email(),
-        "failureReason": fake.random_element(elements=('WRONG_PASSWORD', 'ACCOUNT_NOT_FOUND', 'ACCOUNT_LOCKED')),
+        "failureReason": fake.random_element(elements=FAILURE_REASONS),
         "consecutiveFailureCount": fake.random_int(min=1, max=5)
     }
     return payload
@@ -207,9 +234,14 @@ def simulate_full_engagement(base_dt: datetime) -> list:
 # ORQUESTRAÇÃO PRINCIPAL (COM PROBABILIDADES)
 # =============================================================================
 
-def generate_random_journey(journey_date: date):
-    # A jornada é decidida com base em pesos de probabilidades
-    base_dt = datetime.combine(journey_date, time(hour=random.randint(0, 23)), tzinfo=timezone.utc)
+# Pesos ajustáveis para conseguir mudar o perfil dos dados
+JOURNEY_WEIGHTS = [0.40, 0.25, 0.05, 0.15, 0.15] # bounce, signup, failed login, explorer e full_engagement
+
+def generate_random_journey(journey_date: date, base_dt: datetime = None):
+    # A jornada é decidida com base em pesos de probabilidades.
+    # base_dt fixa o início da jornada (modo live); sem ele, é uma hora cheia aleatória do dia
+    if base_dt is None:
+        base_dt = datetime.combine(journey_date, time(hour=random.randint(0, 23)), tzinfo=timezone.utc)
 
     journey_functions = [
         simulate_bounce,
@@ -218,48 +250,568 @@ def generate_random_journey(journey_date: date):
         simulate_explorer,
         simulate_full_engagement
     ]
-    # Pesos ajustáveis para conseguir mudar o perfil dos dados
-    weights = [0.40, 0.25, 0.05, 0.15, 0.15] # bounce, signup, failed login, explorer e full_engagement
 
-    chosen_journey_func = random.choices(journey_functions, weights=weights, k=1)[0]
+    chosen_journey_func = random.choices(journey_functions, weights=JOURNEY_WEIGHTS, k=1)[0]
     return chosen_journey_func(base_dt)
 
-if __name__ == "__main__":
-    # Garante que a pasta de destino exista
-    os.makedirs(OUTPUT_PATH, exist_ok=True)
-
-    # Define os dias para os quais queremos gerar dados
-    DATES_TO_GENERATE = [
-        date(2025, 9, 1),
-        date(2025, 5, 8),
-        date(2025, 6, 6),
-        date(2025, 11, 9),
-        date(2025, 8, 6),
-        date(2025, 8, 9),
-        date(2025, 3, 11),
-        date(2025, 7, 28),
-        date(2025, 10, 29)
+# =============================================================================
+# MOTOR DE GERAÇÃO EM LOTE (VETORIZADO)
+# Gera N jornadas de uma vez: sorteios categóricos vetorizados com NumPy e
+# strings caras do Faker amostradas de pools pré-construídos. O schema de saída
+# é o mesmo do gerador clássico e o resultado é reprodutível a partir da seed.
+# =============================================================================
+
+# Índices das jornadas, na mesma ordem de JOURNEY_WEIGHTS
+BOUNCE, SIGNUP_ONLY, FAILED_LOGIN, EXPLORER, FULL_ENGAGEMENT = range(5)
+
+DEFAULT_POOL_SIZE = 5_000
+
+def build_value_pools(seed: int = None, size: int = DEFAULT_POOL_SIZE) -> dict:
+    # Chama o Faker uma única vez por valor do pool, em vez de uma vez por evento
+    pool_fake = Faker('pt_BR')
+    pool_fake.seed_instance(seed)
+    return {
+        "campaign": [pool_fake.bs().replace(' ', '_').lower() for _ in range(size)],
+        "browser": [pool_fake.user_agent().split(' ')[0] for _ in range(size)],
+        "email": [pool_fake.email() for _ in range(size)],
+    }
+
+def _random_uuids(rng, n: int, prefix: str = '') -> list:
+    # UUIDs v4 montados a partir de bytes do gerador NumPy (reprodutíveis com a seed)
+    raw = np.frombuffer(rng.bytes(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    hex_str = raw.tobytes().hex()
+    return [
+        f"{prefix}{hex_str[i:i + 8]}-{hex_str[i + 8:i + 12]}-{hex_str[i + 12:i + 16]}-{hex_str[i + 16:i + 20]}-{hex_str[i + 20:i + 32]}"
+        for i in range(0, 32 * n, 32)
     ]
-    NUM_JOURNEYS_PER_DAY = 100
 
-    print(f"Iniciando geração de dados para {len(DATES_TO_GENERATE)} dias...")
+def _random_hex(rng, n: int, num_bytes: int = 32) -> list:
+    # Equivalente vetorizado do fake.sha256(): num_bytes aleatórios em hexadecimal
+    hex_str = rng.bytes(num_bytes * n).hex()
+    width = 2 * num_bytes
+    return [hex_str[i:i + width] for i in range(0, width * n, width)]
 
-    for target_date in DATES_TO_GENERATE:
-        all_events_for_day = []
-        date_str = target_date.strftime("%Y-%m-%d")
-        print(f"\nGerando {NUM_JOURNEYS_PER_DAY} jornadas para o dia {date_str}...")
+def _choice(rng, elements, n: int) -> list:
+    # Sorteio uniforme vetorizado; devolve objetos Python para serializar direto em JSON
+    return np.asarray(elements, dtype=object)[rng.integers(0, len(elements), size=n)].tolist()
+
+def _envelope(event_name: str, event_id: str, event_timestamp: str, version: str = "1.0.0") -> dict:
+    return {
+        "eventId": event_id,
+        "eventTimestamp": event_timestamp,
+        "eventName": event_name,
+        "eventVersion": version,
+        "source": "event-generator-v1",
+        "domain": event_name.split('.')[0].capitalize()
+    }
 
-        for i in range(NUM_JOURNEYS_PER_DAY):
+def generate_bulk_journeys(journey_date: date, num_journeys: int, seed: int = None, pools: dict = None) -> list:
+    # Gera num_journeys jornadas do dia de uma vez, na mesma ordem de eventos do gerador clássico
+    rng = np.random.default_rng(seed)
+    if pools is None:
+        pools = build_value_pools(seed)
+
+    # 1. Tipo de jornada com um único sorteio ponderado
+    weights = np.asarray(JOURNEY_WEIGHTS) / sum(JOURNEY_WEIGHTS)
+    journey_types = rng.choice(len(JOURNEY_WEIGHTS), size=num_journeys, p=weights)
+    hours = rng.integers(0, 24, size=num_journeys)
+    playback_counts = np.where(journey_types == FULL_ENGAGEMENT, rng.integers(1, 4, size=num_journeys), 0)
+
+    has_landed = journey_types != FAILED_LOGIN
+    has_created = np.isin(journey_types, (SIGNUP_ONLY, EXPLORER, FULL_ENGAGEMENT))
+    has_login = np.isin(journey_types, (EXPLORER, FULL_ENGAGEMENT))
+    is_failed = journey_types == FAILED_LOGIN
+    events_per_journey = has_landed.astype(int) + has_created + has_login + is_failed + playback_counts
+
+    n_landed = int(has_landed.sum())
+    n_created = int(has_created.sum())
+    n_login = int(has_login.sum())
+    n_failed = int(is_failed.sum())
+    n_full = int((journey_types == FULL_ENGAGEMENT).sum())
+    n_playback = int(playback_counts.sum())
+    n_events = int(events_per_journey.sum())
+
+    # 2. Envelope: ids e timestamps de todos os eventos (base da jornada + até 10 minutos)
+    event_ids = _random_uuids(rng, n_events)
+    event_seconds = np.repeat(hours * 3600, events_per_journey) + rng.integers(0, 601, size=n_events)
+    event_times = np.datetime64(journey_date, 's') + event_seconds.astype('timedelta64[s]')
+    timestamps = [f"{t}Z" for t in np.datetime_as_string(event_times, unit='s').tolist()]
+    envelopes = zip(event_ids, timestamps)
+
+    # 3. Colunas de cada tipo de payload, sorteadas em bloco
+    cities = rng.integers(0, len(BRAZILIAN_CITIES), size=n_landed).tolist()
+    specific_urls = (rng.random(n_landed) < 0.7).tolist()
+    content_types = _choice(rng, CONTENT_TYPES, n_landed)
+    genres = _choice(rng, MOVIE_GENRES, n_landed)
+    landing_video_ids = rng.integers(1000, 10000, size=n_landed).tolist()
+    generic_paths = _choice(rng, GENERIC_LANDING_PATHS, n_landed)
+    landing_urls = [
+        f"https://unframed.com/genre/{genre}/{content_type}/{video_id}" if specific else f"https://unframed.com{path}"
+        for specific, genre, content_type, video_id, path
+        in zip(specific_urls, genres, content_types, landing_video_ids, generic_paths)
+    ]
+    landed_rows = zip(
+        _random_uuids(rng, n_landed, "session_"),
+        landing_urls,
+        _choice(rng, ATTRIBUTION_SOURCES, n_landed),
+        _choice(rng, ATTRIBUTION_MEDIUMS, n_landed),
+        _choice(rng, pools["campaign"], n_landed),
+        _choice(rng, VISITOR_DEVICE_TYPES, n_landed),
+        _choice(rng, pools["browser"], n_landed),
+        _choice(rng, VISITOR_DEVICE_OS, n_landed),
+        cities,
+    )
+    created_rows = zip(
+        _random_uuids(rng, n_created, "usr_"),
+        _random_hex(rng, n_created),
+        _choice(rng, INITIAL_PLANS, n_created),
+        _choice(rng, ACQUISITION_CHANNELS, n_created),
+    )
+    login_rows = zip(
+        _choice(rng, LOGIN_TYPES, n_login),
+        (rng.random(n_login) < 0.15).tolist(), # 15% de chance de um novo aparelho
+    )
+    failed_rows = zip(
+        _choice(rng, pools["email"], n_failed),
+        _choice(rng, FAILURE_REASONS, n_failed),
+        rng.integers(1, 6, size=n_failed).tolist(),
+    )
+    profile_ids = iter(_random_uuids(rng, n_full, "prof_"))
+    playback_rows = zip(
+        _random_uuids(rng, n_playback, "play_"),
+        rng.integers(10000, 100000, size=n_playback).tolist(),
+        _choice(rng, VIDEO_TYPES, n_playback),
+        _choice(rng, PLAYBACK_DEVICE_TYPES, n_playback),
+        _choice(rng, PLAYBACK_MANUFACTURERS, n_playback),
+        _choice(rng, PLAYBACK_DEVICE_OS, n_playback),
+        _choice(rng, PLAYBACK_TRIGGERS, n_playback),
+    )
+
+    # 4. Montagem das jornadas, consumindo as colunas na ordem
+    events = []
+    for journey_type, num_playbacks in zip(journey_types.tolist(), playback_counts.tolist()):
+        if journey_type == FAILED_LOGIN:
+            email, reason, failure_count = next(failed_rows)
+            events.append({"envelope": _envelope("membership.user.login_failed", *next(envelopes)), "payload": {
+                "emailAttempted": email,
+                "failureReason": reason,
+                "consecutiveFailureCount": failure_count
+            }})
+            continue
+
+        anonymous_id, url, source, medium, campaign, device_type, browser, device_os, city_index = next(landed_rows)
+        city, state = BRAZILIAN_CITIES[city_index]
+        events.append({"envelope": _envelope("acquisition.visitor.landed", *next(envelopes)), "payload": {
+            "anonymousId": anonymous_id,
+            "landingPageUrl": url,
+            "attribution": {"source": source, "medium": medium, "campaign": campaign},
+            "device": {"type": device_type, "browser": browser, "os": device_os},
+            "geolocation": {"country": "BR", "region": state, "city": city},
+            "browserLanguage": "pt_BR"
+        }})
+        if journey_type == BOUNCE:
+            continue
+
+        user_id, email_hash, plan, channel = next(created_rows)
+        events.append({"envelope": _envelope("membership.user.created", *next(envelopes)), "payload": {
+            "userId": user_id,
+            "anonymousId": anonymous_id,
+            "emailHash": email_hash,
+            "initialPlanId": plan,
+            "acquisitionChannel": channel,
+        }})
+        if journey_type == SIGNUP_ONLY:
+            continue
+
+        login_type, is_new_device = next(login_rows)
+        events.append({"envelope": _envelope("membership.user.login_succeeded", *next(envelopes)), "payload": {
+            "userId": user_id,
+            "loginType": login_type,
+            "isNewDevice": is_new_device
+        }})
+        if journey_type == EXPLORER:
+            continue
+
+        profile_id = next(profile_ids)
+        for _ in range(num_playbacks):
+            session_id, video_id, video_type, device_type, manufacturer, device_os, trigger = next(playback_rows)
+            events.append({"envelope": _envelope("playback.session.started", *next(envelopes)), "payload": {
+                "userId": user_id,
+                "profileId": profile_id,
+                "playbackSessionId": session_id,
+                "videoId": video_id,
+                "videoType": video_type,
+                "device": {"type": device_type, "manufacturer": manufacturer, "os": device_os},
+                "trigger": trigger,
+                "playbackStartTime": 0
+            }})
+
+    return events
+
+def day_seed(seed: int, target_date: date):
+    # Seed determinística por dia: o mesmo dia gera os mesmos dados independentemente da ordem de geração
+    return None if seed is None else seed * 1_000_003 + target_date.toordinal()
+
+# =============================================================================
+# GERAÇÃO MULTI-DIAS EM PARALELO, COM ESCRITA EM STREAMING
+# =============================================================================
+
+# Define os dias padrão para os quais queremos gerar dados (quando nenhum intervalo é informado)
+DEFAULT_DATES_TO_GENERATE = [
+    date(2025, 9, 1),
+    date(2025, 5, 8),
+    date(2025, 6, 6),
+    date(2025, 11, 9),
+    date(2025, 8, 6),
+    date(2025, 8, 9),
+    date(2025, 3, 11),
+    date(2025, 7, 28),
+    date(2025, 10, 29)
+]
+# Jornadas geradas por vez pelo motor em lote; limita a memória de um dia muito grande
+BULK_CHUNK_JOURNEYS = 50_000
+
+# Pools do motor em lote, construídos uma vez por processo
+_worker_pools = None
+
+def iter_day_events(target_date: date, num_journeys: int, engine: str = "bulk", seed: int = None, pools: dict = None):
+    # Gera os eventos de um dia em blocos, sem manter o dia inteiro em memória
+    seed_for_day = day_seed(seed, target_date)
+
+    if engine == "bulk":
+        # Sem pools prontos, constrói uma vez para o dia todo, com a semente inteira do dia (o Faker não
+        # aceita a semente em lista dos blocos)
+        if pools is None:
+            pools = build_value_pools(seed_for_day)
+        for chunk_index, start in enumerate(range(0, num_journeys, BULK_CHUNK_JOURNEYS)):
+            chunk_size = min(BULK_CHUNK_JOURNEYS, num_journeys - start)
+            chunk_seed = None if seed_for_day is None else [seed_for_day, chunk_index]
+            with metrics.timer("generate", engine=engine):
+                events = generate_bulk_journeys(target_date, chunk_size, chunk_seed, pools)
+            yield from events
+    else:
+        if seed_for_day is not None:
+            random.seed(seed_for_day)
+            fake.seed_instance(seed_for_day)
+        # Tempo por jornada amostrado (1 a cada EVENT_SAMPLE_EVERY jornadas)
+        for journey_index in range(num_journeys):
+            if journey_index & EVENT_SAMPLE_MASK:
+                yield from generate_random_journey(target_date)
+                continue
+            start_time = perf_counter()
             journey = generate_random_journey(target_date)
-            all_events_for_day.extend(journey)
+            metrics.observe_event_stage("generate_journey", perf_counter() - start_time)
+            yield from journey
+
+def _init_worker(engine: str, seed: int):
+    global _worker_pools
+    if engine == "bulk":
+        _worker_pools = build_value_pools(seed)
+
+def generate_day_to_files(target_date: date, num_journeys: int, engine: str, seed: int, output_path: str,
+                          max_events: int = None, max_bytes: int = None, compression: str = None) -> tuple:
+    # Executado em um worker: gera um dia e grava em arquivos rotacionados.
+    # As métricas do dia voltam junto com o resultado para serem somadas no processo pai.
+    metrics.reset()
+    date_str = target_date.strftime("%Y-%m-%d")
+    start_time = perf_counter()
+    with RotatingNdjsonWriter(output_path, f"user_journeys_{date_str}", max_events, max_bytes, compression) as writer:
+        for index, event in enumerate(iter_day_events(target_date, num_journeys, engine, seed, _worker_pools)):
+            if index & EVENT_SAMPLE_MASK:
+                writer.write(event)
+            else:
+                write_start = perf_counter()
+                writer.write(event)
+                metrics.observe_event_stage("write", perf_counter() - write_start)
+    metrics.observe_stage("generate_day", perf_counter() - start_time, engine=engine)
+    metrics.inc("events_generated", writer.total_events)
+    metrics.inc("files_written", len(writer.completed_files))
+    return date_str, writer.total_events, writer.completed_files, metrics.snapshot()
 
-        # Exportação para arquivo
-        output_filename = f"user_journeys_{date_str}.json"
-        full_output_path = os.path.join(OUTPUT_PATH, output_filename)
-        
+# =============================================================================
+# MODO LIVE: GERAÇÃO CONTÍNUA COM TAXA CONTROLADA (SOAK TEST)
+# Emite jornadas de generate_random_journey com timestamps próximos do agora, no ritmo de uma taxa alvo
+# em eventos/s modulada por uma curva diária e por rajadas, e publica arquivos rotacionados na
+# landing_zone (nome temporário oculto + rename). O relatório compara a taxa real com a alvo: um déficit
+# persistente significa que o próprio gerador não acompanha e a medição do daemon/loader não vale.
+# =============================================================================
+
+# Multiplicadores por hora (0h a 23h, horário de Brasília); normalizados para média 1, então --rate é a média do dia
+DIURNAL_PROFILES = {
+    "flat": [1.0] * 24,
+    # Streaming de vídeo: madrugada vazia, subida à tarde e pico no horário nobre
+    "streaming": [0.35, 0.20, 0.12, 0.08, 0.07, 0.10, 0.20, 0.35, 0.50, 0.60, 0.65, 0.70,
+                  0.80, 0.80, 0.75, 0.75, 0.85, 1.00, 1.30, 1.70, 2.10, 2.30, 2.00, 1.10],
+}
+DIURNAL_UTC_OFFSET_HOURS = -3
+# Os envelopes espalham os eventos em até 600s depois do início da jornada: a jornada começa esse
+# tanto no passado para que os eventos caiam nos últimos 10 minutos, e não no futuro
+LIVE_EVENT_SPREAD = timedelta(seconds=600)
+LIVE_TICK_SECONDS = 0.05
+# Atraso máximo acumulado (em segundos de eventos): além disso o atraso vira déficit, em vez de rajada de recuperação
+LIVE_MAX_BACKLOG_SECONDS = 1.0
+# Déficit máximo para um intervalo de relatório contar como taxa sustentada
+LIVE_SUSTAINED_SHORTFALL = 0.01
+DEFAULT_LIVE_RATE = 1_000.0
+DEFAULT_ROTATE_SECONDS = 5.0
+DEFAULT_REPORT_INTERVAL = 10.0
+
+def parse_diurnal_curve(text: str) -> list:
+    curve = [float(value) for value in text.split(',')]
+    if len(curve) != 24 or any(value < 0 for value in curve) or not any(curve):
+        raise argparse.ArgumentTypeError("a curva precisa de 24 multiplicadores não negativos separados por vírgula (0h a 23h).")
+    return curve
+
+class LoadProfile:
+    # Taxa alvo (eventos/s) em cada instante da execução: base (com rampa opcional até ramp_to ao longo de
+    # ramp_seconds) x curva diária x rajada. A curva anda time_scale vezes mais rápido que o relógio
+    # (24 = um dia por hora); as rajadas usam o tempo real.
+    def __init__(self, rate: float, curve: list, time_scale: float = 1.0, ramp_to: float = None,
+                 ramp_seconds: float = None, burst_every: float = None, burst_duration: float = 0.0,
+                 burst_factor: float = 1.0, start: datetime = None):
+        mean = sum(curve) / len(curve)
+        self.rate = rate
+        self.curve = [value / mean for value in curve]
+        self.time_scale = time_scale
+        self.ramp_to = ramp_to
+        self.ramp_seconds = ramp_seconds
+        self.burst_every = burst_every
+        self.burst_duration = burst_duration
+        self.burst_factor = burst_factor
+        self.start = start or datetime.now(timezone.utc)
+
+    def diurnal_factor(self, elapsed: float) -> float:
+        simulated = self.start + timedelta(seconds=elapsed * self.time_scale)
+        hour = (simulated.hour + simulated.minute / 60 + simulated.second / 3600 + DIURNAL_UTC_OFFSET_HOURS) % 24
+        # Interpolação linear entre as horas cheias, para a taxa não dar degraus
+        current = int(hour)
+        fraction = hour - current
+        return self.curve[current] * (1 - fraction) + self.curve[(current + 1) % 24] * fraction
+
+    def rate_at(self, elapsed: float) -> float:
+        base = self.rate
+        if self.ramp_to is not None:
+            base += (self.ramp_to - self.rate) * min(1.0, elapsed / self.ramp_seconds)
+        target = base * self.diurnal_factor(elapsed)
+        if self.burst_every and elapsed % self.burst_every < self.burst_duration:
+            target *= self.burst_factor
+        return target
+
+def generate_live_journey() -> list:
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    return generate_random_journey(now.date(), now - LIVE_EVENT_SPREAD)
+
+def print_live_report(label: str, target_events: float, events: int, seconds: float, busy_seconds: float,
+                      files: int) -> tuple:
+    # Imprime a linha de relatório e devolve (taxa real, déficit)
+    target_rate = target_events / seconds if seconds > 0 else 0
+    actual_rate = events / seconds if seconds > 0 else 0
+    shortfall = 1 - events / target_events if target_events > 0 else 0
+    print(f"[{label}] alvo {target_rate:,.0f} ev/s | real {actual_rate:,.0f} ev/s | "
+          f"déficit {max(shortfall, 0):.1%} | gerador ocupado {busy_seconds / seconds if seconds > 0 else 0:.0%} | "
+          f"{files} arquivos")
+    return actual_rate, shortfall
+
+def run_live(args):
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"\nSinal {signum} recebido, publicando o último arquivo...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+        fake.seed_instance(args.seed)
+
+    curve = args.diurnal_curve or DIURNAL_PROFILES[args.diurnal]
+    profile = LoadProfile(args.rate, curve, args.time_scale, args.ramp_to, args.duration,
+                          args.burst_every, args.burst_duration, args.burst_factor)
+    # Prefixo com instante e pid: vários geradores podem alimentar a mesma landing_zone
+    prefix = f"user_journeys_live_{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}_{os.getpid()}"
+    writer = RotatingNdjsonWriter(args.output_path, prefix, args.max_events_per_file, args.max_bytes_per_file,
+                                  args.compress)
+
+    print(f"Gerando jornadas ao vivo em '{args.output_path}' (taxa média {args.rate:,.0f} ev/s, curva "
+          f"'{'personalizada' if args.diurnal_curve else args.diurnal}', escala de tempo {args.time_scale}x"
+          f"{f', duração {args.duration:.0f}s' if args.duration else ''}). Ctrl+C para encerrar.")
+
+    start = perf_counter()
+    last_tick = start
+    last_rotation = start
+    last_report = start
+    owed = 0.0            # eventos que já deveriam ter sido emitidos (integral da taxa alvo)
+    target_total = 0.0
+    dropped = 0.0         # atraso descartado além de LIVE_MAX_BACKLOG_SECONDS
+    emitted = 0
+    busy = 0.0
+    interval_target, interval_emitted, interval_busy = 0.0, 0, 0.0
+    best_sustained = None
+
+    try:
+        while not stop.is_set():
+            now = perf_counter()
+            elapsed = now - start
+            if args.duration and elapsed >= args.duration:
+                break
+
+            rate = profile.rate_at(elapsed)
+            due = rate * (now - last_tick)
+            last_tick = now
+            owed += due
+            target_total += due
+            interval_target += due
+            backlog_limit = rate * LIVE_MAX_BACKLOG_SECONDS
+            if owed - emitted > backlog_limit:
+                dropped += owed - emitted - backlog_limit
+                owed = emitted + backlog_limit
+
+            # Gera o que está devendo, sem passar do próximo tick (a taxa é recalculada a cada tick)
+            generate_start = perf_counter()
+            deadline = generate_start + LIVE_TICK_SECONDS
+            while emitted < owed and perf_counter() < deadline:
+                journey = generate_live_journey()
+                for event in journey:
+                    writer.write(event)
+                emitted += len(journey)
+                interval_emitted += len(journey)
+            generated_for = perf_counter() - generate_start
+            busy += generated_for
+            interval_busy += generated_for
+
+            now = perf_counter()
+            if now - last_rotation >= args.rotate_seconds:
+                writer.rotate()
+                last_rotation = now
+            if now - last_report >= args.report_interval:
+                actual_rate, shortfall = print_live_report(datetime.now().strftime('%H:%M:%S'), interval_target,
+                                                           interval_emitted, now - last_report, interval_busy,
+                                                           len(writer.completed_files))
+                if shortfall < LIVE_SUSTAINED_SHORTFALL and (best_sustained is None or actual_rate > best_sustained):
+                    best_sustained = actual_rate
+                interval_target, interval_emitted, interval_busy = 0.0, 0, 0.0
+                last_report = now
+            if emitted >= owed:
+                stop.wait(max(0.0, LIVE_TICK_SECONDS - (perf_counter() - now)))
+    finally:
+        writer.close()
+
+    total_seconds = perf_counter() - start
+    metrics.inc("events_generated", emitted)
+    metrics.inc("events_target", round(target_total))
+    metrics.inc("events_shortfall_dropped", round(dropped))
+    metrics.inc("files_written", len(writer.completed_files))
+    metrics.observe_stage("generate_live", total_seconds)
+    print(f"\nTotal: {emitted} eventos em {len(writer.completed_files)} arquivos em {total_seconds:.1f}s.")
+    print_live_report("total", target_total, emitted, total_seconds, busy, len(writer.completed_files))
+    if best_sustained is not None:
+        print(f"Maior taxa sustentada em um intervalo (déficit < {LIVE_SUSTAINED_SHORTFALL:.0%}): {best_sustained:,.0f} ev/s")
+
+def date_range(start: date, end: date) -> list:
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Gera jornadas de usuários na landing_zone.")
+    parser.add_argument("--engine", choices=("classic", "bulk"), default="bulk",
+                        help="'classic' gera evento a evento com o Faker; 'bulk' usa o motor vetorizado com NumPy.")
+    parser.add_argument("--start-date", type=date.fromisoformat, help="Primeiro dia (AAAA-MM-DD).")
+    parser.add_argument("--end-date", type=date.fromisoformat, help="Último dia, inclusive (AAAA-MM-DD).")
+    parser.add_argument("--journeys-per-day", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=None, help="Seed para resultados reprodutíveis (uma seed derivada por dia).")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Dias gerados em paralelo.")
+    parser.add_argument("--max-events-per-file", type=int, default=None, help="Rotaciona o arquivo ao atingir este número de eventos.")
+    parser.add_argument("--max-bytes-per-file", type=int, default=None, help="Rotaciona o arquivo ao atingir este tamanho (antes da compressão).")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default=None,
+                        help="Comprime os arquivos gerados (gzip ou zstd; zstd requer o pacote zstandard).")
+    parser.add_argument("--output-path", default=OUTPUT_PATH)
+    parser.add_argument("--metrics-dir", default=DEFAULT_METRICS_DIR,
+                        help="Pasta onde o relatório de métricas (JSON e Prometheus) é gravado ao fim da execução.")
+
+    live = parser.add_argument_group("modo live (soak test)")
+    live.add_argument("--live", action="store_true",
+                      help="Gera jornadas continuamente, com timestamps do momento, no ritmo de --rate eventos/s.")
+    live.add_argument("--rate", type=float, default=DEFAULT_LIVE_RATE, help="Taxa alvo média em eventos/s.")
+    live.add_argument("--duration", type=float, default=None, help="Segundos de execução (padrão: até Ctrl+C).")
+    live.add_argument("--diurnal", choices=sorted(DIURNAL_PROFILES), default="flat",
+                      help="Curva diária que modula a taxa ('streaming': madrugada vazia e pico no horário nobre).")
+    live.add_argument("--diurnal-curve", type=parse_diurnal_curve, default=None,
+                      help="Curva própria: 24 multiplicadores separados por vírgula, de 0h a 23h (horário de Brasília).")
+    live.add_argument("--time-scale", type=float, default=1.0,
+                      help="Velocidade da curva diária em relação ao relógio (24 = um dia inteiro por hora).")
+    live.add_argument("--ramp-to", type=float, default=None,
+                      help="Sobe a taxa linearmente de --rate até este valor ao longo de --duration (busca da taxa máxima sustentável).")
+    live.add_argument("--burst-every", type=float, default=None, help="Intervalo em segundos entre rajadas.")
+    live.add_argument("--burst-duration", type=float, default=10.0, help="Duração de cada rajada em segundos.")
+    live.add_argument("--burst-factor", type=float, default=5.0, help="Multiplicador da taxa durante a rajada.")
+    live.add_argument("--rotate-seconds", type=float, default=DEFAULT_ROTATE_SECONDS,
+                      help="Publica o arquivo atual na landing_zone a cada este número de segundos.")
+    live.add_argument("--report-interval", type=float, default=DEFAULT_REPORT_INTERVAL,
+                      help="Segundos entre as linhas de relatório (taxa alvo x real).")
+    args = parser.parse_args(argv)
+
+    if args.live:
+        if args.start_date is not None:
+            parser.error("--live gera eventos do momento; não use --start-date/--end-date.")
+        if args.rate <= 0 or (args.ramp_to is not None and args.ramp_to <= 0):
+            parser.error("--rate e --ramp-to devem ser maiores que 0.")
+        if args.ramp_to is not None and not args.duration:
+            parser.error("--ramp-to precisa de --duration.")
+        if args.duration is not None and args.duration <= 0:
+            parser.error("--duration deve ser maior que 0.")
+        if args.time_scale <= 0 or args.rotate_seconds <= 0 or args.report_interval <= 0:
+            parser.error("--time-scale, --rotate-seconds e --report-interval devem ser maiores que 0.")
+        if args.burst_every is not None and (args.burst_every <= 0 or args.burst_duration <= 0 or args.burst_factor < 0):
+            parser.error("--burst-every e --burst-duration devem ser maiores que 0 e --burst-factor não pode ser negativo.")
+
+    if (args.start_date is None) != (args.end_date is None):
+        parser.error("--start-date e --end-date devem ser informados juntos.")
+    if args.start_date and args.end_date < args.start_date:
+        parser.error("--end-date não pode ser anterior a --start-date.")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Garante que a pasta de destino exista
+    os.makedirs(args.output_path, exist_ok=True)
+
+    if args.live:
         try:
-            with open(full_output_path, 'w', encoding='utf-8') as f:
-                json.dump(all_events_for_day, f, indent=2, ensure_ascii=False)
-            print(f"✅ {len(all_events_for_day)} eventos para {date_str} salvos em: {full_output_path}")
-        except Exception as e:
-            print(f"❌ Ocorreu um erro ao salvar o arquivo para {date_str}: {e}")
\ No newline at end of file
+            run_live(args)
+        finally:
+            metrics.write_report(args.metrics_dir, "generate_live")
+        return
+
+    dates_to_generate = date_range(args.start_date, args.end_date) if args.start_date else DEFAULT_DATES_TO_GENERATE
+    workers = max(1, min(args.workers, len(dates_to_generate)))
+
+    print(f"Iniciando geração de dados para {len(dates_to_generate)} dias "
+          f"({args.journeys_per_day} jornadas por dia, motor '{args.engine}', {workers} workers)...")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(args.engine, args.seed)) as executor:
+        futures = {
+            executor.submit(generate_day_to_files, target_date, args.journeys_per_day, args.engine, args.seed,
+                            args.output_path, args.max_events_per_file, args.max_bytes_per_file, args.compress): target_date
+            for target_date in dates_to_generate
+        }
+        total_events = 0
+        for future in as_completed(futures):
+            date_str = futures[future].strftime("%Y-%m-%d")
+            try:
+                date_str, num_events, files, snapshot = future.result()
+                metrics.merge(snapshot)
+                total_events += num_events
+                print(f"✅ {num_events} eventos para {date_str} salvos em {len(files)} arquivo(s) em: {args.output_path}")
+            except Exception as e:
+                metrics.inc("days_failed")
+                print(f"❌ Ocorreu um erro ao gerar os dados para {date_str}: {e}")
+
+    print(f"\nTotal: {total_events} eventos gerados.")
+    metrics.write_report(args.metrics_dir, "generate")
+
+if __name__ == "__main__":
+    main()
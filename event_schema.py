@@ -0,0 +1,352 @@
+import argparse
+import operator
+import re
+import sys
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+# =============================================================================
+# ESPECIFICAÇÃO DECLARATIVA DOS EVENTOS
+# Fonte única para o DDL (create_tables.sql) e para o roteamento do loader.
+# Cada campo é (caminho no evento aninhado, tipo SQL). O nome da coluna é o
+# mesmo nome da chave gerada pelo flatten_event: prefixo + caminho com '_'.
+# =============================================================================
+
+DDL_PATH = "create_tables.sql"
+
+ENVELOPE_FIELDS = [
+    ("eventId", "UUID NOT NULL"),
+    ("eventTimestamp", "TIMESTAMPTZ NOT NULL"),
+    ("eventName", "VARCHAR(255) NOT NULL"),
+    ("eventVersion", "VARCHAR(50)"),
+    ("source", "VARCHAR(255)"),
+    ("domain", "VARCHAR(255)"),
+]
+
+EVENT_SPECS = {
+    "acquisition.visitor.landed": {
+        "table": "visitor_landed",
+        "payload": [
+            ("anonymousId", "TEXT NOT NULL"),
+            ("landingPageUrl", "TEXT"),
+            ("attribution.source", "VARCHAR(255)"),
+            ("attribution.medium", "VARCHAR(255)"),
+            ("attribution.campaign", "TEXT"),
+            ("device.type", "VARCHAR(100)"),
+            ("device.browser", "VARCHAR(100)"),
+            ("device.os", "VARCHAR(100)"),
+            ("geolocation.country", "VARCHAR(100)"),
+            ("geolocation.region", "VARCHAR(100)"),
+            ("geolocation.city", "VARCHAR(255)"),
+            ("browserLanguage", "VARCHAR(50)"),
+        ],
+    },
+    "membership.user.created": {
+        "table": "user_created",
+        "payload": [
+            ("userId", "TEXT NOT NULL"),
+            ("anonymousId", "TEXT NOT NULL"),
+            ("emailHash", "VARCHAR(255)"),
+            ("initialPlanId", "VARCHAR(100)"),
+            ("acquisitionChannel", "VARCHAR(100)"),
+        ],
+    },
+    "playback.session.started": {
+        "table": "playback_started",
+        "payload": [
+            ("userId", "TEXT NOT NULL"),
+            ("profileId", "TEXT NOT NULL"),
+            ("playbackSessionId", "TEXT NOT NULL"),
+            ("videoId", "INTEGER NOT NULL"),
+            ("videoType", "VARCHAR(255)"),
+            ("device.type", "VARCHAR(100)"),
+            ("device.manufacturer", "VARCHAR(100)"),
+            ("device.os", "VARCHAR(100)"),
+            ("trigger", "VARCHAR(100)"),
+            ("playbackStartTime", "INTEGER"),
+        ],
+    },
+    "membership.user.login_succeeded": {
+        "table": "login_succeeded",
+        "payload": [
+            ("userId", "TEXT NOT NULL"),
+            ("loginType", "VARCHAR(100)"),
+            ("isNewDevice", "BOOLEAN"),
+        ],
+    },
+    "membership.user.login_failed": {
+        "table": "login_failed",
+        "payload": [
+            ("emailAttempted", "VARCHAR(100) NOT NULL"),
+            ("failureReason", "VARCHAR(100) NOT NULL"),
+            ("consecutiveFailureCount", "INTEGER"),
+        ],
+    },
+    # Fato derivado, emitido pela costura de jornadas da ingestão (journey_stitching.py)
+    "journey.funnel.stitched": {
+        "table": "journey_funnel",
+        "derived": True,
+        "payload": [
+            ("anonymousId", "TEXT NOT NULL"),
+            ("userId", "TEXT"),
+            ("funnelStage", "VARCHAR(20) NOT NULL"),
+            ("landedAt", "TIMESTAMPTZ"),
+            ("signedUpAt", "TIMESTAMPTZ"),
+            ("firstLoginAt", "TIMESTAMPTZ"),
+            ("firstPlaybackAt", "TIMESTAMPTZ"),
+            ("attribution.source", "VARCHAR(255)"),
+            ("attribution.medium", "VARCHAR(255)"),
+            ("attribution.campaign", "TEXT"),
+            ("device.type", "VARCHAR(100)"),
+            ("geolocation.country", "VARCHAR(100)"),
+        ],
+    },
+}
+
+# Regras de correção de eventName: nome publicado errado pelo produtor -> nome da especificação.
+# Aplicadas tanto pelo clean_event da ingestão quanto pelo decodificador tipado (event_decoder.py).
+EVENT_NAME_CORRECTIONS = {
+    "acquisiton.visitor.landed": "acquisition.visitor.landed",  # erro gerado propositalmente
+}
+
+# Campos de baixa cardinalidade (poucos valores distintos repetidos em milhões de eventos). No lote
+# em memória do loader cada valor distinto desses campos é guardado uma única vez.
+CATEGORICAL_FIELDS = {
+    "envelope": {"eventName", "eventVersion", "source", "domain"},
+    "payload": {
+        "attribution.source", "attribution.medium", "attribution.campaign", "device.type", "device.browser",
+        "device.os", "device.manufacturer", "geolocation.country", "geolocation.region", "geolocation.city",
+        "browserLanguage", "initialPlanId", "acquisitionChannel", "videoType", "trigger", "loginType",
+        "failureReason", "funnelStage",
+    },
+}
+
+# As tabelas de eventos são particionadas por dia (UTC) de envelope_eventTimestamp. Toda restrição
+# única de uma tabela particionada precisa conter a chave de partição, então a chave primária é
+# (eventId, timestamp). As cargas incrementais usam ON CONFLICT DO NOTHING sem alvo, que vale tanto
+# para essa chave quanto para a chave só de eventId das tabelas anteriores ao particionamento.
+PARTITION_KEY = "envelope_eventTimestamp"
+EVENT_PRIMARY_KEY = f"(envelope_eventId, {PARTITION_KEY})"
+
+# Rota compilada de um eventName: tabela, colunas e extrator/SQL prontos para uso
+TableRoute = namedtuple("TableRoute", ["event_name", "table", "columns", "categorical", "extract", "insert_sql",
+                                       "insert_new_sql", "copy_sql"])
+
+def column_name(prefix: str, path: str) -> str:
+    # Mesma regra do flatten_event: 'payload' + 'device.type' -> 'payload_device_type'
+    return f"{prefix}_{path.replace('.', '_')}"
+
+def categorical_positions(spec: dict) -> tuple:
+    # Posições, na ordem das colunas da tabela, dos campos de baixa cardinalidade
+    paths = [("envelope", path) for path, _ in ENVELOPE_FIELDS] + [("payload", path) for path, _ in spec["payload"]]
+    return tuple(position for position, (prefix, path) in enumerate(paths) if path in CATEGORICAL_FIELDS[prefix])
+
+def table_columns(spec: dict) -> list:
+    # Lista de (coluna, tipo SQL) da tabela de um evento, envelope primeiro
+    columns = [(column_name("envelope", path), sql_type) for path, sql_type in ENVELOPE_FIELDS]
+    columns += [(column_name("payload", path), sql_type) for path, sql_type in spec["payload"]]
+    return columns
+
+# =============================================================================
+# GERAÇÃO E LEITURA DO DDL
+# =============================================================================
+
+# Tabelas de controle do loader (não vêm de eventos)
+CONTROL_TABLES = {
+    "load_manifest": [
+        ("batch_file", "TEXT NOT NULL"),
+        ("batch_checksum", "CHAR(64) NOT NULL"),
+        ("file_size", "BIGINT NOT NULL"),
+        ("event_count", "INTEGER NOT NULL"),
+        ("inserted_count", "INTEGER NOT NULL"),
+        ("loaded_at", "TIMESTAMPTZ NOT NULL DEFAULT now()"),
+        ("PRIMARY KEY", "(batch_file, batch_checksum)"),  # restrição de tabela, renderizada como linha do CREATE
+    ],
+}
+
+# Tabelas de rollup diário dos KPIs, mantidas pelo loader (ver load_to_dw.refresh_rollups)
+ROLLUP_TABLES = {
+    "daily_active_users": [
+        ("day", "DATE NOT NULL"),
+        ("event_family", "VARCHAR(50) NOT NULL"),  # tabela de origem ou 'all' (união de todas)
+        ("active_users", "INTEGER NOT NULL"),
+        ("PRIMARY KEY", "(day, event_family)"),
+    ],
+    "daily_activation": [
+        ("day", "DATE PRIMARY KEY"),
+        ("signups", "INTEGER NOT NULL"),
+        ("activated", "INTEGER NOT NULL"),  # novos usuários que deram play no mesmo dia do cadastro
+    ],
+}
+
+# Todas as tabelas de eventos (particionadas por dia)
+EVENT_TABLES = [spec["table"] for spec in EVENT_SPECS.values()]
+
+# Tabelas de eventos que carregam payload.userId: entram nos rollups e recebem os índices de apoio
+USER_EVENT_TABLES = [spec["table"] for spec in EVENT_SPECS.values()
+                     if not spec.get("derived") and any(path == "userId" for path, _ in spec["payload"])]
+
+def render_indexes() -> list:
+    # (userId, timestamp) atende às buscas por usuário no dia (ativação);
+    # o índice só de timestamp atende ao recálculo de um dia inteiro
+    indexes = []
+    for table in USER_EVENT_TABLES:
+        indexes.append(f"CREATE INDEX IF NOT EXISTS idx_{table}_user_ts ON {table} (payload_userId, envelope_eventTimestamp);")
+        indexes.append(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table} (envelope_eventTimestamp);")
+    return indexes
+
+# Partições diárias: <tabela>_pAAAAMMDD, cobrindo [00:00 UTC do dia, 00:00 UTC do dia seguinte)
+PARTITION_NAME_PATTERN = re.compile(r"^(\w+)_p(\d{8})$")
+
+def partition_name(table: str, day: date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+def partition_day(partition: str):
+    # Dia de uma partição a partir do nome (None se o nome não seguir o padrão)
+    match = PARTITION_NAME_PATTERN.match(partition)
+    if match is None:
+        return None
+    return datetime.strptime(match.group(2), "%Y%m%d").date()
+
+def render_partition(table: str, day: date) -> str:
+    return (f"CREATE TABLE {partition_name(table, day)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{day.isoformat()} 00:00:00+00') TO ('{(day + timedelta(days=1)).isoformat()} 00:00:00+00');")
+
+def render_ddl(if_not_exists: bool = False) -> str:
+    # Gera o conteúdo do create_tables.sql a partir da especificação.
+    # Com if_not_exists=True gera a versão incremental: sem DROPs, cria só o que faltar.
+    tables = {spec["table"]: table_columns(spec) for spec in EVENT_SPECS.values()}
+    tables.update(CONTROL_TABLES)
+    tables.update(ROLLUP_TABLES)
+
+    lines = []
+    if not if_not_exists:
+        lines = [f"DROP TABLE IF EXISTS {table};" for table in reversed(list(tables))]
+    create = "CREATE TABLE IF NOT EXISTS" if if_not_exists else "CREATE TABLE"
+
+    for table, columns in tables.items():
+        column_lines = [f"    {column} {sql_type}" for column, sql_type in columns]
+        suffix = ""
+        if table in EVENT_TABLES:
+            # As partições diárias são criadas pelo loader conforme os dias de cada lote
+            column_lines.append(f"    PRIMARY KEY {EVENT_PRIMARY_KEY}")
+            suffix = f" PARTITION BY RANGE ({PARTITION_KEY})"
+        if lines:
+            lines.append("")
+        lines.append(f"{create} {table} (")
+        lines.append(",\n".join(column_lines))
+        lines.append(f"){suffix};")
+
+    lines.append("")
+    lines.extend(render_indexes())
+    return "\n".join(lines) + "\n"
+
+def parse_ddl_columns(sql_script: str) -> dict:
+    # Extrai {tabela: [colunas]} dos CREATE TABLE de um script SQL
+    tables = {}
+    pattern = re.compile(r"CREATE TABLE (?:IF NOT EXISTS )?(\w+) \(\n(.*?)\n\)", re.DOTALL | re.IGNORECASE)
+    for table, body in pattern.findall(sql_script):
+        columns = []
+        for line in body.splitlines():
+            line = line.strip().rstrip(",")
+            if not line or line.split()[0].upper() in ("PRIMARY", "UNIQUE", "CONSTRAINT", "FOREIGN", "CHECK"):
+                continue
+            columns.append(line.split()[0])
+        tables[table.lower()] = columns
+    return tables
+
+# =============================================================================
+# REGISTRO DE ROTAS
+# =============================================================================
+
+def make_extractor(keys: list):
+    # Extrator pré-compilado: itemgetter no caminho rápido, .get() se faltar alguma chave
+    getter = operator.itemgetter(*keys)
+
+    def extract(event: dict) -> tuple:
+        try:
+            return getter(event)
+        except KeyError:
+            return tuple(event.get(key) for key in keys)
+    return extract
+
+def extract_compact(route: TableRoute, event: dict, values: dict) -> tuple:
+    # Linha do evento na ordem das colunas, com os valores categóricos trocados pela instância única
+    # guardada em values (codificação por dicionário em memória)
+    row = route.extract(event)
+    if not route.categorical:
+        return row
+    row = list(row)
+    for position in route.categorical:
+        value = row[position]
+        if value.__class__ is str:
+            row[position] = values.setdefault(value, value)
+    return tuple(row)
+
+def check_ddl(sql_script: str):
+    # Confere se as colunas do DDL batem com as chaves do flatten_event.
+    # O PostgreSQL ignora maiúsculas em identificadores sem aspas, então a comparação também ignora.
+    ddl_tables = parse_ddl_columns(sql_script)
+    problems = []
+
+    for event_name, spec in EVENT_SPECS.items():
+        table = spec["table"]
+        if table not in ddl_tables:
+            problems.append(f"tabela '{table}' ({event_name}) não existe no DDL")
+            continue
+        expected = [column.lower() for column, _ in table_columns(spec)]
+        actual = [column.lower() for column in ddl_tables[table]]
+        missing = [column for column in expected if column not in actual]
+        unexpected = [column for column in actual if column not in expected]
+        if missing:
+            problems.append(f"{table}: colunas esperadas pelo loader e ausentes no DDL: {missing}")
+        if unexpected:
+            problems.append(f"{table}: colunas do DDL sem chave correspondente no evento: {unexpected}")
+
+    if problems:
+        raise ValueError("Esquema inconsistente com o DDL:\n  - " + "\n  - ".join(problems))
+
+def build_registry(sql_script: str = None) -> dict:
+    # Constrói uma vez o mapa eventName -> TableRoute. Se o DDL for informado, valida as colunas contra ele.
+    if sql_script is not None:
+        check_ddl(sql_script)
+
+    registry = {}
+    for event_name, spec in EVENT_SPECS.items():
+        columns = [column for column, _ in table_columns(spec)]
+        column_list = ", ".join(columns)
+        placeholders = ",".join(["%s"] * len(columns))
+        registry[event_name] = TableRoute(
+            event_name=event_name,
+            table=spec["table"],
+            columns=columns,
+            categorical=categorical_positions(spec),
+            extract=make_extractor(columns),
+            insert_sql=f"INSERT INTO {spec['table']} ({column_list}) VALUES ({placeholders})",
+            insert_new_sql=f"INSERT INTO {spec['table']} ({column_list}) VALUES ({placeholders}) ON CONFLICT DO NOTHING",
+            copy_sql=f"COPY {spec['table']} ({column_list}) FROM STDIN",
+        )
+    return registry
+
+def load_registry(ddl_path: str = DDL_PATH) -> dict:
+    with open(ddl_path, 'r', encoding='utf-8') as f:
+        return build_registry(f.read())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera ou valida o create_tables.sql a partir da especificação dos eventos.")
+    parser.add_argument("--check", action="store_true", help="Apenas verifica se o create_tables.sql está atualizado.")
+    args = parser.parse_args()
+
+    ddl = render_ddl()
+    if args.check:
+        with open(DDL_PATH, 'r', encoding='utf-8') as f:
+            current = f.read()
+        if current != ddl:
+            print(f"❌ '{DDL_PATH}' está desatualizado. Rode: python event_schema.py")
+            sys.exit(1)
+        check_ddl(current)
+        print(f"✅ '{DDL_PATH}' está de acordo com a especificação.")
+    else:
+        with open(DDL_PATH, 'w', encoding='utf-8') as f:
+            f.write(ddl)
+        print(f"✅ '{DDL_PATH}' gerado a partir da especificação.")
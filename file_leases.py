@@ -0,0 +1,164 @@
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+from metrics import metrics
+
+# =============================================================================
+# LEASES EM ARQUIVO PARA VÁRIOS NÓS DE INGESTÃO
+# Coordenação só pelo sistema de arquivos compartilhado (o mesmo mount da landing_zone), sem servidor:
+#   <pasta>/leases/<nome>.lease -> lease de uma unidade de trabalho, criada com O_CREAT|O_EXCL (só um nó
+#                                  consegue) e renovada pelo dono tocando o mtime a cada ttl/3
+#   <pasta>/nodes/<nó>.node     -> heartbeat de cada nó vivo (mesma renovação), usado no anel de hashing
+# Uma lease sem renovação há mais de ttl segundos é de um nó morto (ou travado): outro nó a reclama
+# renomeando o arquivo para um nome único (o rename só funciona para um deles) e conferindo que o que
+# renomeou ainda estava vencido; se o dono renovou nesse meio tempo, a lease é devolvida.
+# =============================================================================
+
+DEFAULT_LEASE_TTL = 30.0
+LEASE_SUFFIX = ".lease"
+NODE_SUFFIX = ".node"
+# Pontos de cada nó no anel: quanto mais pontos, mais uniforme a divisão entre poucos nós
+DEFAULT_VIRTUAL_NODES = 64
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+class HashRing:
+    # Hashing consistente: cada chave pertence ao primeiro ponto do anel depois do seu hash. Um nó que entra
+    # ou sai só muda o dono das chaves vizinhas aos seus pontos, o resto da divisão fica como estava.
+    def __init__(self, nodes, virtual_nodes: int = DEFAULT_VIRTUAL_NODES):
+        points = sorted((_hash(f"{node}#{replica}"), node) for node in set(nodes) for replica in range(virtual_nodes))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def owner(self, key: str) -> str:
+        if not self._nodes:
+            return None
+        return self._nodes[bisect.bisect(self._hashes, _hash(key)) % len(self._nodes)]
+
+class LeaseManager:
+    def __init__(self, directory: str, node_id: str, ttl: float = DEFAULT_LEASE_TTL):
+        self.directory = directory
+        self.node_id = node_id
+        self.ttl = ttl
+        self.held = {}    # nome -> token da lease deste nó
+        self.lost = set() # leases deste nó renomeadas/apagadas por outro nó (o trabalho delas é abandonado)
+        self._leases_path = os.path.join(directory, "leases")
+        self._nodes_path = os.path.join(directory, "nodes")
+        self._node_file = os.path.join(self._nodes_path, f"{node_id}{NODE_SUFFIX}")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        os.makedirs(self._leases_path, exist_ok=True)
+        os.makedirs(self._nodes_path, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self._leases_path, f"{name}{LEASE_SUFFIX}")
+
+    def _expired(self, path: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) > self.ttl
+        except FileNotFoundError:
+            return True
+
+    # --- Heartbeat e renovação ---
+
+    def start(self):
+        with open(self._node_file, 'w', encoding='utf-8') as f:
+            json.dump({"node": self.node_id, "pid": os.getpid(), "startedAt": time.time()}, f)
+        self._thread = threading.Thread(target=self._renew_loop, name="lease-renewal", daemon=True)
+        self._thread.start()
+
+    def _renew_loop(self):
+        while not self._stop.wait(self.ttl / 3):
+            self.renew()
+
+    def renew(self):
+        os.utime(self._node_file)
+        with self._lock:
+            for name in list(self.held):
+                try:
+                    os.utime(self._path(name))
+                except FileNotFoundError:
+                    self.lost.add(name)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for name in list(self.held):
+            self.release(name)
+        if os.path.exists(self._node_file):
+            os.remove(self._node_file)
+
+    def live_nodes(self) -> list:
+        # Nós com heartbeat dentro do ttl (este nó sempre conta)
+        nodes = {self.node_id}
+        for file_name in os.listdir(self._nodes_path):
+            if file_name.endswith(NODE_SUFFIX) and not self._expired(os.path.join(self._nodes_path, file_name)):
+                nodes.add(file_name[:-len(NODE_SUFFIX)])
+        return sorted(nodes)
+
+    # --- Leases ---
+
+    def is_leased(self, name: str) -> bool:
+        return not self._expired(self._path(name))
+
+    def try_acquire(self, name: str) -> bool:
+        path = self._path(name)
+        token = f"{self.node_id}:{uuid.uuid4().hex}"
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                if not self._expired(path) or not self._break_expired(path):
+                    return False
+                continue  # lease vencida removida: tenta criar de novo (outro nó pode chegar antes)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"node": self.node_id, "token": token, "acquiredAt": time.time()}, f)
+            with self._lock:
+                self.held[name] = token
+                self.lost.discard(name)
+            return True
+        return False
+
+    def _break_expired(self, path: str) -> bool:
+        tomb_path = f"{path}.expired.{uuid.uuid4().hex}"
+        try:
+            os.rename(path, tomb_path)
+        except FileNotFoundError:
+            return True  # outro nó já removeu
+        if self._expired(tomb_path):
+            os.remove(tomb_path)
+            metrics.inc("leases_reclaimed")
+            return True
+        # O dono renovou entre a verificação e o rename: devolve a lease (se ninguém a recriou)
+        try:
+            os.link(tomb_path, path)
+        except FileExistsError:
+            pass
+        os.remove(tomb_path)
+        return False
+
+    def still_held(self, name: str) -> bool:
+        # Confere que a lease ainda é deste nó (não foi reclamada por outro depois de uma pausa longa)
+        token = self.held.get(name)
+        if token is None or name in self.lost:
+            return False
+        try:
+            with open(self._path(name), 'r', encoding='utf-8') as f:
+                return json.load(f).get("token") == token
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def release(self, name: str):
+        with self._lock:
+            if self.still_held(name):
+                os.remove(self._path(name))
+            self.held.pop(name, None)
+            self.lost.discard(name)
@@ -1,14 +1,65 @@
+import argparse
+import errno
+import hashlib
 import json
 import os
 import shutil
+import signal
+import socket
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from batch_segments import DEFAULT_SEGMENT_EVENTS, SegmentWriter, segment_index_path
+from checkpoint_journal import DEFAULT_CHECKPOINT_INTERVAL, DEFAULT_JOURNAL_PATH, CheckpointJournal
+from columnar_batch import COLUMNAR_SUFFIX, DEFAULT_CHUNK_ROWS, ColumnarBatchWriter
+from dedup_index import DEFAULT_DEDUP_PATH, DEFAULT_RETENTION_DAYS, EventIdIndex, InvalidEventKey
+from event_decoder import JSON_BACKEND_CHOICES, JSON_BACKENDS, EventDecoder
+from event_schema import EVENT_NAME_CORRECTIONS, build_registry
+from file_leases import DEFAULT_LEASE_TTL, HashRing, LeaseManager
+from journey_stitching import DEFAULT_IDLE_WINDOW_HOURS, DEFAULT_STATE_PATH, JourneyStitcher, stitch_record
+from metrics import (DEFAULT_METRICS_DIR, EVENT_SAMPLE_MASK, flush_rate_limited_logs, metrics,
+                     rate_limited_print)
+from pipeline_io import (COMPRESSION_EXTENSIONS, COMPRESSIONS, JSON_EXTENSIONS, compress_file,
+                         detect_compression, dump_ndjson_record, is_json_array_file, iter_json_file, iter_json_lines,
+                         iter_json_range, open_text, split_record_ranges)
+
 # === Configuração das pastas ===
 LANDING_ZONE_PATH = "landing_zone"
 ARCHIVE_PATH = "archive"
 ERROR_PATH = "error"
 OUTPUT_PATH = "processed_data"
 
+# Formatos de saída: 'ndjson' (streaming, memória constante), 'json' (array indentado, modo original)
+# e 'columnar' (diretório com um arquivo colunar por tipo de evento e dia, ver columnar_batch.py)
+OUTPUT_FORMATS = ("ndjson", "json", "columnar")
+
+# Compressão (gzip/zstd) dos lotes gravados em processed_data e dos arquivos movidos para archive.
+# None mantém os arquivos sem compressão; o main ajusta as duas a partir de --compress e --archive-compress.
+OUTPUT_COMPRESSION = None
+ARCHIVE_COMPRESSION = None
+
+# Limites de cada segmento NDJSON de saída (ver batch_segments); o main ajusta a partir de
+# --segment-events e --segment-bytes
+SEGMENT_EVENTS = DEFAULT_SEGMENT_EVENTS
+SEGMENT_BYTES = None
+
+# Decodificação dos eventos: 'typed' (event_decoder, uma passada por evento gerada da especificação) ou
+# 'chain' (cadeia original validate_event -> clean_event -> flatten_event, mantida para comparação).
+# O main cria o EVENT_DECODER a partir de --decoder e --json-backend; None usa a cadeia.
+DECODERS = ("typed", "chain")
+EVENT_DECODER = None
+
+# Pasta onde cada worker grava sua saída parcial antes do merge
+PARTS_PATH = os.path.join(OUTPUT_PATH, "_parts")
+
+# Com --workers > 1, arquivos sem compressão maiores que isso são divididos em trechos processados
+# por workers diferentes (ver split_record_ranges)
+DEFAULT_SPLIT_BYTES = 32 << 20
+
 def validate_event(event: dict) -> bool:
     # Realizando uma validação estrutural básica no evento
     if "envelope" not in event or "payload" not in event:
@@ -25,10 +76,14 @@ def validate_event(event: dict) -> bool:
 
 def clean_event(event: dict) -> dict:
     # Aplicando regras de correção e limpeza
-    # Correção do erro gerado propositalmente
-    if event["envelope"]["eventName"] == "acquisiton.visitor.landed":
-        event["envelope"]["eventName"] = "acquisition.visitor.landed"
-        print(f"=== Corrigindo eventName para o eventId: {event['envelope']['eventId']}")
+    # Correção do erro gerado propositalmente (tabela EVENT_NAME_CORRECTIONS do event_schema)
+    corrected_name = EVENT_NAME_CORRECTIONS.get(event["envelope"]["eventName"])
+    if corrected_name is not None:
+        event["envelope"]["eventName"] = corrected_name
+        metrics.inc("events_corrected", rule="eventName")
+        # Um print por evento corrigido dominava o tempo de CPU em lotes grandes: a mensagem sai
+        # no máximo uma vez por intervalo e o total fica no contador events_corrected
+        rate_limited_print("correcao_eventName", f"=== Corrigindo eventName para o eventId: {event['envelope']['eventId']}")
     return event
 
 # Função para achatamento
@@ -47,69 +102,1296 @@ def flatten_event(unflattened_event: dict) -> dict: # Cada chave transformada em
     process_dictionary(unflattened_event)
     return flattened_event
 
-# === Bloco principal de execução ===
+# Marcador de fim do iterador de eventos brutos
+_NO_EVENT = object()
 
-if __name__ == "__main__":
-    # Verificando e garantindo que as pastas de trabalho existem, se não, as pastas serão criadas
-    for path in [LANDING_ZONE_PATH, ARCHIVE_PATH, ERROR_PATH, OUTPUT_PATH]:
-        os.makedirs(path, exist_ok=True)
+def is_duplicate(event: dict, dedup) -> bool:
+    # Consulta (e alimenta) o índice de eventIds já vistos em lotes anteriores e neste.
+    # Um eventId ou timestamp malformado levanta InvalidEventKey: quem chama rejeita só esse evento.
+    envelope = event["envelope"]
+    return dedup is not None and dedup.seen_or_add(envelope["eventId"], envelope["eventTimestamp"])
 
-    print(f"[{datetime.now()}] Procurando por novos arquivos em '{LANDING_ZONE_PATH}'...")
- 
-    # 1. Listar arquivos novos
-    # Olha para a landing_zone e faz uma lista de todos os arquivos .json que estão esperando para serem processados
-    files_to_process = [f for f in os.listdir(LANDING_ZONE_PATH) if f.endswith('.json')]
+def transform_events(raw_events, dedup: EventIdIndex = None):
+    # Pipeline de geradores: valida, descarta duplicados, limpa e achata um evento por vez.
+    # Os contadores são variáveis locais, somados ao registro de métricas no fim; o tempo de cada
+    # estágio é medido só em 1 a cada EVENT_SAMPLE_EVERY eventos para não pesar no caminho quente.
+    clock = time.perf_counter
+    iterator = iter(raw_events)
+    events_read = 0
+    events_valid = 0
+    events_duplicate = 0
+    rejected = Counter()  # coluna -> eventos válidos na estrutura mas com chave de deduplicação malformada
+    try:
+        while True:
+            if events_read & EVENT_SAMPLE_MASK:
+                event = next(iterator, _NO_EVENT)
+                if event is _NO_EVENT:
+                    break
+                events_read += 1
+                if validate_event(event):
+                    try:
+                        duplicated = is_duplicate(event, dedup)
+                    except InvalidEventKey as e:
+                        rejected[e.column] += 1
+                        continue
+                    events_valid += 1
+                    if duplicated:
+                        events_duplicate += 1
+                        continue
+                    yield flatten_event(clean_event(event))
+                continue
 
-    if not files_to_process:
-        print("Nenhum arquivo novo para processar.")
+            # Evento amostrado: mede leitura/parse, validação, limpeza e achatamento
+            read_start = clock()
+            event = next(iterator, _NO_EVENT)
+            if event is _NO_EVENT:
+                break
+            events_read += 1
+            validate_start = clock()
+            is_valid = validate_event(event)
+            clean_start = clock()
+            metrics.observe_event_stage("read_parse", validate_start - read_start)
+            metrics.observe_event_stage("validate", clean_start - validate_start)
+            if is_valid:
+                try:
+                    duplicated = is_duplicate(event, dedup)
+                except InvalidEventKey as e:
+                    rejected[e.column] += 1
+                    continue
+                events_valid += 1
+                if duplicated:
+                    events_duplicate += 1
+                    metrics.observe_event_stage("dedup", clock() - clean_start)
+                    continue
+                dedup_end = clock()
+                cleaned_event = clean_event(event)
+                flatten_start = clock()
+                flattened_event = flatten_event(cleaned_event)
+                metrics.observe_event_stage("dedup", dedup_end - clean_start)
+                metrics.observe_event_stage("clean", flatten_start - dedup_end)
+                metrics.observe_event_stage("flatten", clock() - flatten_start)
+                yield flattened_event
+    finally:
+        metrics.inc("events_read", events_read)
+        metrics.inc("events_valid", events_valid)
+        metrics.inc("events_invalid", events_read - events_valid)
+        metrics.inc("events_duplicate", events_duplicate)
+        for column, count in rejected.items():
+            metrics.inc("events_rejected", count, field=column)
+
+def decode_events(raw_events, decoder: EventDecoder, dedup: EventIdIndex = None):
+    # Mesmo papel do transform_events com o decodificador tipado: cada registro cru (linha NDJSON em bytes)
+    # vira a linha achatada e tipada em uma passada, e o índice de duplicados é consultado já na linha.
+    # Mesmos contadores; o tempo amostrado fica em read_parse (só a leitura da linha), decode e dedup.
+    clock = time.perf_counter
+    decode = decoder.decode
+    iterator = iter(raw_events)
+    events_read = 0
+    events_valid = 0
+    events_duplicate = 0
+    try:
+        while True:
+            if events_read & EVENT_SAMPLE_MASK:
+                raw_event = next(iterator, _NO_EVENT)
+                if raw_event is _NO_EVENT:
+                    break
+                events_read += 1
+                row = decode(raw_event)
+                if row is not None:
+                    try:
+                        duplicated = dedup is not None and dedup.seen_or_add(row['envelope_eventId'], row['envelope_eventTimestamp'])
+                    except InvalidEventKey as e:
+                        decoder.rejected[e.column] += 1
+                        continue
+                    events_valid += 1
+                    if duplicated:
+                        events_duplicate += 1
+                        continue
+                    yield row
+                continue
+
+            # Evento amostrado: mede leitura, decodificação e consulta de duplicados
+            read_start = clock()
+            raw_event = next(iterator, _NO_EVENT)
+            if raw_event is _NO_EVENT:
+                break
+            events_read += 1
+            decode_start = clock()
+            row = decode(raw_event)
+            dedup_start = clock()
+            metrics.observe_event_stage("read_parse", decode_start - read_start)
+            metrics.observe_event_stage("decode", dedup_start - decode_start)
+            if row is not None:
+                try:
+                    is_duplicated = dedup is not None and dedup.seen_or_add(row['envelope_eventId'], row['envelope_eventTimestamp'])
+                except InvalidEventKey as e:
+                    decoder.rejected[e.column] += 1
+                    continue
+                events_valid += 1
+                metrics.observe_event_stage("dedup", clock() - dedup_start)
+                if is_duplicated:
+                    events_duplicate += 1
+                    continue
+                yield row
+    finally:
+        metrics.inc("events_read", events_read)
+        metrics.inc("events_valid", events_valid)
+        metrics.inc("events_invalid", events_read - events_valid)
+        metrics.inc("events_duplicate", events_duplicate)
+        for column, count in decoder.rejected.items():
+            metrics.inc("events_rejected", count, field=column)
+        decoder.rejected.clear()
+
+def read_events(source_path: str, dedup: EventIdIndex = None, byte_range: tuple = None):
+    # Eventos achatados de um arquivo da landing_zone (ou do trecho byte_range dele) com o decodificador ativo.
+    # Com o tipado, as linhas NDJSON vão cruas para o backend JSON dele; arrays JSON são lidos pelo parser incremental.
+    if EVENT_DECODER is not None and not is_json_array_file(source_path):
+        return decode_events(iter_json_lines(source_path, byte_range), EVENT_DECODER, dedup)
+    raw_events = iter_json_file(source_path) if byte_range is None else iter_json_range(source_path, *byte_range)
+    if EVENT_DECODER is not None:
+        return decode_events(raw_events, EVENT_DECODER, dedup)
+    return transform_events(raw_events, dedup)
+
+def list_landing_files() -> list:
+    # Olha para a landing_zone e faz uma lista de todos os arquivos que estão esperando para serem processados
+    return sorted(f for f in os.listdir(LANDING_ZONE_PATH) if f.endswith(JSON_EXTENSIONS))
+
+def atomic_move(source_path: str, destination_path: str):
+    # os.replace é atômico dentro do mesmo sistema de arquivos; entre discos diferentes cai para shutil.move
+    try:
+        os.replace(source_path, destination_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.move(source_path, destination_path)
+
+def archive_file(source_path: str, file_name: str):
+    # Move o arquivo de landing_zone para a pasta archive. Com ARCHIVE_COMPRESSION, um arquivo ainda
+    # sem compressão é comprimido no caminho (o original só é removido depois da cópia completa)
+    if ARCHIVE_COMPRESSION is not None and detect_compression(source_path) is None:
+        destination_file_path = os.path.join(ARCHIVE_PATH, file_name + COMPRESSION_EXTENSIONS[ARCHIVE_COMPRESSION])
+        with metrics.timer("compress_archive"):
+            compress_file(source_path, destination_file_path, ARCHIVE_COMPRESSION)
+        os.remove(source_path)
     else:
-        print(f"Encontrados {len(files_to_process)} arquivos: {files_to_process}")
+        destination_file_path = os.path.join(ARCHIVE_PATH, file_name)
+        atomic_move(source_path, destination_file_path)
+    metrics.inc("files", outcome="archived")
+    print(f"Arquivo '{file_name}' processado com sucesso e movido para '{ARCHIVE_PATH}'.")
+
+def move_to_error(source_path: str, file_name: str, error):
+    print(f"Erro ao processar o arquivo '{file_name}': {error}")
+    error_file_path = os.path.join(ERROR_PATH, file_name)
+    atomic_move(source_path, error_file_path)
+    metrics.inc("files", outcome="error")
+    print(f"Arquivo '{file_name}' movido para '{ERROR_PATH}'.")
+
+def new_run_id() -> str:
+    # Instante com microssegundos: duas execuções no mesmo segundo não disputam o mesmo nome de lote
+    return datetime.now().strftime("%Y-%m-%d-%H-%M-%S-%f")
+
+def new_batch_path(extension: str, sequence: int = None, run_id: str = None) -> str:
+    # Lotes em arquivo único ganham a extensão da compressão (.ndjson.zst); o diretório colunar não
+    if extension != COLUMNAR_SUFFIX:
+        extension += COMPRESSION_EXTENSIONS[OUTPUT_COMPRESSION]
+    suffix = "" if sequence is None else f"_{sequence:05d}"
+    output_filename = f"lote_processado_{run_id or new_run_id()}{suffix}{extension}"
+    return os.path.join(OUTPUT_PATH, output_filename)
+
+def new_segment_writer() -> SegmentWriter:
+    # Saída NDJSON de uma execução em segmentos numerados lote_processado_<execução>_<seq>.ndjson
+    run_id = new_run_id()
+    return SegmentWriter(lambda sequence: new_batch_path(".ndjson", sequence, run_id), OUTPUT_COMPRESSION,
+                         SEGMENT_EVENTS, SEGMENT_BYTES)
+
+def open_single_segment(output_path: str) -> SegmentWriter:
+    # Micro-lote (watch) ou chunk (checkpoint) em um único segmento: quem escreve fecha o lote quando
+    # is_full() acusa o limite, em vez de trocar de segmento no meio de um arquivo
+    return SegmentWriter(lambda sequence: output_path, OUTPUT_COMPRESSION, SEGMENT_EVENTS, SEGMENT_BYTES,
+                         auto_roll=False)
 
-        current_batch = []
+def print_published(total_events: int, segments: list):
+    if len(segments) == 1:
+        print(f"\nLote de {total_events} eventos processados salvo em '{segments[0]}'")
+    elif segments:
+        print(f"\nLote de {total_events} eventos processados salvo em {len(segments)} segmentos: "
+              f"'{segments[0]}' ... '{os.path.basename(segments[-1])}'")
 
+def stream_file_to(out, source_path: str, dedup: EventIdIndex = None, stitch=None, byte_range: tuple = None) -> int:
+    # Lê, transforma e escreve um arquivo da landing_zone (ou só o trecho byte_range dele) em NDJSON compacto, evento a evento.
+    # Um destino com encode_record próprio (ColumnarBatchWriter) recebe o que ele devolver em vez da linha NDJSON.
+    # stitch, se informado, recebe o registro de costura de cada evento de funil (ver journey_stitching)
+    encode = getattr(out, "encode_record", dump_ndjson_record)
+    clock = time.perf_counter
+    start_time = clock()
+    file_events = 0
+    for flattened_event in read_events(source_path, dedup, byte_range):
+        if file_events & EVENT_SAMPLE_MASK:
+            out.write(encode(flattened_event))
+        else:
+            write_start = clock()
+            out.write(encode(flattened_event))
+            metrics.observe_event_stage("write", clock() - write_start)
+        file_events += 1
+        if stitch is not None:
+            record = stitch_record(flattened_event)
+            if record is not None:
+                stitch(record)
+    metrics.observe_stage("ingest_file", clock() - start_time)
+    metrics.inc("events_written", file_events)
+    return file_events
+
+def observe_stitch_records(stitcher: JourneyStitcher, records: list):
+    # Os registros de costura de um arquivo ficam guardados até ele ser aceito inteiro: um arquivo que falha
+    # no meio não pode deixar eventos no grafo de identidades nem nos fatos de funil
+    if stitcher is not None and records:
+        for record in records:
+            stitcher.observe(record)
+
+def take_funnel_facts(stitcher: JourneyStitcher = None, final: bool = False) -> list:
+    # Fatos de funil das jornadas fechadas até aqui, já achatados como os demais eventos do lote.
+    # No fim da execução (final), fecha também as jornadas abertas se o stitcher foi criado para isso.
+    if stitcher is None:
+        return []
+    if final and stitcher.flush_at_end:
+        stitcher.flush()
+    facts = [flatten_event(fact) for fact in stitcher.take_facts()]
+    metrics.inc("funnel_facts", len(facts))
+    metrics.inc("stitch_unmatched", stitcher.unmatched)
+    stitcher.unmatched = 0
+    return facts
+
+def write_funnel_facts(out, stitcher: JourneyStitcher = None, final: bool = False) -> int:
+    facts = take_funnel_facts(stitcher, final)
+    encode = getattr(out, "encode_record", dump_ndjson_record)
+    for fact in facts:
+        out.write(encode(fact))
+    return len(facts)
+
+def commit_state(dedup: EventIdIndex = None, stitcher: JourneyStitcher = None):
+    # Índice de duplicados e jornadas abertas só são gravados depois que o lote foi publicado
+    if dedup is not None:
+        dedup.commit()
+    if stitcher is not None:
+        stitcher.commit()
+
+def run_streaming(files_to_process: list, dedup: EventIdIndex = None, stitcher: JourneyStitcher = None) -> int:
+    # Modo streaming: cada evento é lido, transformado e escrito em NDJSON compacto na hora,
+    # então o pico de memória não depende do tamanho dos arquivos
+    out = new_segment_writer()
+    total_events = 0
+    processed_files = []
+
+    try:
         for file_name in files_to_process:
             source_path = os.path.join(LANDING_ZONE_PATH, file_name)
             print(f"\n=== Processando arquivo: {file_name} ===")
-            # Tente processar este arquivo. Se qualquer erro acontecer durante o processo, não pare
+            # Posição do lote (e do índice de duplicados) antes do arquivo, para descartar uma saída
+            # parcial em caso de erro, mesmo que ela já tenha passado para o segmento seguinte
+            file_start = out.begin()
+            dedup_savepoint = dedup.savepoint() if dedup is not None else None
+            stitch_records = [] if stitcher is not None else None
             try:
-                # 2. Extract
-                with open(source_path, 'r', encoding='utf-8') as f:
-                    raw_events = json.load(f)
-
-                # 3. Transform (Validar, Limpar e Achatar)
-                for event in raw_events:
-                    if validate_event(event):
-                        cleaned_event = clean_event(event)
-                        flattened_event = flatten_event(cleaned_event)
-                        current_batch.append(flattened_event)
-
-                # 4. Mover para arquivo (Gerenciamento de Estado)
-                # Move o arquivo de landing_zone para a pasta archive
-                destination_file_path = os.path.join(ARCHIVE_PATH, file_name)
-                shutil.move(source_path, destination_file_path)
-                print(f"Arquivo '{file_name}' processado com sucesso e movido para '{ARCHIVE_PATH}'.")
+                total_events += stream_file_to(out, source_path, dedup,
+                                               stitch_records.append if stitch_records is not None else None)
+                processed_files.append((source_path, file_name))
+                observe_stitch_records(stitcher, stitch_records)
 
             except Exception as e:
-                print(f"Erro ao processar o arquivo '{file_name}': {e}")
-                error_file_path = os.path.join(ERROR_PATH, file_name)
-                shutil.move(destination_file_path, error_file_path)
-                print(f"Arquivo '{file_name}' movido para '{ERROR_PATH}'.")
+                out.rollback_to(file_start)
+                if dedup is not None:
+                    dedup.rollback_to(dedup_savepoint)
+                move_to_error(source_path, file_name, e)
+
+        out.begin()
+        total_events += write_funnel_facts(out, stitcher, final=True)
+    except BaseException:
+        out.abort()
+        raise
+
+    # O lote só aparece para o loader depois de completo; os ids entram no índice (e as jornadas
+    # abertas no estado da costura) depois do lote publicado e os arquivos só são arquivados depois disso
+    print_published(total_events, out.close())
+    commit_state(dedup, stitcher)
+    for source_path, file_name in processed_files:
+        archive_file(source_path, file_name)
+    return total_events
+
+def run_columnar(files_to_process: list, dedup: EventIdIndex = None, stitcher: JourneyStitcher = None,
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS) -> int:
+    # Modo colunar: mesmo fluxo do streaming, mas as linhas vão para um diretório com um arquivo por
+    # tipo de evento e dia. Os chunks cheios só são gravados entre arquivos, então um arquivo com erro
+    # é descartado apenas na memória.
+    writer = ColumnarBatchWriter(new_batch_path(COLUMNAR_SUFFIX), build_registry(), chunk_rows,
+                                 OUTPUT_COMPRESSION)
+    processed_files = []
+
+    try:
+        for file_name in files_to_process:
+            source_path = os.path.join(LANDING_ZONE_PATH, file_name)
+            print(f"\n=== Processando arquivo: {file_name} ===")
+            writer_savepoint = writer.savepoint()
+            dedup_savepoint = dedup.savepoint() if dedup is not None else None
+            stitch_records = [] if stitcher is not None else None
+            try:
+                stream_file_to(writer, source_path, dedup, stitch_records.append if stitch_records is not None else None)
+            except Exception as e:
+                writer.rollback_to(writer_savepoint)
+                if dedup is not None:
+                    dedup.rollback_to(dedup_savepoint)
+                move_to_error(source_path, file_name, e)
+                continue
+            processed_files.append((source_path, file_name))
+            observe_stitch_records(stitcher, stitch_records)
+            with metrics.timer("write_chunks"):
+                writer.flush_full_chunks()
+
+        write_funnel_facts(writer, stitcher, final=True)
+        with metrics.timer("write_chunks"):
+            published = writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+    if published:
+        print(f"\nLote de {writer.events} eventos em {len(writer.chunks)} arquivos colunares salvo em '{writer.output_path}'")
+    commit_state(dedup, stitcher)
+    for source_path, file_name in processed_files:
+        archive_file(source_path, file_name)
+    return writer.events
+
+# Índice de duplicados de cada worker, aberto somente para leitura
+_worker_dedup = None
+# Se os workers devem devolver os registros de costura de jornadas
+_worker_stitching = False
+
+def _init_ingest_worker(dedup_path: str, retention_days: int, stitching: bool = False):
+    global _worker_dedup, _worker_stitching
+    if dedup_path is not None:
+        _worker_dedup = EventIdIndex(dedup_path, retention_days, read_only=True)
+    _worker_stitching = stitching
+
+def process_file_to_part(task: tuple) -> tuple:
+    # Executado dentro de um worker: transforma um arquivo (ou um trecho dele) e grava sua saída parcial.
+    # Não move nada; o processo pai decide o destino do arquivo depois do merge.
+    # Os ids aceitos (um por linha da parte, na ordem) e as métricas do arquivo voltam junto com o
+    # resultado: o worker só enxerga o índice já gravado, os duplicados entre arquivos do mesmo lote
+    # são resolvidos pelo processo pai no merge. A costura de jornadas precisa de estado global, então
+    # o worker só extrai os registros de costura e o processo pai os aplica na ordem dos arquivos.
+    file_name, byte_range = task
+    metrics.reset()
+    dedup = _worker_dedup
+    stitch_records = [] if _worker_stitching else None
+    source_path = os.path.join(LANDING_ZONE_PATH, file_name)
+    part_name = file_name if byte_range is None else f"{file_name}.{byte_range[0]}"
+    part_path = os.path.join(PARTS_PATH, f"{part_name}.{os.getpid()}.part")
+    try:
+        with open(part_path, 'w', encoding='utf-8') as out:
+            file_events = stream_file_to(out, source_path, dedup,
+                                         stitch_records.append if stitch_records is not None else None, byte_range)
+        accepted_ids = dedup.journal_since(0) if dedup is not None else None
+        return file_name, part_path, file_events, None, accepted_ids, stitch_records, metrics.snapshot()
+    except Exception as e:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        return file_name, None, 0, str(e), None, None, metrics.snapshot()
+    finally:
+        if dedup is not None:
+            dedup.rollback_to(0)
+        flush_rate_limited_logs()
+
+def copy_part_without_duplicates(part, out, accepted_ids: list, dedup: EventIdIndex) -> int:
+    # Copia a saída parcial de um worker descartando eventIds já vistos em arquivos anteriores do lote
+    written = 0
+    for line, (day, value) in zip(part, accepted_ids):
+        if dedup.check_key(day, value):
+            continue
+        out.write_line(line)
+        written += 1
+    return written
+
+def plan_parallel_tasks(files_to_process: list, workers: int, split_bytes: int) -> list:
+    # Tarefas (arquivo, trecho) para os workers. Um arquivo sem compressão maior que split_bytes é dividido
+    # em trechos de no máximo split_bytes (e em pelo menos um trecho por worker), então mesmo um único
+    # arquivo grande ocupa todos os workers; os demais arquivos são uma tarefa inteira (trecho None).
+    tasks = []
+    for file_name in files_to_process:
+        source_path = os.path.join(LANDING_ZONE_PATH, file_name)
+        ranges = [None]
+        try:
+            size = os.path.getsize(source_path)
+            if split_bytes and size > split_bytes and detect_compression(source_path) is None:
+                with metrics.timer("split_ranges"):
+                    ranges = split_record_ranges(source_path, min(split_bytes, -(-size // workers))) or [None]
+        except OSError:
+            pass  # o worker processa o arquivo inteiro e o erro segue o caminho normal
+        tasks.extend((file_name, byte_range) for byte_range in ranges)
+    return tasks
+
+def run_parallel(files_to_process: list, workers: int, dedup: EventIdIndex = None,
+                 stitcher: JourneyStitcher = None, split_bytes: int = DEFAULT_SPLIT_BYTES) -> int:
+    # Espalha os arquivos (e os trechos dos arquivos grandes) em um pool de processos. O merge segue a
+    # ordem de files_to_process e dos trechos, então o lote final é o mesmo para qualquer número de workers.
+    os.makedirs(PARTS_PATH, exist_ok=True)
+    tasks = plan_parallel_tasks(files_to_process, workers, split_bytes)
+    print(f"Processando {len(files_to_process)} arquivos ({len(tasks)} tarefas) com {workers} workers...")
+
+    initargs = (dedup.path, dedup.retention_days) if dedup is not None else (None, None)
+    initargs += (stitcher is not None,)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_ingest_worker, initargs=initargs) as executor:
+        task_results = list(executor.map(process_file_to_part, tasks))
+        # Um arquivo dividido com erro em algum trecho é reprocessado inteiro: o erro pode estar no arquivo
+        # (e então ele vai para error como sem divisão) ou ser uma fronteira de array dentro de um elemento
+        tasks_per_file = Counter(file_name for file_name, _ in tasks)
+        retry = list(dict.fromkeys(result[0] for result in task_results
+                                   if result[3] is not None and tasks_per_file[result[0]] > 1))
+        retried = dict(zip(retry, executor.map(process_file_to_part, [(file_name, None) for file_name in retry])))
+
+    results = []
+    for result in task_results:
+        file_name, part_path = result[0], result[1]
+        if file_name in retry:
+            if part_path is not None:
+                os.remove(part_path)
+            result = retried.pop(file_name, None)
+            if result is None:
+                continue
+        file_name, part_path, file_events, error, accepted_ids, stitch_records, snapshot = result
+        metrics.merge(snapshot)
+        results.append((file_name, part_path, file_events, error, accepted_ids))
+        # Duplicados entre arquivos do lote também são observados aqui: a costura é idempotente
+        observe_stitch_records(stitcher, stitch_records)
+
+    out = new_segment_writer()
+    out.begin()
+    total_events = 0
+
+    try:
+        with metrics.timer("merge_parts"):
+            for file_name, part_path, file_events, error, accepted_ids in results:
+                if error is not None:
+                    continue
+                with open(part_path, 'r', encoding='utf-8') as part:
+                    if dedup is None:
+                        for line in part:
+                            out.write_line(line)
+                        total_events += file_events
+                    else:
+                        written = copy_part_without_duplicates(part, out, accepted_ids, dedup)
+                        metrics.inc("events_duplicate", file_events - written)
+                        total_events += written
+            total_events += write_funnel_facts(out, stitcher, final=True)
+    except BaseException:
+        out.abort()
+        raise
+
+    # Primeiro o lote é publicado, depois o estado (duplicados e jornadas) é gravado e os arquivos de origem são movidos
+    print_published(total_events, out.close())
+    commit_state(dedup, stitcher)
+
+    # Depois da nova tentativa, um arquivo com erro tem um único resultado; um arquivo bom pode ter vários trechos
+    errors = {}
+    for file_name, part_path, file_events, error, _ in results:
+        errors[file_name] = error
+        if part_path is not None:
+            os.remove(part_path)
+    for file_name, error in errors.items():
+        source_path = os.path.join(LANDING_ZONE_PATH, file_name)
+        if error is None:
+            archive_file(source_path, file_name)
+        else:
+            move_to_error(source_path, file_name, error)
+
+    return total_events
+
+def run_in_memory(files_to_process: list, dedup: EventIdIndex = None, stitcher: JourneyStitcher = None) -> int:
+    # Modo original: acumula o lote inteiro em memória e salva um array JSON indentado
+    current_batch = []
+
+    for file_name in files_to_process:
+        source_path = os.path.join(LANDING_ZONE_PATH, file_name)
+        print(f"\n=== Processando arquivo: {file_name} ===")
+        dedup_savepoint = dedup.savepoint() if dedup is not None else None
+        # Tente processar este arquivo. Se qualquer erro acontecer durante o processo, não pare
+        try:
+            # 2. Extract / 3. Transform (Validar, Deduplicar, Limpar e Achatar)
+            file_events = list(read_events(source_path, dedup))
+            current_batch.extend(file_events)
+            if stitcher is not None:
+                for flattened_event in file_events:
+                    record = stitch_record(flattened_event)
+                    if record is not None:
+                        stitcher.observe(record)
+
+            # 4. Mover para arquivo (Gerenciamento de Estado)
+            archive_file(source_path, file_name)
+
+        except Exception as e:
+            if dedup is not None:
+                dedup.rollback_to(dedup_savepoint)
+            move_to_error(source_path, file_name, e)
+
+    current_batch.extend(take_funnel_facts(stitcher, final=True))
+
+    # 5. Salvar o lote processado (Load)
+    if current_batch:
+        output_path = new_batch_path(".json")
+
+        # Pega todos os eventos que foram processados com sucesso nesta "rodada" e os salva em um novo arquivo de lote na pasta processed_data
+        with open_text(output_path, 'w') as f, metrics.timer("write_batch"):
+            json.dump(current_batch, f, indent=2, ensure_ascii=False)
+        print(f"\nLote de {len(current_batch)} eventos processados salvo em '{output_path}'")
+    commit_state(dedup, stitcher)
+    return len(current_batch)
+
+# =============================================================================
+# MODO WATCH: DAEMON DE INGESTÃO COM MICRO-LOTES
+# =============================================================================
+
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_MAX_BATCH_EVENTS = 100_000
+DEFAULT_MAX_BATCH_LATENCY = 30.0
+# Quantas latências recentes guardar para os percentis do relatório
+LATENCY_WINDOW = 10_000
+
+def open_micro_batch(sequence: int) -> dict:
+    output_path = new_batch_path(".ndjson", sequence)
+    return {
+        "output_path": output_path,
+        "file": open_single_segment(output_path),
+        "files": [],               # (nome do arquivo, caminho de origem, instante em que chegou na landing_zone)
+        "events": 0,
+        "oldest_arrival": None,
+        "closed": False,
+    }
+
+def add_file_to_micro_batch(batch: dict, file_name: str, dedup: EventIdIndex = None,
+                            stitcher: JourneyStitcher = None) -> bool:
+    # Transforma um arquivo para dentro do micro-lote aberto. Em caso de erro o trecho parcial é
+    # descartado e o arquivo vai direto para error; arquivos bons só são arquivados no flush.
+    source_path = os.path.join(LANDING_ZONE_PATH, file_name)
+    out = batch["file"]
+    file_start = out.begin()
+    dedup_savepoint = dedup.savepoint() if dedup is not None else None
+    stitch_records = [] if stitcher is not None else None
+    try:
+        arrival = os.path.getmtime(source_path)
+        batch["events"] += stream_file_to(out, source_path, dedup,
+                                          stitch_records.append if stitch_records is not None else None)
+    except Exception as e:
+        out.rollback_to(file_start)
+        if dedup is not None:
+            dedup.rollback_to(dedup_savepoint)
+        move_to_error(source_path, file_name, e)
+        return False
+
+    observe_stitch_records(stitcher, stitch_records)
+    batch["files"].append((file_name, source_path, arrival))
+    if batch["oldest_arrival"] is None or arrival < batch["oldest_arrival"]:
+        batch["oldest_arrival"] = arrival
+    return True
+
+def micro_batch_due(batch: dict, max_events: int, max_latency: float) -> bool:
+    # Fecha o lote ao atingir o limite de eventos ou o prazo de latência, o que vier primeiro
+    if not batch["files"]:
+        return False
+    if batch["events"] >= max_events or batch["file"].is_full():
+        return True
+    return time.time() - batch["oldest_arrival"] >= max_latency
 
-        # 5. Salvar o lote processado (Load)
-        if current_batch:
-            batch_timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-            output_filename = f"lote_processado_{batch_timestamp}.json"
-            output_path = os.path.join(OUTPUT_PATH, output_filename)
+def flush_micro_batch(batch: dict, loader=None, dedup: EventIdIndex = None,
+                      stitcher: JourneyStitcher = None, final: bool = False) -> list:
+    # Fecha o lote com os fatos de funil das jornadas encerradas, publica, entrega ao loader (se houver),
+    # grava o estado (duplicados e jornadas abertas) e só então arquiva os arquivos de origem.
+    # Retorna as latências arquivo -> lote publicado (ou -> warehouse, com loader) em segundos.
+    if batch["closed"]:
+        return []
+    batch["file"].begin()
+    batch["events"] += write_funnel_facts(batch["file"], stitcher, final)
+    published = batch["file"].close()
+    batch["closed"] = True
+    if not batch["files"] and not batch["events"]:
+        return []
 
-            # Pega todos os eventos que foram processados com sucesso nesta "rodada" e os salva em um novo arquivo de lote na pasta processed_data
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(current_batch, f, indent=2, ensure_ascii=False)
-            print(f"\nLote de {len(current_batch)} eventos processados salvo em '{output_path}'")
-            
+    # Um micro-lote só de duplicados não é publicado, mas os arquivos de origem são arquivados
+    if published:
+        print(f"\nLote de {batch['events']} eventos de {len(batch['files'])} arquivos salvo em '{batch['output_path']}'")
+        if loader is not None:
+            with metrics.timer("load_batch"):
+                loader(batch["output_path"])
+    commit_state(dedup, stitcher)
+    done_at = time.time()
 
+    for file_name, source_path, _ in batch["files"]:
+        archive_file(source_path, file_name)
+    latencies = [done_at - arrival for _, _, arrival in batch["files"]]
+    for latency in latencies:
+        metrics.observe("file_latency_seconds", latency)
+    metrics.inc("micro_batches")
+    return latencies
 
+def make_in_process_loader(mode: str = "copy"):
+    # Abre uma conexão com o warehouse e devolve uma função que carrega um lote publicado
+    import load_to_dw
 
+    registry = load_to_dw.load_registry()
+    conn = load_to_dw.get_connection()
+    load_to_dw.ensure_tables(conn)
 
+    def load(path: str):
+        start_time = time.perf_counter()
+        event_count, inserted_count, _ = load_to_dw.load_new_batch(conn, registry, path, mode)
+        print(f"🚀 {inserted_count} de {event_count} eventos carregados no warehouse em {time.perf_counter() - start_time:.2f}s")
 
+    return load, conn
 
+def latency_summary(latencies) -> str:
+    ordered = sorted(latencies)
+    if not ordered:
+        return "sem amostras"
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+    return f"p50={percentile(0.50):.2f}s p95={percentile(0.95):.2f}s máx={ordered[-1]:.2f}s"
 
+def run_watch(args, dedup: EventIdIndex = None, stitcher: JourneyStitcher = None):
+    # Daemon: procura arquivos novos a cada poll_interval e os agrupa em micro-lotes
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"\nSinal {signum} recebido, encerrando após fechar o lote atual...")
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    loader, conn = make_in_process_loader(args.load_mode) if args.load else (None, None)
+    target = "warehouse" if loader else "lote publicado"
+
+    print(f"[{datetime.now()}] Observando '{LANDING_ZONE_PATH}' (lote máx. {args.max_batch_events} eventos "
+          f"ou {args.max_batch_latency:.0f}s de latência)...")
+
+    sequence = 0
+    batch = open_micro_batch(sequence)
+    recent_latencies = deque(maxlen=LATENCY_WINDOW)
+    total_files = 0
+    total_events = 0
+
+    try:
+        while not stop.is_set():
+            in_batch = {file_name for file_name, _, _ in batch["files"]}
+            for file_name in list_landing_files():
+                if stop.is_set():
+                    break
+                if file_name in in_batch:
+                    continue
+                print(f"\n=== Processando arquivo: {file_name} ===")
+                add_file_to_micro_batch(batch, file_name, dedup, stitcher)
+                if micro_batch_due(batch, args.max_batch_events, args.max_batch_latency):
+                    break
+
+            if micro_batch_due(batch, args.max_batch_events, args.max_batch_latency):
+                total_files += len(batch["files"])
+                latencies = flush_micro_batch(batch, loader, dedup, stitcher)
+                total_events += batch["events"]
+                recent_latencies.extend(latencies)
+                print(f"⏱️  Latência arquivo -> {target}: {latency_summary(latencies)}")
+                # Relatório com nome fixo, reescrito a cada lote, para ser coletado enquanto o daemon roda
+                metrics.write_report(args.metrics_dir, "ingest_watch", timestamped=False, quiet=True)
+                sequence += 1
+                batch = open_micro_batch(sequence)
+            else:
+                stop.wait(args.poll_interval)
+    finally:
+        # Encerramento limpo: o que já foi transformado é publicado antes de sair
+        total_files += len(batch["files"])
+        recent_latencies.extend(flush_micro_batch(batch, loader, dedup, stitcher, final=True))
+        total_events += batch["events"]
+        if conn is not None:
+            conn.close()
+        flush_rate_limited_logs()
+        metrics.write_report(args.metrics_dir, "ingest_watch", timestamped=False)
+        print(f"\nDaemon encerrado. {total_files} arquivos e {total_events} eventos processados.")
+        print(f"⏱️  Latência arquivo -> {target} (últimos {len(recent_latencies)} arquivos): {latency_summary(recent_latencies)}")
+
+# =============================================================================
+# MODO COM CHECKPOINTS: BACKFILLS RETOMÁVEIS
+# =============================================================================
+
+def plan_checkpoint_tasks(files_to_process: list, journal: CheckpointJournal, range_bytes: int) -> list:
+    # Trechos (arquivo, byte_range) ainda não confirmados no journal. Um arquivo NDJSON sem compressão é lido
+    # em trechos de range_bytes a partir do último offset confirmado, então o progresso também é confirmado
+    # no meio dele; arquivos comprimidos ou em array JSON são uma unidade só (byte_range None).
+    tasks = []
+    for file_name in files_to_process:
+        source_path = os.path.join(LANDING_ZONE_PATH, file_name)
+        try:
+            size = os.path.getsize(source_path)
+            if journal.is_done(file_name, size):
+                continue
+            if detect_compression(source_path) is None and not is_json_array_file(source_path):
+                offset = journal.resume_offset(file_name, size)
+                ranges = split_record_ranges(source_path, range_bytes or size, offset)
+                if ranges or offset is None:
+                    tasks.extend((file_name, byte_range) for byte_range in ranges or [None])
+                continue
+        except OSError:
+            pass  # o erro aparece no processamento e o arquivo segue o caminho normal para error
+        tasks.append((file_name, None))
+    return tasks
+
+def open_checkpoint_chunk(journal: CheckpointJournal) -> dict:
+    # O chunk vai para o journal antes de ser criado, para que uma retomada saiba qual .tmp descartar.
+    # Todos os chunks levam o id da execução do journal, então a carga completa encontra todos eles.
+    output_path = new_batch_path(".ndjson", journal.chunks, journal.run_id)
+    journal.chunk_opened(output_path)
+    return {
+        "output_path": output_path,
+        "file": open_single_segment(output_path),
+        "events": 0,
+    }
+
+def publish_checkpoint(batch: dict, journal: CheckpointJournal, progress: dict, finished: list,
+                       dedup: EventIdIndex = None, stitcher: JourneyStitcher = None, final: bool = False) -> int:
+    # Publica o chunk (com os fatos de funil das jornadas fechadas), grava o estado, confirma o progresso no
+    # journal e só então move os arquivos concluídos. Se a execução cair entre a publicação e o checkpoint,
+    # a retomada refaz só esse chunk: os eventos repetidos são descartados pelo índice de duplicados (se ele
+    # já tiver sido gravado) ou pelo ON CONFLICT da carga.
+    out = batch["file"]
+    out.begin()
+    batch["events"] += write_funnel_facts(out, stitcher, final)
+    published = out.close()
+    chunk_path = published[0] if published else None
+    if chunk_path is not None:
+        print(f"\n💾 Checkpoint: {batch['events']} eventos salvos em '{chunk_path}'")
+    commit_state(dedup, stitcher)
+    journal.checkpoint(chunk_path, batch["events"], progress)
+    metrics.inc("checkpoints")
+    for source_path, file_name in finished:
+        archive_file(source_path, file_name)
+        journal.file_moved(file_name, "archive")
+    return batch["events"]
+
+def run_checkpointed(files_to_process: list, journal: CheckpointJournal, dedup: EventIdIndex = None,
+                     stitcher: JourneyStitcher = None, interval: float = DEFAULT_CHECKPOINT_INTERVAL,
+                     range_bytes: int = DEFAULT_SPLIT_BYTES) -> int:
+    # Modo streaming com checkpoints: a saída é publicada em chunks (lotes numerados) a cada interval segundos,
+    # sempre entre dois trechos, e o progresso de cada arquivo é confirmado no journal. Uma execução que cai
+    # perde só o que foi feito desde o último checkpoint; a seguinte retoma de onde ele parou.
+    journal.discard_stale_chunk()
+    if journal.run_id is None:
+        journal.run_started(new_run_id())
+    if journal.resumed:
+        print(f"♻️  Retomando execução interrompida: {journal.checkpoints} checkpoints confirmados em '{journal.path}'.")
+
+    # Arquivos que uma execução anterior concluiu mas não chegou a mover: os eventos já estão publicados
+    pending_files = []
+    for file_name in files_to_process:
+        source_path = os.path.join(LANDING_ZONE_PATH, file_name)
+        if journal.is_done(file_name, os.path.getsize(source_path)):
+            archive_file(source_path, file_name)
+            journal.file_moved(file_name, "archive")
+        else:
+            pending_files.append(file_name)
+
+    tasks = plan_checkpoint_tasks(pending_files, journal, range_bytes)
+    tasks_left = Counter(file_name for file_name, _ in tasks)
+    batch = open_checkpoint_chunk(journal)
+    progress = {}      # arquivo -> progresso ainda não confirmado
+    finished = []      # arquivos concluídos desde o último checkpoint, movidos depois dele
+    file_starts = {}   # arquivo -> (posição no chunk atual, savepoint do índice) do seu primeiro trecho nele
+    # arquivo -> registros de costura dos seus trechos no chunk atual, aplicados só no checkpoint
+    stitch_records = {}
+
+    def observe_chunk_stitch_records():
+        for records in stitch_records.values():
+            observe_stitch_records(stitcher, records)
+        stitch_records.clear()
+    started, failed = set(), set()
+    total_events = 0
+    last_checkpoint = time.monotonic()
+
+    for file_name, byte_range in tasks:
+        if file_name in failed:
+            continue
+        source_path = os.path.join(LANDING_ZONE_PATH, file_name)
+        if file_name not in started:
+            started.add(file_name)
+            resume = f" (a partir do byte {byte_range[0]})" if byte_range is not None and byte_range[0] else ""
+            print(f"\n=== Processando arquivo: {file_name}{resume} ===")
+        out = batch["file"]
+        position = out.begin()
+        file_starts.setdefault(file_name, (position, dedup.savepoint() if dedup is not None else None))
+        stitch = stitch_records.setdefault(file_name, []).append if stitcher is not None else None
+        try:
+            batch["events"] += stream_file_to(out, source_path, dedup, stitch, byte_range)
+            size = os.path.getsize(source_path)
+        except Exception as e:
+            # Descarta o que o arquivo escreveu no chunk atual; trechos confirmados em checkpoints anteriores
+            # já foram publicados e ficam
+            position, dedup_savepoint = file_starts.pop(file_name)
+            out.rollback_to(position)
+            if dedup is not None:
+                dedup.rollback_to(dedup_savepoint)
+            progress.pop(file_name, None)
+            stitch_records.pop(file_name, None)
+            failed.add(file_name)
+            move_to_error(source_path, file_name, e)
+            journal.file_moved(file_name, "error")
+            continue
+
+        tasks_left[file_name] -= 1
+        done = tasks_left[file_name] == 0
+        progress[file_name] = {"size": size, "offset": byte_range[1] if byte_range is not None else size, "done": done}
+        if done:
+            finished.append((source_path, file_name))
+
+        # Checkpoint pelo intervalo ou pelo tamanho do chunk (limites de segmento)
+        if time.monotonic() - last_checkpoint >= interval or batch["file"].is_full():
+            observe_chunk_stitch_records()
+            total_events += publish_checkpoint(batch, journal, progress, finished, dedup, stitcher)
+            batch = open_checkpoint_chunk(journal)
+            progress, finished = {}, []
+            file_starts.clear()
+            last_checkpoint = time.monotonic()
+
+    observe_chunk_stitch_records()
+    total_events += publish_checkpoint(batch, journal, progress, finished, dedup, stitcher, final=True)
+    journal.finish()
+    print(f"\nExecução concluída: {total_events} eventos publicados nesta execução.")
+    return total_events
+
+# =============================================================================
+# MODO DISTRIBUÍDO: VÁRIOS NÓS NA MESMA LANDING_ZONE
+# Cada arquivo é dividido em unidades de trabalho (o arquivo inteiro ou trechos de --split-bytes), e cada
+# nó assume unidades com leases em arquivo (ver file_leases). A pasta de coordenação, dentro da landing_zone
+# compartilhada, guarda por arquivo:
+#   shards/<arquivo>/plan.json       -> trechos do arquivo, decididos pelo primeiro nó que o vê
+#   shards/<arquivo>/<unidade>.done  -> resultado de uma unidade: segmentos gravados ao lado ou o erro
+#   shards/<arquivo>/publish.json    -> nomes finais dos segmentos, gravados antes de publicá-los
+# e run.json, com o id da execução em andamento: os segmentos de todos os arquivos, de todos os nós, são
+# publicados como lote_processado_<execução>@<parte>_<seq> e a carga completa encontra todos eles.
+# Quando todas as unidades de um arquivo terminam, o nó que conseguir a lease de finalização publica os
+# segmentos em processed_data e move o arquivo para archive (ou para error): um único destino por arquivo,
+# mesmo que um nó caia no meio e outro retome a finalização. O processamento de uma unidade só depende dos
+# bytes dela, então uma unidade refeita por outro nó (depois de uma lease vencida) dá o mesmo resultado.
+# =============================================================================
+
+DEFAULT_COORDINATION_PATH = os.path.join(LANDING_ZONE_PATH, ".coordination")
+WHOLE_FILE_UNIT = "whole"
+
+def default_node_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def shard_directory(coordination_path: str, file_name: str) -> str:
+    return os.path.join(coordination_path, "shards", file_name)
+
+def unit_name(byte_range: tuple = None) -> str:
+    return WHOLE_FILE_UNIT if byte_range is None else f"{byte_range[0]:016d}"
+
+def write_json_atomic(path: str, data: dict):
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+def create_json_once(path: str, data: dict) -> dict:
+    # Cria o arquivo só se ele ainda não existir (o link de um temporário é atômico) e devolve o conteúdo
+    # que ficou valendo: o deste nó ou o de quem chegou antes
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    try:
+        os.link(temp_path, path)
+    except FileExistsError:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    finally:
+        os.remove(temp_path)
+    return data
+
+def read_json(path: str) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def distributed_run_id(coordination_path: str) -> str:
+    # O primeiro nó que publica cria run.json; os demais usam o mesmo id até a landing_zone esvaziar
+    return create_json_once(os.path.join(coordination_path, "run.json"), {"run": new_run_id()})["run"]
+
+def finish_distributed_run(coordination_path: str):
+    # Landing_zone vazia: nenhum nó publica mais nada nesta execução e a próxima ganha um id novo
+    try:
+        os.remove(os.path.join(coordination_path, "run.json"))
+    except FileNotFoundError:
+        pass  # outro nó já encerrou a execução
+
+def load_shard_plan(file_name: str, coordination_path: str, split_bytes: int) -> list:
+    # Trechos de um arquivo. O primeiro nó grava a divisão em plan.json e todos os outros a seguem, mesmo
+    # com outro --split-bytes. Arquivos comprimidos ou menores que split_bytes são uma unidade só (None).
+    shard_path = shard_directory(coordination_path, file_name)
+    plan = read_json(os.path.join(shard_path, "plan.json"))
+    if plan is None:
+        source_path = os.path.join(LANDING_ZONE_PATH, file_name)
+        size = os.path.getsize(source_path)
+        ranges = [None]
+        if split_bytes and size > split_bytes and detect_compression(source_path) is None:
+            with metrics.timer("split_ranges"):
+                ranges = split_record_ranges(source_path, split_bytes) or [None]
+        os.makedirs(shard_path, exist_ok=True)
+        plan = create_json_once(os.path.join(shard_path, "plan.json"), {"file": file_name, "size": size, "ranges": ranges})
+    return [tuple(byte_range) if byte_range is not None else None for byte_range in plan["ranges"]]
+
+def done_marker_path(shard_path: str, byte_range: tuple = None) -> str:
+    return os.path.join(shard_path, f"{unit_name(byte_range)}.done")
+
+def process_shard_unit(file_name: str, byte_range: tuple, shard_path: str, node_id: str) -> dict:
+    # Transforma uma unidade em segmentos dentro da pasta do arquivo (com o nó no nome, para que duas
+    # execuções da mesma unidade não escrevam no mesmo temporário). Devolve o conteúdo do marcador .done.
+    source_path = os.path.join(LANDING_ZONE_PATH, file_name)
+    unit = unit_name(byte_range)
+    extension = ".ndjson" + COMPRESSION_EXTENSIONS[OUTPUT_COMPRESSION]
+    out = SegmentWriter(lambda sequence: os.path.join(shard_path, f"{unit}.{node_id}_{sequence:05d}{extension}"),
+                        OUTPUT_COMPRESSION, SEGMENT_EVENTS, SEGMENT_BYTES)
+    out.begin()
+    try:
+        events = stream_file_to(out, source_path, byte_range=byte_range)
+    except Exception as e:
+        out.abort()
+        return {"unit": unit, "node": node_id, "events": 0, "segments": [], "error": str(e)}
+    except BaseException:
+        out.abort()
+        raise
+    segments = [os.path.basename(path) for path in out.close()]
+    return {"unit": unit, "node": node_id, "events": events, "segments": segments, "error": None}
+
+def publish_shard_segments(file_name: str, shard_path: str, results: list, coordination_path: str) -> list:
+    # Publica os segmentos das unidades em processed_data, na ordem do arquivo, com o id da execução
+    # distribuída e uma parte por arquivo de origem (a sequência é só do arquivo). Os nomes finais vão para
+    # publish.json antes do primeiro movimento: quem retomar uma finalização interrompida usa os mesmos
+    # nomes e só move o que ainda estiver na pasta, sem publicar nada duas vezes.
+    run_id = distributed_run_id(coordination_path)
+    part = hashlib.md5(file_name.encode('utf-8')).hexdigest()[:12]
+    names = []
+    for sequence, staged_name in enumerate(name for result in results for name in result["segments"]):
+        tail = staged_name.rsplit('_', 1)[1]
+        names.append([staged_name, f"lote_processado_{run_id}@{part}_{sequence:05d}{tail[tail.index('.'):]}"])
+    mapping = create_json_once(os.path.join(shard_path, "publish.json"), {"segments": names})
+
+    published = []
+    for staged_name, final_name in mapping["segments"]:
+        staged_path = os.path.join(shard_path, staged_name)
+        final_path = os.path.join(OUTPUT_PATH, final_name)
+        if os.path.exists(staged_path):
+            # Índice antes do segmento; o segmento passa por um .tmp para não aparecer pela metade se a
+            # pasta de coordenação estiver em outro disco
+            atomic_move(segment_index_path(staged_path), segment_index_path(final_path))
+            atomic_move(staged_path, f"{final_path}.tmp")
+            os.replace(f"{final_path}.tmp", final_path)
+        published.append(final_path)
+    return published
+
+def finalize_sharded_file(file_name: str, plan: list, coordination_path: str, leases: LeaseManager) -> tuple:
+    # Dá o destino de um arquivo com todas as unidades concluídas. Só o nó com a lease de finalização age;
+    # os demais seguem em frente. Retorna (finalizado por este nó?, eventos publicados).
+    lease_name = f"{file_name}@finalize"
+    if not leases.try_acquire(lease_name):
+        return False, 0
+    shard_path = shard_directory(coordination_path, file_name)
+    source_path = os.path.join(LANDING_ZONE_PATH, file_name)
+    try:
+        if not os.path.exists(source_path):
+            # Outro nó já deu o destino do arquivo e caiu antes de limpar a pasta
+            shutil.rmtree(shard_path, ignore_errors=True)
+            return False, 0
+        results = [read_json(done_marker_path(shard_path, byte_range)) for byte_range in plan]
+        if any(result is None for result in results):
+            return False, 0
+
+        # Como no modo paralelo, um arquivo dividido com erro em algum trecho é reprocessado inteiro: o erro
+        # pode estar no arquivo ou ser uma fronteira de array dentro de um elemento
+        if len(results) > 1 and any(result["error"] for result in results):
+            whole = read_json(done_marker_path(shard_path))
+            if whole is None:
+                whole = process_shard_unit(file_name, None, shard_path, leases.node_id)
+                write_json_atomic(done_marker_path(shard_path), whole)
+            results = [whole]
+
+        error = next((result["error"] for result in results if result["error"]), None)
+        if error is not None:
+            move_to_error(source_path, file_name, error)
+            shutil.rmtree(shard_path, ignore_errors=True)
+            return True, 0
+
+        published = publish_shard_segments(file_name, shard_path, results, coordination_path)
+        events = sum(result["events"] for result in results)
+        if published:
+            print(f"\nArquivo '{file_name}': {events} eventos publicados em {len(published)} segmento(s).")
+        archive_file(source_path, file_name)
+        shutil.rmtree(shard_path, ignore_errors=True)
+        return True, events
+    finally:
+        leases.release(lease_name)
+
+def claim_next_unit(pending: list, leases: LeaseManager, coordination_path: str) -> tuple:
+    # Unidades deste nó no anel de hashing consistente primeiro (arquivo inteiro pelo nome, trecho pelo nome
+    # + início, para que os trechos de um arquivo grande se espalhem). Sem elas, rouba do nó com mais
+    # unidades ainda livres (o mais atrasado), pelo fim da fila dele, para não disputar com o dono, que
+    # avança pelo começo. Nós mortos saem do anel e as unidades deles passam para os vizinhos.
+    # Retorna (arquivo, trecho, lease, roubada?) ou None.
+    ring = HashRing(leases.live_nodes())
+    free_by_owner = {}
+    for file_name, byte_range in pending:
+        lease_name = f"{file_name}@{unit_name(byte_range)}"
+        if leases.is_leased(lease_name):
+            continue
+        key = file_name if byte_range is None else f"{file_name}@{byte_range[0]}"
+        free_by_owner.setdefault(ring.owner(key), []).append((file_name, byte_range, lease_name))
+
+    candidates = [(unit, False) for unit in free_by_owner.pop(leases.node_id, [])]
+    for _, units in sorted(free_by_owner.items(), key=lambda item: -len(item[1])):
+        candidates.extend((unit, True) for unit in reversed(units))
+
+    for (file_name, byte_range, lease_name), stolen in candidates:
+        if not leases.try_acquire(lease_name):
+            continue
+        # Outro nó pode ter concluído a unidade entre a listagem e a lease
+        if os.path.exists(done_marker_path(shard_directory(coordination_path, file_name), byte_range)):
+            leases.release(lease_name)
+            continue
+        return file_name, byte_range, lease_name, stolen
+    return None
+
+def run_distributed(args) -> int:
+    # Um nó de ingestão: assume unidades até a landing_zone esvaziar. Unidades presas com outros nós são
+    # esperadas (e reclamadas se a lease deles vencer), então todos os nós terminam juntos.
+    print("ℹ️  Modo distribuído: sem deduplicação nem costura de jornadas na ingestão (o estado delas é local a "
+          "cada nó); duplicados são descartados pelo ON CONFLICT da carga (incremental ou completa).")
+    leases = LeaseManager(args.coordination_path, args.node_id, args.lease_ttl)
+    leases.start()
+    print(f"[{datetime.now()}] Nó '{args.node_id}' processando '{LANDING_ZONE_PATH}' "
+          f"(coordenação em '{args.coordination_path}', lease de {args.lease_ttl:.0f}s)...")
+
+    plans = {}
+    total_events = 0
+    units_processed = units_stolen = files_finalized = 0
+    try:
+        while True:
+            files = list_landing_files()
+            if not files:
+                finish_distributed_run(args.coordination_path)
+                break
+            plans = {file_name: plans[file_name] for file_name in files if file_name in plans}
+            pending = []
+            for file_name in files:
+                try:
+                    if file_name not in plans:
+                        plans[file_name] = load_shard_plan(file_name, args.coordination_path, args.split_bytes)
+                except OSError:
+                    continue  # finalizado por outro nó enquanto a pasta era listada
+                shard_path = shard_directory(args.coordination_path, file_name)
+                pending.extend((file_name, byte_range) for byte_range in plans[file_name]
+                               if not os.path.exists(done_marker_path(shard_path, byte_range)))
+
+            claimed = claim_next_unit(pending, leases, args.coordination_path)
+            if claimed is None:
+                # Nada livre: finaliza os arquivos completos e espera as unidades em andamento nos outros nós
+                for file_name, plan in list(plans.items()):
+                    finalized, events = finalize_sharded_file(file_name, plan, args.coordination_path, leases)
+                    files_finalized += finalized
+                    total_events += events
+                time.sleep(args.poll_interval)
+                continue
+
+            file_name, byte_range, lease_name, stolen = claimed
+            shard_path = shard_directory(args.coordination_path, file_name)
+            label = "arquivo inteiro" if byte_range is None else f"bytes {byte_range[0]}-{byte_range[1]}"
+            print(f"\n=== {'Roubando' if stolen else 'Processando'} {file_name} ({label}) ===")
+            try:
+                result = process_shard_unit(file_name, byte_range, shard_path, args.node_id)
+                # Uma lease perdida (nó pausado além do ttl) é de outro nó agora: o resultado fica com ele
+                if leases.still_held(lease_name):
+                    write_json_atomic(done_marker_path(shard_path, byte_range), result)
+                    units_processed += 1
+                    units_stolen += stolen
+                    metrics.inc("units_processed", stolen=str(stolen).lower())
+                else:
+                    print(f"⚠️  Lease de {file_name} ({label}) perdida para outro nó; resultado descartado.")
+            except FileNotFoundError:
+                pass  # o arquivo foi finalizado por outro nó no meio do caminho
+            finally:
+                leases.release(lease_name)
+
+            finalized, events = finalize_sharded_file(file_name, plans[file_name], args.coordination_path, leases)
+            files_finalized += finalized
+            total_events += events
+    finally:
+        leases.stop()
+
+    print(f"\nNó '{args.node_id}': {units_processed} unidades processadas ({units_stolen} roubadas de outros nós), "
+          f"{files_finalized} arquivos finalizados, {total_events} eventos publicados.")
+    return total_events
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Valida, limpa e achata os arquivos da landing_zone.")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="ndjson",
+                        help="'ndjson' grava em streaming com memória constante; 'json' mantém o array indentado original; "
+                             "'columnar' grava um diretório com arquivos colunares por tipo de evento e dia.")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                        help="Com --output-format columnar, máximo de linhas por arquivo de um tipo de evento em um dia.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Número de processos para transformar arquivos em paralelo (apenas com --output-format ndjson).")
+    parser.add_argument("--split-bytes", type=int, default=DEFAULT_SPLIT_BYTES,
+                        help="Com --workers > 1 ou --distributed, divide arquivos sem compressão maiores que isso (bytes) em trechos "
+                             "processados em paralelo; 0 desliga a divisão.")
+    parser.add_argument("--segment-events", type=int, default=DEFAULT_SEGMENT_EVENTS,
+                        help="Saída NDJSON: máximo de eventos por segmento (lote_processado_<execução>_<seq>.ndjson).")
+    parser.add_argument("--segment-bytes", type=int, default=None,
+                        help="Saída NDJSON: máximo de bytes (antes da compressão) por segmento.")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Publica a saída em chunks com checkpoints em um journal, para retomar uma execução longa "
+                             "interrompida de onde ela parou (saída ndjson, um worker).")
+    parser.add_argument("--checkpoint-interval", type=float, default=DEFAULT_CHECKPOINT_INTERVAL,
+                        help="Com --checkpoint, segundos entre checkpoints (o máximo de trabalho perdido em uma queda).")
+    parser.add_argument("--checkpoint-journal", default=DEFAULT_JOURNAL_PATH,
+                        help="Arquivo do journal de checkpoints.")
+    parser.add_argument("--distributed", action="store_true",
+                        help="Um nó entre vários (hosts ou processos) que dividem a mesma landing_zone, coordenados "
+                             "por leases em arquivo; termina quando a landing_zone esvazia.")
+    parser.add_argument("--node-id", default=default_node_id(),
+                        help="Com --distributed, nome único do nó (padrão: <host>-<pid>).")
+    parser.add_argument("--coordination-path", default=DEFAULT_COORDINATION_PATH,
+                        help="Com --distributed, pasta compartilhada de leases e trechos (dentro da landing_zone).")
+    parser.add_argument("--lease-ttl", type=float, default=DEFAULT_LEASE_TTL,
+                        help="Com --distributed, segundos sem renovação para a lease de um nó ser considerada abandonada.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Roda como daemon, processando arquivos novos em micro-lotes até receber SIGINT/SIGTERM.")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="Segundos entre verificações da landing_zone no modo watch.")
+    parser.add_argument("--max-batch-events", type=int, default=DEFAULT_MAX_BATCH_EVENTS,
+                        help="Fecha o micro-lote ao atingir este número de eventos.")
+    parser.add_argument("--max-batch-latency", type=float, default=DEFAULT_MAX_BATCH_LATENCY,
+                        help="Fecha o micro-lote quando o arquivo mais antigo nele chegou há este número de segundos.")
+    parser.add_argument("--load", action="store_true",
+                        help="No modo watch, carrega cada micro-lote no warehouse no mesmo processo (load_to_dw).")
+    parser.add_argument("--load-mode", choices=("copy", "insert"), default="copy",
+                        help="Modo de carga usado com --load.")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Não consulta o índice de eventIds já processados (duplicados passam adiante).")
+    parser.add_argument("--dedup-path", default=DEFAULT_DEDUP_PATH,
+                        help="Pasta do índice persistente de eventIds já processados.")
+    parser.add_argument("--dedup-retention-days", type=int, default=DEFAULT_RETENTION_DAYS,
+                        help="Dias de eventos (pela data do evento) mantidos no índice de duplicados.")
+    parser.add_argument("--no-stitching", action="store_true",
+                        help="Não costura as jornadas (sem fatos de funil para a tabela journey_funnel).")
+    parser.add_argument("--stitching-state", default=DEFAULT_STATE_PATH,
+                        help="Arquivo com as jornadas ainda abertas, mantido entre execuções.")
+    parser.add_argument("--stitching-window-hours", type=float, default=DEFAULT_IDLE_WINDOW_HOURS,
+                        help="Horas sem eventos (em tempo de evento) para uma jornada ser fechada e virar fato de funil.")
+    parser.add_argument("--flush-journeys", action="store_true",
+                        help="Fecha todas as jornadas abertas ao fim da execução (ex.: reprocessamento de um período fechado).")
+    parser.add_argument("--compress", choices=COMPRESSIONS,
+                        help="Comprime os lotes gravados em processed_data (gzip ou zstd; zstd requer o pacote zstandard).")
+    parser.add_argument("--archive-compress", choices=COMPRESSIONS,
+                        help="Comprime os arquivos de origem ao movê-los para archive (os já comprimidos são só movidos).")
+    parser.add_argument("--decoder", choices=DECODERS, default="typed",
+                        help="Decodificação dos eventos: 'typed' (uma passada por evento gerada da especificação, ver "
+                             "event_decoder.py) ou 'chain' (validate/clean/flatten originais, para comparação).")
+    parser.add_argument("--json-backend", choices=JSON_BACKEND_CHOICES, default="auto",
+                        help="Parser JSON do decodificador tipado (auto: orjson se instalado, senão o json da biblioteca padrão).")
+    parser.add_argument("--metrics-dir", default=DEFAULT_METRICS_DIR,
+                        help="Pasta onde o relatório de métricas (JSON e Prometheus) é gravado ao fim da execução.")
+    args = parser.parse_args(argv)
+    if args.watch and (args.output_format != "ndjson" or args.workers > 1):
+        parser.error("--watch usa saída ndjson com um único worker.")
+    if args.load and not args.watch:
+        parser.error("--load só é suportado com --watch.")
+    if args.workers < 1:
+        parser.error("--workers deve ser maior ou igual a 1.")
+    if args.segment_events < 1 or (args.segment_bytes is not None and args.segment_bytes < 1):
+        parser.error("--segment-events e --segment-bytes devem ser maiores ou iguais a 1.")
+    if args.split_bytes < 0:
+        parser.error("--split-bytes deve ser maior ou igual a 0.")
+    if args.chunk_rows < 1:
+        parser.error("--chunk-rows deve ser maior ou igual a 1.")
+    if args.workers > 1 and args.output_format != "ndjson":
+        parser.error("--workers > 1 só é suportado com --output-format ndjson.")
+    if args.checkpoint and (args.watch or args.output_format != "ndjson" or args.workers > 1):
+        parser.error("--checkpoint usa saída ndjson com um único worker, sem --watch.")
+    if args.distributed and (args.watch or args.checkpoint or args.output_format != "ndjson" or args.workers > 1):
+        parser.error("--distributed usa saída ndjson com um único worker por nó, sem --watch nem --checkpoint.")
+    if args.lease_ttl <= 0:
+        parser.error("--lease-ttl deve ser maior que 0.")
+    if '@' in args.node_id or os.sep in args.node_id:
+        parser.error("--node-id não pode conter '@' nem separadores de pasta.")
+    if args.json_backend != "auto" and args.decoder != "typed":
+        parser.error("--json-backend só é usado com --decoder typed.")
+    if args.json_backend not in ("auto",) + tuple(JSON_BACKENDS):
+        parser.error(f"--json-backend {args.json_backend} requer o pacote '{args.json_backend}' (pip install {args.json_backend}).")
+    if args.checkpoint_interval < 0:
+        parser.error("--checkpoint-interval deve ser maior ou igual a 0.")
+    if not args.checkpoint and os.path.exists(args.checkpoint_journal):
+        parser.error(f"Há uma execução com checkpoints interrompida ('{args.checkpoint_journal}'): "
+                     "rode com --checkpoint para retomá-la ou apague o journal para descartá-la.")
+    return args
+
+# === Bloco principal de execução ===
+
+def main(argv=None):
+    global OUTPUT_COMPRESSION, ARCHIVE_COMPRESSION, SEGMENT_EVENTS, SEGMENT_BYTES, EVENT_DECODER
+    args = parse_args(argv)
+    OUTPUT_COMPRESSION, ARCHIVE_COMPRESSION = args.compress, args.archive_compress
+    SEGMENT_EVENTS, SEGMENT_BYTES = args.segment_events, args.segment_bytes
+    EVENT_DECODER = EventDecoder(args.json_backend) if args.decoder == "typed" else None
+
+    # Verificando e garantindo que as pastas de trabalho existem, se não, as pastas serão criadas
+    for path in [LANDING_ZONE_PATH, ARCHIVE_PATH, ERROR_PATH, OUTPUT_PATH]:
+        os.makedirs(path, exist_ok=True)
+
+    if args.distributed:
+        run_distributed(args)
+        flush_rate_limited_logs()
+        metrics.write_report(args.metrics_dir, f"ingest_{args.node_id}")
+        return
+
+    dedup = None if args.no_dedup else EventIdIndex(args.dedup_path, args.dedup_retention_days)
+    stitcher = None if args.no_stitching else JourneyStitcher(
+        args.stitching_state, args.stitching_window_hours, flush_at_end=args.flush_journeys
+    )
+
+    journal = CheckpointJournal(args.checkpoint_journal) if args.checkpoint else None
+
+    if args.watch:
+        run_watch(args, dedup, stitcher)
+        return
+
+    print(f"[{datetime.now()}] Procurando por novos arquivos em '{LANDING_ZONE_PATH}'...")
+ 
+    # 1. Listar arquivos novos
+    files_to_process = list_landing_files()
+
+    if not files_to_process:
+        print("Nenhum arquivo novo para processar.")
+        if journal is not None:
+            journal.finish()
+        return
+
+    print(f"Encontrados {len(files_to_process)} arquivos: {files_to_process}")
+
+    if journal is not None:
+        run_checkpointed(files_to_process, journal, dedup, stitcher, args.checkpoint_interval, args.split_bytes)
+    elif args.output_format == "ndjson" and args.workers > 1:
+        run_parallel(files_to_process, args.workers, dedup, stitcher, args.split_bytes)
+    elif args.output_format == "ndjson":
+        run_streaming(files_to_process, dedup, stitcher)
+    elif args.output_format == "columnar":
+        run_columnar(files_to_process, dedup, stitcher, args.chunk_rows)
+    else:
+        run_in_memory(files_to_process, dedup, stitcher)
+
+    flush_rate_limited_logs()
+    metrics.write_report(args.metrics_dir, "ingest")
+
+if __name__ == "__main__":
+    main()
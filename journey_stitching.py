@@ -0,0 +1,319 @@
+import heapq
+import json
+import os
+import uuid
+from datetime import datetime
+
+# =============================================================================
+# COSTURA DE JORNADAS EM STREAMING
+# Liga visitor_landed -> user_created pelo anonymousId e login/playback pelo userId enquanto os
+# eventos passam pela ingestão, sem joins no warehouse. Dois índices em memória:
+#   anonymousId -> jornada aberta (estágios alcançados, atribuição, userId)
+#   userId      -> anonymousId da jornada
+# Uma jornada sem eventos há mais de idle_window em tempo de evento (em relação à marca d'água,
+# o maior timestamp já visto) é fechada e vira um fato de funil compacto, roteado pelo loader para
+# a tabela journey_funnel como qualquer outro evento. O estado aberto é salvo entre execuções em:
+#   stitching_state.json     -> snapshot de todas as jornadas abertas
+#   stitching_state.json.log -> NDJSON só de acréscimo, uma linha por commit com as jornadas alteradas e as
+#                               fechadas desde o anterior
+# Um commit custa o que mudou desde o último, não o total de jornadas abertas. Quando o log passa do
+# tamanho do snapshot (ou um commit altera metade das jornadas) o estado é compactado em um snapshot novo;
+# cada linha tem um número de sequência e o snapshot guarda o último incluído, então uma queda no meio da
+# compactação não reaplica nada.
+# =============================================================================
+
+FUNNEL_EVENT_NAME = "journey.funnel.stitched"
+FUNNEL_STAGES = ("landed", "signed_up", "logged_in", "played")
+LANDED, SIGNED_UP, LOGGED_IN, PLAYED = range(len(FUNNEL_STAGES))
+
+DEFAULT_STATE_PATH = "stitching_state.json"
+DEFAULT_IDLE_WINDOW_HOURS = 24
+DEFAULT_MAX_JOURNEYS = 1_000_000
+# A expiração é verificada a cada EVICTION_CHECK_EVERY eventos observados
+EVICTION_CHECK_EVERY = 1_024
+# O log de alterações só é compactado depois de passar deste tamanho (ou do tamanho do snapshot)
+STATE_LOG_MIN_BYTES = 4 * 1024 * 1024
+
+# Namespace dos eventIds dos fatos (uuid5): a mesma jornada gera sempre o mesmo id
+FUNNEL_NAMESPACE = uuid.UUID("6f1c3c52-4d1e-4a8e-9d59-5f3b8f0e7a21")
+
+# Estágio de cada evento que participa da costura
+STAGE_BY_EVENT_NAME = {
+    "acquisition.visitor.landed": LANDED,
+    "membership.user.created": SIGNED_UP,
+    "membership.user.login_succeeded": LOGGED_IN,
+    "playback.session.started": PLAYED,
+}
+
+def parse_timestamp(timestamp: str) -> float:
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+
+def stitch_record(event: dict):
+    # Extrai de um evento achatado só o que a costura usa: (estágio, timestamp, chave, extra).
+    # A tupla é pequena o bastante para voltar de um worker para o processo pai.
+    stage = STAGE_BY_EVENT_NAME.get(event.get('envelope_eventName'))
+    if stage is None:
+        return None
+    timestamp = event['envelope_eventTimestamp']
+    if stage == LANDED:
+        attributes = (event.get('payload_attribution_source'), event.get('payload_attribution_medium'),
+                      event.get('payload_attribution_campaign'), event.get('payload_device_type'),
+                      event.get('payload_geolocation_country'))
+        return stage, timestamp, event.get('payload_anonymousId'), attributes
+    if stage == SIGNED_UP:
+        return stage, timestamp, event.get('payload_anonymousId'), event.get('payload_userId')
+    return stage, timestamp, event.get('payload_userId'), None
+
+class Journey:
+    __slots__ = ("anonymous_id", "user_id", "stages", "last_seen", "attributes")
+
+    def __init__(self, anonymous_id: str):
+        self.anonymous_id = anonymous_id
+        self.user_id = None
+        self.stages = [None] * len(FUNNEL_STAGES)  # (epoch, timestamp ISO) da primeira vez em cada estágio
+        self.last_seen = None
+        self.attributes = None
+
+    def mark(self, stage: int, epoch: float, timestamp: str) -> bool:
+        # Registra o estágio (fica a primeira ocorrência) e devolve True se last_seen avançou.
+        # Reprocessar os mesmos eventos não muda nada: as operações são de mínimo e máximo.
+        current = self.stages[stage]
+        if current is None or epoch < current[0]:
+            self.stages[stage] = (epoch, timestamp)
+        if self.last_seen is None or epoch > self.last_seen:
+            self.last_seen = epoch
+            return True
+        return False
+
+    def to_fact(self) -> dict:
+        # Fato de funil no mesmo formato aninhado dos eventos (envelope + payload)
+        reached = [stage for stage, value in enumerate(self.stages) if value is not None]
+        first_epoch, first_timestamp = min(self.stages[stage] for stage in reached)
+        at = [value[1] if value else None for value in self.stages]
+        source, medium, campaign, device_type, country = self.attributes or (None,) * 5
+        return {
+            "envelope": {
+                "eventId": str(uuid.uuid5(FUNNEL_NAMESPACE, f"{self.anonymous_id}|{first_timestamp}")),
+                "eventTimestamp": first_timestamp,
+                "eventName": FUNNEL_EVENT_NAME,
+                "eventVersion": "1.0.0",
+                "source": "journey-stitcher",
+                "domain": "Journey",
+            },
+            "payload": {
+                "anonymousId": self.anonymous_id,
+                "userId": self.user_id,
+                "funnelStage": FUNNEL_STAGES[max(reached)],
+                "landedAt": at[LANDED],
+                "signedUpAt": at[SIGNED_UP],
+                "firstLoginAt": at[LOGGED_IN],
+                "firstPlaybackAt": at[PLAYED],
+                "attribution": {"source": source, "medium": medium, "campaign": campaign},
+                "device": {"type": device_type},
+                "geolocation": {"country": country},
+            },
+        }
+
+    def to_state(self) -> list:
+        return [self.anonymous_id, self.user_id, self.stages, self.last_seen, self.attributes]
+
+    @classmethod
+    def from_state(cls, state: list):
+        journey = cls(state[0])
+        journey.user_id = state[1]
+        journey.stages = [tuple(value) if value else None for value in state[2]]
+        journey.last_seen = state[3]
+        journey.attributes = tuple(state[4]) if state[4] else None
+        return journey
+
+class JourneyStitcher:
+    def __init__(self, path: str = DEFAULT_STATE_PATH, idle_window_hours: float = DEFAULT_IDLE_WINDOW_HOURS,
+                 max_journeys: int = DEFAULT_MAX_JOURNEYS, flush_at_end: bool = False):
+        self.path = path
+        self.idle_window = idle_window_hours * 3600
+        self.max_journeys = max_journeys
+        self.flush_at_end = flush_at_end  # fecha todas as jornadas abertas no fim da execução
+        self.journeys = {}    # anonymousId -> Journey
+        self.users = {}       # userId -> anonymousId
+        self.watermark = None
+        self.facts = []       # fatos de jornadas fechadas, ainda não gravados
+        self.unmatched = 0    # login/playback de usuários sem cadastro na janela (ex.: usuários antigos)
+        self._expiry = []     # heap (last_seen, anonymousId); entradas desatualizadas são puladas
+        self._since_check = 0
+        self.log_path = f"{path}.log"
+        self._changed = set()  # jornadas alteradas desde o último commit
+        self._closed = set()   # jornadas fechadas desde o último commit
+        self._sequence = 0     # último commit gravado (snapshot ou linha do log)
+        self._committed_watermark = None
+        self._snapshot_bytes = 0
+        self._log_bytes = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.journeys)
+
+    def _journey(self, anonymous_id: str) -> Journey:
+        journey = self.journeys.get(anonymous_id)
+        if journey is None:
+            journey = self.journeys[anonymous_id] = Journey(anonymous_id)
+        return journey
+
+    def observe(self, record: tuple):
+        stage, timestamp, key, extra = record
+        if key is None:
+            return
+        epoch = parse_timestamp(timestamp)
+        if self.watermark is None or epoch > self.watermark:
+            self.watermark = epoch
+
+        if stage == LANDED:
+            journey = self._journey(key)
+            if journey.attributes is None:
+                journey.attributes = extra
+        elif stage == SIGNED_UP:
+            journey = self._journey(key)
+            if extra is not None:
+                journey.user_id = extra
+                self.users[extra] = key
+        else:
+            anonymous_id = self.users.get(key)
+            if anonymous_id is None:
+                self.unmatched += 1
+                return
+            journey = self.journeys[anonymous_id]
+
+        self._changed.add(journey.anonymous_id)
+        if journey.mark(stage, epoch, timestamp):
+            heapq.heappush(self._expiry, (journey.last_seen, journey.anonymous_id))
+
+        self._since_check += 1
+        if self._since_check >= EVICTION_CHECK_EVERY:
+            self.evict()
+
+    def _close(self, journey: Journey):
+        self.facts.append(journey.to_fact())
+        del self.journeys[journey.anonymous_id]
+        self._closed.add(journey.anonymous_id)
+        if journey.user_id is not None and self.users.get(journey.user_id) == journey.anonymous_id:
+            del self.users[journey.user_id]
+
+    def evict(self) -> int:
+        # Fecha as jornadas ociosas em relação à marca d'água e, se passar do limite de memória,
+        # as menos recentes. Devolve quantas foram fechadas.
+        self._since_check = 0
+        if self.watermark is None:
+            return 0
+        horizon = self.watermark - self.idle_window
+        closed = 0
+        while self._expiry and (self._expiry[0][0] < horizon or len(self.journeys) > self.max_journeys):
+            last_seen, anonymous_id = heapq.heappop(self._expiry)
+            journey = self.journeys.get(anonymous_id)
+            if journey is None or journey.last_seen != last_seen:
+                continue
+            self._close(journey)
+            closed += 1
+        return closed
+
+    def flush(self) -> int:
+        # Fecha todas as jornadas abertas (ex.: última execução de um período)
+        journeys = sorted(self.journeys.values(), key=lambda journey: journey.last_seen)
+        for journey in journeys:
+            self._close(journey)
+        self._expiry = []
+        return len(journeys)
+
+    def take_facts(self) -> list:
+        facts, self.facts = self.facts, []
+        return facts
+
+    # --- Estado entre execuções ---
+
+    def commit(self):
+        # Grava as jornadas alteradas e fechadas desde o último commit; chamado depois que o lote com os
+        # fatos já fechados foi publicado
+        if not self._changed and not self._closed and self.watermark == self._committed_watermark:
+            return
+        self._sequence += 1
+        # Um commit que alterou metade das jornadas (ex.: o primeiro) ou um log maior que o snapshot viram
+        # um snapshot novo: o log nunca custa na carga muito mais que o próprio snapshot
+        if len(self._changed) * 2 >= len(self.journeys) or \
+                self._log_bytes > max(self._snapshot_bytes, STATE_LOG_MIN_BYTES):
+            self._write_snapshot()
+        else:
+            entry = {
+                "sequence": self._sequence,
+                "watermark": self.watermark,
+                "closed": [anonymous_id for anonymous_id in self._closed if anonymous_id not in self.journeys],
+                "journeys": [self.journeys[anonymous_id].to_state() for anonymous_id in self._changed
+                             if anonymous_id in self.journeys],
+            }
+            line = json.dumps(entry, separators=(',', ':')) + '\n'
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._log_bytes += len(line)
+        self._changed.clear()
+        self._closed.clear()
+        self._committed_watermark = self.watermark
+
+    def _write_snapshot(self):
+        # Compactação: todas as jornadas abertas em um snapshot novo, e só depois o log é esvaziado
+        state = {
+            "sequence": self._sequence,
+            "watermark": self.watermark,
+            "journeys": [journey.to_state() for journey in self.journeys.values()],
+        }
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+        self._snapshot_bytes = os.path.getsize(self.path)
+        open(self.log_path, 'w').close()
+        self._log_bytes = 0
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self._sequence = state.get("sequence", 0)
+            self.watermark = state["watermark"]
+            for journey_state in state["journeys"]:
+                journey = Journey.from_state(journey_state)
+                self.journeys[journey.anonymous_id] = journey
+            self._snapshot_bytes = os.path.getsize(self.path)
+        if os.path.exists(self.log_path):
+            self._replay_log()
+        self._committed_watermark = self.watermark
+        for journey in self.journeys.values():
+            if journey.user_id is not None:
+                self.users[journey.user_id] = journey.anonymous_id
+        self._expiry = [(journey.last_seen, journey.anonymous_id) for journey in self.journeys.values()]
+        heapq.heapify(self._expiry)
+
+    def _replay_log(self):
+        # Aplica os commits posteriores ao snapshot. Uma última linha cortada por uma queda é descartada
+        # (e truncada, para que o próximo commit não fique depois dela).
+        valid_bytes = 0
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                valid_bytes += len(line)
+                if entry["sequence"] <= self._sequence:
+                    continue  # já está no snapshot (queda durante a compactação)
+                for anonymous_id in entry["closed"]:
+                    self.journeys.pop(anonymous_id, None)
+                for journey_state in entry["journeys"]:
+                    journey = Journey.from_state(journey_state)
+                    self.journeys[journey.anonymous_id] = journey
+                self._sequence = entry["sequence"]
+                self.watermark = entry["watermark"]
+        if valid_bytes < os.path.getsize(self.log_path):
+            with open(self.log_path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        self._log_bytes = valid_bytes
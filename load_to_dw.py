@@ -1,9 +1,24 @@
 import psycopg
 import sys # Usado para obter detalhes do erro
 import os
-import json
+import time
+import hashlib
+import argparse
+import re
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
 
+from async_loader import DEFAULT_WRITERS, run_pipelined_load
+from batch_segments import read_segment_index, segment_part, segment_run
+from columnar_batch import COLUMNAR_SUFFIX, MANIFEST_FILE, batch_size, is_columnar_batch, read_chunk, read_manifest
+from event_schema import (DDL_PATH, EVENT_TABLES, USER_EVENT_TABLES, extract_compact, load_registry, partition_day,
+                          render_ddl, render_partition)
+from metrics import DEFAULT_METRICS_DIR, EVENT_SAMPLE_MASK, metrics
+from pipeline_io import JSON_EXTENSIONS, iter_json_file, open_binary
+
 load_dotenv()
 
 DB_USER = os.getenv("DB_USER")
@@ -14,227 +29,760 @@ DB_NAME = os.getenv("DB_NAME")
 
 PROCESSED_DATA_DIR = 'processed_data'
 
-# Tentar estabelecer uma conexão
-try:
-    with psycopg.connect (
+# Modos de carga disponíveis: 'copy' (bulk via COPY FROM STDIN), 'insert' (linha a linha, modo original)
+# e 'pipeline' (asyncio: leitura, roteamento e escrita simultâneos em várias conexões)
+LOAD_MODES = ("copy", "insert", "pipeline")
+DEFAULT_COPY_CHUNK_SIZE = 50_000
+
+def connection_params() -> dict:
+    return dict(
         dbname = DB_NAME,
         user=DB_USER,
         password=DB_PASSWORD,
         host=DB_HOST,
         port=DB_PORT
-    ) as conn:
+    )
 
-        # Imprimir mensagem de sucesso
-        print("✅ Conexão com o banco de dados PostgreSQL bem-sucedida!")
+def get_connection():
+    return psycopg.connect(**connection_params())
 
-        with conn.cursor() as cur:
-            try:
-                # --- 1. Leitura do Arquivo SQL ---
-                print("Lendo o arquivo 'create_tables.sql'...")
-                with open('create_tables.sql', 'r', encoding='utf-8') as f:
-                    sql_script = f.read()
-                print("✅ Arquivo lido com sucesso.")
-                # --- 2. Execução do Script SQL ---
-                print("Executando o script para criar as tabelas...")
-                cur.execute(sql_script)
-                print("🚀 Tabelas criadas com sucesso!")
-
-            except FileNotFoundError as e:
-                print(f"❌ ERRO: {e}") 
-                sys.exit(1)
-            
-            
-            # --- 3. Carregamento dos Dados do Arquivo JSON
-            try:
-                print(f"\nProcurando pelo lote de dados mais recente em '{PROCESSED_DATA_DIR}'...")
-
-                # Lista com o caminho completo de todos os arquivos .json
-                json_files = [
-                    os.path.join(PROCESSED_DATA_DIR, f)
-                    for f in os.listdir(PROCESSED_DATA_DIR)
-                    if f.endswith('.json')
-                ]
-
-                if not json_files:
-                    raise FileNotFoundError(f"Nenhum arquivo .json encontrado no diretório '{PROCESSED_DATA_DIR}'.")
-                # Usa a data de modificação para encontrar o arquivo mais recente
-                latest_file_path = max(json_files, key=os.path.getmtime)
-
-                print(f"Arquivo mais recente encontrado: {os.path.basename(latest_file_path)}")
-
-                # Carregando conteúdo do arquivo em uma variável
-                with open(latest_file_path, 'r', encoding='utf-8') as f:
-                    events_data = json.load(f)
-
-                # Mostrando o número total de eventos
-                total_events = len(events_data)
-                print(f"✅ Carregados {total_events} eventos do arquivo.") 
-            
-            except FileNotFoundError as e:
-                print(f"❌ ERRO: {e}")
-                sys.exit(1)
-
-            # --- 4. Inserção dos Dados no Banco de Dados ---
-            print("\nIniciando inserção dos eventos no banco de dados...")
-
-            inserted_count = 0
-            unmatched_count = 0
-
-            for event in events_data:
-                event_name = event.get('envelope_eventName')
-
-                # Roteador de eventos
-                if event_name == "acquisition.visitor.landed":
-                    sql = """
-                        INSERT INTO visitor_landed (
-                            envelope_eventId, envelope_eventTimestamp, envelope_eventName, envelope_eventVersion, 
-                            envelope_source, envelope_domain, payload_anonymousId, payload_landingPageUrl, 
-                            payload_attribution_source, payload_attribution_medium, payload_attribution_campaign, 
-                            payload_device_type, payload_device_browser, payload_device_os, payload_geolocation_country, 
-                            payload_geolocation_region, payload_geolocation_city, payload_browserLanguage
-                        ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);
-                    """
-                    
-                    # Criando a tupla de dados na ordem do comando INSERT
-                    data_tuple_visitor = (
-                        event.get('envelope_eventId'),
-                        event.get('envelope_eventTimestamp'),
-                        event.get('envelope_eventName'),
-                        event.get('envelope_eventVersion'),
-                        event.get('envelope_source'),
-                        event.get('envelope_domain'),
-                        event.get('payload_anonymousId'),
-                        event.get('payload_landingPageUrl'),
-                        event.get('payload_attribution_source'),
-                        event.get('payload_attribution_medium'),
-                        event.get('payload_attribution_campaign'),
-                        event.get('payload_device_type'),
-                        event.get('payload_device_browser'),
-                        event.get('payload_device_os'),
-                        event.get('payload_geolocation_country'),
-                        event.get('payload_geolocation_region'),
-                        event.get('payload_geolocation_city'),
-                        event.get('payload_browserLanguage')
-                    )
-
-                    # Executando o comando de forma segura
-                    cur.execute(sql, data_tuple_visitor)
-                    inserted_count += 1
-
-                elif event_name == "membership.user.created":
-                    sql = """
-                        INSERT INTO user_created (
-                            envelope_eventId, envelope_eventTimestamp, envelope_eventName, envelope_eventVersion,
-                            envelope_source, envelope_domain, payload_userId, payload_anonymousId,
-                            payload_emailHash, payload_initialPlanId, payload_acquisitionChannel
-                        ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);
-                    """
-                    data_tuple_user = (
-                        event.get('envelope_eventId'),
-                        event.get('envelope_eventTimestamp'),
-                        event.get('envelope_eventName'),
-                        event.get('envelope_eventVersion'),
-                        event.get('envelope_source'),
-                        event.get('envelope_domain'),
-                        event.get('payload_userId'),
-                        event.get('payload_anonymousId'),
-                        event.get('payload_emailHash'),
-                        event.get('payload_initialPlanId'),
-                        event.get('payload_acquisitionChannel')
-                    )
-
-                    cur.execute(sql, data_tuple_user)
-                    inserted_count += 1
-
-                elif event_name == "playback.session.started":
-                    sql = """
-                        INSERT INTO playback_started (
-                            envelope_eventId, envelope_eventTimestamp, envelope_eventName, envelope_eventVersion,
-                            envelope_source, envelope_domain, payload_userId, payload_profileId,
-                            payload_playback_sessionId, payload_videoId, payload_videoType, payload_device_type,
-                            payload_device_manufacturer, payload_device_os, payload_trigger, payload_playbackStartTime
-                        ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);
-                    """
-                    data_tuple_playback = (
-                        event.get('envelope_eventId'),
-                        event.get('envelope_eventTimestamp'),
-                        event.get('envelope_eventName'),
-                        event.get('envelope_eventVersion'),
-                        event.get('envelope_source'),
-                        event.get('envelope_domain'),
-                        event.get('payload_userId'),
-                        event.get('payload_profileId'),
-                        event.get('payload_playbackSessionId'),
-                        event.get('payload_videoId'),
-                        event.get('payload_videoType'),
-                        event.get('payload_device_type'),
-                        event.get('payload_device_manufacturer'),
-                        event.get('payload_device_os'),
-                        event.get('payload_trigger'),
-                        event.get('payload_playbackStartTime')
-                    )
-
-                    cur.execute(sql, data_tuple_playback)
-                    inserted_count += 1
-
-                elif event_name == "membership.user.login_succeeded":
-                    sql = """
-                        INSERT INTO login_succeeded (
-                            envelope_eventId, envelope_eventTimestamp, envelope_eventName, envelope_eventVersion,
-                            envelope_source, envelope_domain, payload_userId, payload_loginType, payload_isNewDevice
-                        ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s);
-                    """
-                    data_tuple_login_succeeded = (
-                        event.get('envelope_eventId'),
-                        event.get('envelope_eventTimestamp'),
-                        event.get('envelope_eventName'),
-                        event.get('envelope_eventVersion'),
-                        event.get('envelope_source'),
-                        event.get('envelope_domain'),
-                        event.get('payload_userId'),
-                        event.get('payload_loginType'),
-                        event.get('payload_isNewDevice')
-                    )
-
-                    cur.execute(sql, data_tuple_login_succeeded)
-                    inserted_count += 1
-
-                elif event_name == "membership.user.login_failed":
-                    sql = """
-                        INSERT INTO login_failed (
-                            envelope_eventId, envelope_eventTimestamp, envelope_eventName, envelope_eventVersion,
-                            envelope_source, envelope_domain, payload_emailAttempted, payload_failureReason,
-                            payload_consecutiveFailureCount
-                        ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s);
-                    """
-                    data_tuple_login_failed = (
-                        event.get('envelope_eventId'),
-                        event.get('envelope_eventTimestamp'),
-                        event.get('envelope_eventName'),
-                        event.get('envelope_eventVersion'),
-                        event.get('envelope_source'),
-                        event.get('envelope_domain'),
-                        event.get('payload_emailAttempted'),
-                        event.get('payload_failureReason'),
-                        event.get('payload_consecutiveFailureCount')
-                    )
-                    
-                    cur.execute(sql, data_tuple_login_failed)
-                    inserted_count += 1
+def create_tables(cur):
+    # --- 1. Leitura do Arquivo SQL ---
+    print(f"Lendo o arquivo '{DDL_PATH}'...")
+    with open(DDL_PATH, 'r', encoding='utf-8') as f:
+        sql_script = f.read()
+    print("✅ Arquivo lido com sucesso.")
+    # --- 2. Execução do Script SQL ---
+    print("Executando o script para criar as tabelas...")
+    cur.execute(sql_script)
+    print("🚀 Tabelas criadas com sucesso!")
+
+def find_latest_batch() -> str:
+    print(f"\nProcurando pelo lote de dados mais recente em '{PROCESSED_DATA_DIR}'...")
+
+    # Lista com o caminho completo de todos os lotes (.json, .ndjson ou diretórios colunares .cols)
+    json_files = [
+        os.path.join(PROCESSED_DATA_DIR, f)
+        for f in os.listdir(PROCESSED_DATA_DIR)
+        if f.endswith(JSON_EXTENSIONS) or f.endswith(COLUMNAR_SUFFIX)
+    ]
+
+    if not json_files:
+        raise FileNotFoundError(f"Nenhum lote .json/.ndjson/.cols encontrado no diretório '{PROCESSED_DATA_DIR}'.")
+    # Usa a data de modificação para encontrar o arquivo mais recente
+    latest_file_path = max(json_files, key=os.path.getmtime)
+
+    print(f"Arquivo mais recente encontrado: {os.path.basename(latest_file_path)}")
+    return latest_file_path
+
+def list_batches() -> list:
+    # Todos os lotes da pasta processed_data, do mais antigo para o mais novo
+    json_files = [
+        os.path.join(PROCESSED_DATA_DIR, f)
+        for f in os.listdir(PROCESSED_DATA_DIR)
+        if f.endswith(JSON_EXTENSIONS) or f.endswith(COLUMNAR_SUFFIX)
+    ]
+    return sorted(json_files, key=lambda path: (os.path.getmtime(path), path))
+
+class EventBatch:
+    # Lote em memória do loader, já roteado: para cada tabela, uma lista de tuplas na ordem das colunas
+    # (a forma que o COPY e o INSERT consomem). O dict de cada evento é descartado assim que a tupla é
+    # extraída, e os valores das colunas categóricas passam por um dicionário do lote, então cada valor
+    # distinto (eventName, device, cidade...) existe uma única vez em memória, por mais eventos que haja.
+    __slots__ = ("rows_by_table", "days", "events", "unmatched", "_values")
+
+    def __init__(self):
+        self.rows_by_table = defaultdict(list)  # tabela -> [tupla de colunas]
+        self.days = set()                       # prefixos AAAA-MM-DD dos timestamps
+        self.events = 0
+        self.unmatched = 0
+        self._values = {}
+
+    def add(self, event: dict, registry: dict):
+        self.events += 1
+        route = registry.get(event.get('envelope_eventName'))
+        if route is None:
+            self.unmatched += 1
+            return
+        self.rows_by_table[route.table].append(extract_compact(route, event, self._values))
+        timestamp = event.get('envelope_eventTimestamp')
+        if timestamp:
+            self.days.add(timestamp[:10])
+
+def read_columnar_batch(path: str, registry: dict) -> EventBatch:
+    # Lote colunar: cada chunk já é de uma tabela e um dia, então as linhas entram direto no lote,
+    # sem parse nem roteamento de eventos
+    manifest = read_manifest(path)
+    routes = {route.event_name: route for route in registry.values()}
+    batch = EventBatch()
+    with metrics.timer("read_chunks"):
+        for chunk in manifest["chunks"]:
+            route = routes.get(chunk["eventName"])
+            if route is None:
+                batch.unmatched += chunk["rows"]
+                continue
+            _, rows = read_chunk(os.path.join(path, chunk["file"]), route.columns)
+            batch.rows_by_table[route.table].extend(rows)
+            if chunk["day"]:
+                batch.days.add(chunk["day"])
+    batch.events = manifest["events"]
+    batch.unmatched += manifest["unrouted"]
+    metrics.inc("events_read", batch.events)
+    metrics.inc("events_unmatched", batch.unmatched)
+    return batch
+
+def read_batch(path: str, registry: dict) -> EventBatch:
+    # Lê o lote (array JSON ou NDJSON) evento a evento, roteando cada um para a sua tabela
+    if is_columnar_batch(path):
+        return read_columnar_batch(path, registry)
+    batch = EventBatch()
+    with metrics.timer("read_route"):
+        for event in iter_json_file(path):
+            batch.add(event, registry)
+    metrics.inc("events_read", batch.events)
+    metrics.inc("events_unmatched", batch.unmatched)
+    return batch
+
+def file_checksum(path: str) -> str:
+    # SHA-256 do arquivo, lido em blocos para não carregar tudo em memória.
+    # Em um lote colunar, o manifesto (que lista cada chunk com linhas, timestamps e bytes) representa o lote.
+    if is_columnar_batch(path):
+        path = os.path.join(path, MANIFEST_FILE)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f, metrics.timer("checksum"):
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def batch_file_size(path: str) -> int:
+    return batch_size(path) if is_columnar_batch(path) else os.path.getsize(path)
+
+def batch_load_mode(path: str, mode: str) -> str:
+    # O modo pipeline existe para ler e rotear eventos de JSON/NDJSON em paralelo com a escrita;
+    # um lote colunar já vem separado por tabela e é carregado via COPY
+    if mode == "pipeline" and is_columnar_batch(path):
+        return "copy"
+    return mode
+
+def load_events_row_by_row(cur, batch: EventBatch, registry: dict, skip_existing: bool = False) -> tuple:
+    # Modo original: um INSERT por evento (mantido como fallback e para comparação com o COPY).
+    # As linhas já vêm roteadas no lote; o INSERT é preparado no servidor.
+    # O tempo de cada INSERT é amostrado (1 a cada EVENT_SAMPLE_EVERY eventos).
+    clock = time.perf_counter
+    start_time = clock()
+    inserted_count = 0
+    index = 0
+
+    for route in registry.values():
+        sql = route.insert_new_sql if skip_existing else route.insert_sql
+        for row in batch.rows_by_table.get(route.table, ()):
+            if index & EVENT_SAMPLE_MASK:
+                cur.execute(sql, row, prepare=True)
+            else:
+                insert_start = clock()
+                cur.execute(sql, row, prepare=True)
+                metrics.observe_event_stage("db_insert", clock() - insert_start)
+            inserted_count += cur.rowcount
+            index += 1
+
+    metrics.observe_stage("db_insert", clock() - start_time, table="*")
+    metrics.inc("rows_inserted", inserted_count, table="*")
+    return inserted_count, batch.unmatched
+
+def copy_rows(cur, copy_sql: str, rows: list, chunk_size: int = DEFAULT_COPY_CHUNK_SIZE) -> int:
+    # Envia as linhas para a tabela via COPY ... FROM STDIN, em blocos de até chunk_size linhas
+    for start in range(0, len(rows), chunk_size):
+        with cur.copy(copy_sql) as copy:
+            for row in rows[start:start + chunk_size]:
+                copy.write_row(row)
+    return len(rows)
+
+def copy_rows_skip_existing(cur, route, rows: list, chunk_size: int = DEFAULT_COPY_CHUNK_SIZE) -> int:
+    # COPY não aceita ON CONFLICT: as linhas vão para uma tabela de staging temporária
+    # e depois são mescladas na tabela final ignorando eventIds já carregados
+    stage_table = f"stage_{route.table}"
+    column_list = ", ".join(route.columns)
+    cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {stage_table} (LIKE {route.table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS")
+    copy_rows(cur, f"COPY {stage_table} ({column_list}) FROM STDIN", rows, chunk_size)
+    cur.execute(
+        f"INSERT INTO {route.table} ({column_list}) SELECT {column_list} FROM {stage_table} "
+        f"ON CONFLICT DO NOTHING"
+    )
+    inserted = cur.rowcount
+    cur.execute(f"TRUNCATE {stage_table}")
+    return inserted
+
+def load_events_copy(cur, batch: EventBatch, registry: dict, chunk_size: int = DEFAULT_COPY_CHUNK_SIZE,
+                     skip_existing: bool = False) -> tuple:
+    # Modo bulk: um COPY por bloco de cada tabela do lote, reportando linhas/s por tabela
+    inserted_count = 0
+
+    for route in registry.values():
+        rows = batch.rows_by_table.get(route.table)
+        if not rows:
+            continue
+        start_time = time.perf_counter()
+        if skip_existing:
+            copied = copy_rows_skip_existing(cur, route, rows, chunk_size)
+        else:
+            copied = copy_rows(cur, route.copy_sql, rows, chunk_size)
+        elapsed = time.perf_counter() - start_time
+        metrics.observe_stage("db_insert", elapsed, table=route.table)
+        metrics.inc("rows_inserted", copied, table=route.table)
+        rate = len(rows) / elapsed if elapsed > 0 else float("inf")
+        print(f"   📦 {route.table}: {copied} linhas em {elapsed:.2f}s ({rate:,.0f} linhas/s)")
+        inserted_count += copied
 
+    return inserted_count, batch.unmatched
+
+def load_events(cur, batch: EventBatch, registry: dict, mode: str = "copy",
+                chunk_size: int = DEFAULT_COPY_CHUNK_SIZE, skip_existing: bool = False) -> tuple:
+    if mode == "copy":
+        return load_events_copy(cur, batch, registry, chunk_size, skip_existing)
+    return load_events_row_by_row(cur, batch, registry, skip_existing)
+
+# =============================================================================
+# PARTIÇÕES DIÁRIAS
+# As tabelas de eventos são particionadas por dia (UTC) de envelope_eventTimestamp. Antes de cada
+# carga o loader cria as partições que faltam para os dias do lote; o PostgreSQL roteia cada linha
+# para a sua partição. A retenção remove partições inteiras (DROP ou DETACH) em vez de DELETE.
+# =============================================================================
+
+RETENTION_MODES = ("drop", "detach")
+
+# Dia de cada evento direto dos bytes do lote (NDJSON compacto ou array indentado), sem parse do JSON
+# Travas consultivas (por nome) dos trechos que loaders em paralelo não podem executar ao mesmo tempo
+PARTITIONS_LOCK = "unframed:partitions"
+ROLLUPS_LOCK = "unframed:rollups"
+
+BATCH_DAY_PATTERN = re.compile(rb'"envelope_eventTimestamp":\s*"(\d{4}-\d{2}-\d{2})')
+
+def as_dates(days) -> list:
+    # Aceita date ou 'AAAA-MM-DD' e devolve os dias ordenados
+    return sorted({day if isinstance(day, date) else date.fromisoformat(day) for day in days if day})
+
+def scan_batch_days(path: str) -> set:
+    # Dias presentes em um lote, lido em blocos. Usado no modo pipeline, em que as partições precisam
+    # existir antes dos writers começarem e os eventos só são lidos por eles. Segmentos trazem os dias
+    # no índice; nos demais lotes o arquivo é lido (e descomprimido em streaming).
+    if is_columnar_batch(path):
+        return {date.fromisoformat(chunk["day"]) for chunk in read_manifest(path)["chunks"] if chunk["day"]}
+    index = read_segment_index(path)
+    if index is not None:
+        return {date.fromisoformat(day) for day in index["days"]}
+    days = set()
+    tail = b''
+    with open_binary(path) as f, metrics.timer("scan_days"):
+        for block in iter(lambda: f.read(1 << 20), b''):
+            chunk = tail + block
+            days.update(BATCH_DAY_PATTERN.findall(chunk))
+            tail = chunk[-64:]  # um timestamp pode estar dividido entre dois blocos
+    return {date.fromisoformat(day.decode()) for day in days}
+
+def attached_partitions(cur) -> dict:
+    # {tabela de eventos particionada: {dia: partição anexada}}. Tabelas de um warehouse anterior
+    # ao particionamento (não particionadas) não aparecem.
+    cur.execute(
+        "SELECT parent.relname, child.relname FROM pg_class parent "
+        "LEFT JOIN pg_inherits i ON i.inhparent = parent.oid "
+        "LEFT JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relkind = 'p' AND parent.relnamespace = current_schema()::regnamespace "
+        "AND parent.relname = ANY(%s)",
+        (EVENT_TABLES,)
+    )
+    partitions = {}
+    for table, partition in cur.fetchall():
+        table_partitions = partitions.setdefault(table, {})
+        day = partition_day(partition) if partition else None
+        if day is not None:
+            table_partitions[day] = partition
+    return partitions
+
+def lock_for_transaction(cur, name: str):
+    # Trava consultiva até o fim da transação: loaders em paralelo passam um de cada vez pelo trecho protegido
+    cur.execute("SELECT pg_advisory_xact_lock(hashtextextended(%s, 0))", (name,))
+
+def ensure_partitions(cur, days) -> int:
+    # Cria, em todas as tabelas de eventos, as partições dos dias do lote que ainda não existem
+    days = as_dates(days)
+    if not days:
+        return 0
+    created = 0
+    with metrics.timer("partitions"):
+        partitions = attached_partitions(cur)
+        if any(day not in table_partitions for table_partitions in partitions.values() for day in days):
+            # Outro loader pode estar criando as mesmas partições: espera a vez dele e confere de novo
+            lock_for_transaction(cur, PARTITIONS_LOCK)
+            partitions = attached_partitions(cur)
+        for table, table_partitions in partitions.items():
+            for day in days:
+                if day not in table_partitions:
+                    cur.execute(render_partition(table, day))
+                    created += 1
+    metrics.inc("partitions_created", created)
+    return created
+
+def apply_retention(cur, retention_days: int, mode: str = "drop") -> list:
+    # Remove as partições de dias anteriores ao horizonte (dia mais recente carregado - retention_days).
+    # 'drop' apaga a partição; 'detach' a desanexa e renomeia para <partição>_detached_<instante>,
+    # mantendo os dados fora das consultas (para arquivar) sem colidir com uma partição nova do mesmo dia.
+    # Os rollups diários desses dias são mantidos.
+    partitions = attached_partitions(cur)
+    loaded_days = set().union(*partitions.values()) if partitions else set()
+    if not loaded_days:
+        return []
+    horizon = max(loaded_days) - timedelta(days=retention_days)
+
+    removed = []
+    detached_at = datetime.now().strftime("%Y%m%d%H%M%S")
+    with metrics.timer("retention"):
+        for table, table_partitions in partitions.items():
+            for day, partition in sorted(table_partitions.items()):
+                if day >= horizon:
+                    continue
+                if mode == "detach":
+                    cur.execute(f"ALTER TABLE {table} DETACH PARTITION {partition}")
+                    cur.execute(f"ALTER TABLE {partition} RENAME TO {partition}_detached_{detached_at}")
                 else:
-                    unmatched_count += 1
+                    cur.execute(f"DROP TABLE {partition}")
+                removed.append(partition)
+    metrics.inc("partitions_removed", len(removed), mode=mode)
+    return removed
+
+# =============================================================================
+# ROLLUPS DIÁRIOS DOS KPIs
+# daily_active_users (usuários distintos por dia e por família de evento, mais 'all' = DAU leve)
+# e daily_activation (cadastros e ativações no mesmo dia). A cada carga só os dias (UTC) presentes
+# no lote são recalculados, na mesma transação que registra o lote no manifesto.
+# =============================================================================
+
+# Os dias dos rollups são dias em UTC, independentes do TimeZone da sessão: cada dia começa em
+# 00:00 UTC (day_start) e as queries de exemplo do README agrupam com AT TIME ZONE 'UTC' para bater
+ROLLUP_DAYS_CTE = (
+    "WITH days AS (SELECT d AS day, d::timestamp AT TIME ZONE 'UTC' AS day_start "
+    "FROM unnest(%(days)s::date[]) AS d)"
+)
+
+def day_range_join(table: str, alias: str) -> str:
+    # Junção por intervalo [início do dia, início do dia seguinte): usa o índice de timestamp
+    return (f"JOIN {table} {alias} ON {alias}.envelope_eventTimestamp >= days.day_start "
+            f"AND {alias}.envelope_eventTimestamp < days.day_start + INTERVAL '1 day'")
+
+def event_days(batch: EventBatch) -> set:
+    # Dias do lote a partir do prefixo AAAA-MM-DD do timestamp (os eventos são gravados em UTC)
+    return {date.fromisoformat(prefix) for prefix in batch.days}
+
+def all_event_days(cur) -> set:
+    # Todos os dias já carregados, para reconstruir os rollups do zero
+    selects = " UNION ".join(
+        f"SELECT DISTINCT (envelope_eventTimestamp AT TIME ZONE 'UTC')::date FROM {table}" for table in USER_EVENT_TABLES
+    )
+    cur.execute(selects)
+    return {row[0] for row in cur.fetchall()}
+
+def analyze_event_tables(cur):
+    # Tabelas recém-recriadas não têm estatísticas: sem elas o planejador escolhe planos ruins para o
+    # recálculo dos rollups (segundos em vez de milissegundos por dia)
+    with metrics.timer("analyze"):
+        for table in USER_EVENT_TABLES:
+            cur.execute(f"ANALYZE {table}")
+
+def refresh_rollups(cur, days) -> int:
+    days = as_dates(days)
+    if not days:
+        return 0
+    params = {"days": days}
+
+    with metrics.timer("rollups"):
+        # Com loaders em paralelo, quem recalcula por último vê as linhas de todos os que já confirmaram
+        lock_for_transaction(cur, ROLLUPS_LOCK)
+        cur.execute("DELETE FROM daily_active_users WHERE day = ANY(%(days)s::date[])", params)
+        cur.execute("DELETE FROM daily_activation WHERE day = ANY(%(days)s::date[])", params)
+
+        family_users = " UNION ALL ".join(
+            f"SELECT days.day, '{table}' AS event_family, t.payload_userId AS user_id FROM days {day_range_join(table, 't')}"
+            for table in USER_EVENT_TABLES
+        )
+        cur.execute(
+            f"{ROLLUP_DAYS_CTE}, family_users AS ({family_users}) "
+            "INSERT INTO daily_active_users (day, event_family, active_users) "
+            "SELECT day, event_family, COUNT(DISTINCT user_id) FROM family_users GROUP BY day, event_family "
+            "UNION ALL "
+            "SELECT day, 'all', COUNT(DISTINCT user_id) FROM family_users GROUP BY day",
+            params
+        )
+
+        # Ativação: para cada cadastro do dia, procura um play do mesmo usuário no mesmo dia
+        # (busca pontual no índice (payload_userId, envelope_eventTimestamp) de playback_started)
+        cur.execute(
+            f"{ROLLUP_DAYS_CTE} "
+            "INSERT INTO daily_activation (day, signups, activated) "
+            "SELECT days.day, COUNT(DISTINCT s.payload_userId), "
+            "COUNT(DISTINCT s.payload_userId) FILTER (WHERE played.user_id IS NOT NULL) "
+            f"FROM days {day_range_join('user_created', 's')} "
+            "LEFT JOIN LATERAL ("
+            "SELECT p.payload_userId AS user_id FROM playback_started p "
+            "WHERE p.payload_userId = s.payload_userId AND p.envelope_eventTimestamp >= days.day_start "
+            "AND p.envelope_eventTimestamp < days.day_start + INTERVAL '1 day' LIMIT 1"
+            ") played ON true "
+            "GROUP BY days.day",
+            params
+        )
+    metrics.inc("rollup_days_refreshed", len(days))
+    return len(days)
 
+def print_load_summary(inserted_count: int, unmatched_count: int, elapsed: float):
+    print(f"✅ Transação confirmada! Inseridos {inserted_count} eventos com sucesso no banco de dados.")
+    print(f"⏱️  Tempo total de carga: {elapsed:.2f}s ({inserted_count / elapsed if elapsed > 0 else 0:,.0f} eventos/s)")
+    if unmatched_count > 0:
+        print(f"⚠️  {unmatched_count} eventos não tiveram correspondência e foram ignorados.")
+
+def find_latest_run() -> list:
+    # Segmentos da execução de ingestão que gravou o lote mais recente, na ordem da sequência
+    # (lotes não segmentados são uma execução de um segmento só)
+    latest_file_path = find_latest_batch()
+    run = segment_run(latest_file_path)
+    return sorted(path for path in list_batches() if segment_run(path) == run)
+
+def load_full_segment(conn, cur, registry: dict, path: str, args, skip_existing: bool = False) -> tuple:
+    # Carrega um segmento da carga completa e devolve os dias dele; os rollups são recalculados uma vez só,
+    # no fim, para os dias de todos os segmentos
+    mode = batch_load_mode(path, args.mode)
+
+    if mode == "pipeline":
+        # As tabelas e partições precisam estar visíveis para as conexões dos writers
+        ensure_partitions(cur, scan_batch_days(path))
+        conn.commit()
+        print(f"\nIniciando carga em pipeline de '{os.path.basename(path)}'...")
+        event_count, inserted_count, unmatched_count, days = run_pipelined_load(
+            path, registry, connection_params(), **pipeline_options(args)
+        )
+        record_batch(cur, path, file_checksum(path), batch_file_size(path), event_count, inserted_count)
+        conn.commit()
+        return inserted_count, unmatched_count, days
+
+    batch = read_batch(path, registry)
+
+    # Mostrando o número total de eventos
+    print(f"✅ Carregados {batch.events} eventos do arquivo {os.path.basename(path)}.")
+
+    # --- 4. Inserção dos Dados no Banco de Dados ---
+    print(f"\nIniciando inserção dos eventos no banco de dados (modo '{mode}')...")
+
+    days = event_days(batch)
+    ensure_partitions(cur, days)
+    inserted_count, unmatched_count = load_events(cur, batch, registry, mode, args.chunk_size, skip_existing)
+    # Registra o lote no manifesto para que uma carga incremental seguinte não o repita
+    record_batch(cur, path, file_checksum(path), batch_file_size(path), batch.events, inserted_count)
+    return inserted_count, unmatched_count, days
+
+def run_full_refresh(conn, registry: dict, args):
+    # Estratégia original: recria todas as tabelas e carrega apenas a execução de ingestão mais recente
+    # (o lote mais recente e, se ela gravou segmentos, os demais segmentos dela), um segmento por vez
+    with conn.cursor() as cur:
+        create_tables(cur)
+
+        # --- 3. Carregamento dos Dados do Arquivo JSON
+        segments = find_latest_run()
+        if len(segments) > 1:
+            print(f"A execução tem {len(segments)} segmentos; todos serão carregados.")
+        # Uma ingestão distribuída não deduplica: os eventos repetidos entre arquivos são descartados pelo
+        # ON CONFLICT, como na carga incremental (o modo pipeline já carrega assim)
+        skip_existing = any(segment_part(path) is not None for path in segments)
+        if skip_existing:
+            print("ℹ️  Execução distribuída (sem deduplicação na ingestão): eventos repetidos serão ignorados.")
+
+        start_time = time.perf_counter()
+        total_inserted = 0
+        total_unmatched = 0
+        loaded_days = set()
+        for path in segments:
+            inserted_count, unmatched_count, days = load_full_segment(conn, cur, registry, path, args, skip_existing)
+            total_inserted += inserted_count
+            total_unmatched += unmatched_count
+            loaded_days.update(as_dates(days))
+        # Os dias se repetem entre os segmentos de uma execução: um único recálculo para a união deles.
+        # Nos modos copy e insert a carga inteira (rollups inclusive) é uma transação só.
+        analyze_event_tables(cur)
+        refresh_rollups(cur, loaded_days)
+        conn.commit()
+        print_load_summary(total_inserted, total_unmatched, time.perf_counter() - start_time)
+
+def load_manifest_entries(cur) -> tuple:
+    # {arquivo: {tamanhos já carregados}} e o conjunto de checksums do manifesto
+    cur.execute("SELECT batch_file, file_size, batch_checksum FROM load_manifest")
+    sizes_by_file = defaultdict(set)
+    checksums = set()
+    for batch_file, file_size, batch_checksum in cur.fetchall():
+        sizes_by_file[batch_file].add(file_size)
+        checksums.add(batch_checksum)
+    return sizes_by_file, checksums
+
+def record_batch(cur, path: str, checksum: str, file_size: int, event_count: int, inserted_count: int):
+    cur.execute(
+        "INSERT INTO load_manifest (batch_file, batch_checksum, file_size, event_count, inserted_count) "
+        "VALUES (%s, %s, %s, %s, %s) ON CONFLICT DO NOTHING",
+        (os.path.basename(path), checksum, file_size, event_count, inserted_count)
+    )
+
+def pending_batches(cur) -> list:
+    # Lotes ainda não registrados no manifesto. Arquivos com mesmo nome e tamanho já carregados
+    # são descartados sem ler o conteúdo, então o custo não cresce com o histórico.
+    # Retorna (caminho, checksum, tamanho, conteúdo já carregado com outro nome?).
+    sizes_by_file, checksums = load_manifest_entries(cur)
+    pending = []
+    for path in list_batches():
+        batch_file = os.path.basename(path)
+        file_size = batch_file_size(path)
+        if file_size in sizes_by_file.get(batch_file, ()):
+            continue
+        checksum = file_checksum(path)
+        pending.append((path, checksum, file_size, checksum in checksums))
+        checksums.add(checksum)
+    return pending
+
+def load_batch_incremental(conn, registry: dict, path: str, checksum: str, file_size: int,
+                           mode: str = "copy", chunk_size: int = DEFAULT_COPY_CHUNK_SIZE,
+                           pipeline_opts: dict = None) -> tuple:
+    mode = batch_load_mode(path, mode)
+    if mode == "pipeline":
+        # Os writers usam conexões próprias: o manifesto só é gravado depois que todos confirmaram.
+        # Se algo falhar no meio, o lote não entra no manifesto e a próxima execução o completa
+        # (os INSERTs ignoram eventIds já carregados).
+        with conn.cursor() as cur:
+            ensure_partitions(cur, scan_batch_days(path))
+        conn.commit()
+        event_count, inserted_count, unmatched_count, days = run_pipelined_load(
+            path, registry, connection_params(), **(pipeline_opts or {})
+        )
+        with conn.cursor() as cur:
+            refresh_rollups(cur, days)
+            record_batch(cur, path, checksum, file_size, event_count, inserted_count)
+        conn.commit()
+        return event_count, inserted_count, unmatched_count
+
+    # Carrega um lote, atualiza os rollups e registra no manifesto na mesma transação: ou entra tudo, ou nada.
+    # As partições vêm antes, em uma transação curta, para não prender os outros loaders durante a carga.
+    batch = read_batch(path, registry)
+    days = event_days(batch)
+    with conn.cursor() as cur:
+        ensure_partitions(cur, days)
+    conn.commit()
+    with conn.cursor() as cur:
+        inserted_count, unmatched_count = load_events(cur, batch, registry, mode, chunk_size, skip_existing=True)
+        refresh_rollups(cur, days)
+        record_batch(cur, path, checksum, file_size, batch.events, inserted_count)
+    conn.commit()
+    return batch.events, inserted_count, unmatched_count
+
+def ensure_tables(conn):
+    # Cria apenas as tabelas que ainda não existem
+    with conn.cursor() as cur:
+        cur.execute(render_ddl(if_not_exists=True))
+        unpartitioned = [table for table in EVENT_TABLES if table not in attached_partitions(cur)]
+    conn.commit()
+    if unpartitioned:
+        print(f"⚠️  Tabelas criadas antes do particionamento diário: {', '.join(unpartitioned)}. "
+              "Elas continuam sendo carregadas, mas sem partições nem retenção; uma carga completa as recria.")
+
+def load_new_batch(conn, registry: dict, path: str, mode: str = "copy",
+                   chunk_size: int = DEFAULT_COPY_CHUNK_SIZE, pipeline_opts: dict = None) -> tuple:
+    # Ponto de entrada para quem já tem um lote recém-publicado em mãos (ex.: o daemon de ingestão)
+    return load_batch_incremental(conn, registry, path, file_checksum(path), batch_file_size(path), mode, chunk_size,
+                                  pipeline_opts)
+
+def try_claim_batch(conn, path: str, file_size: int) -> bool:
+    # Assume o lote com uma trava consultiva de sessão pelo nome: loaders em paralelo não carregam o mesmo
+    # segmento. Se a conexão cair, o servidor libera a trava e o lote volta a ficar disponível.
+    batch_file = os.path.basename(path)
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_lock(hashtextextended(%s, 0))", (batch_file,))
+        claimed = cur.fetchone()[0]
+        if claimed:
+            # Outro loader pode ter terminado o lote entre a listagem dos pendentes e a trava
+            cur.execute("SELECT 1 FROM load_manifest WHERE batch_file = %s AND file_size = %s", (batch_file, file_size))
+            if cur.fetchone() is not None:
+                cur.execute("SELECT pg_advisory_unlock(hashtextextended(%s, 0))", (batch_file,))
+                claimed = False
+    conn.commit()
+    return claimed
+
+def release_batch(conn, path: str):
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_unlock(hashtextextended(%s, 0))", (os.path.basename(path),))
+    conn.commit()
+
+def load_pending_batches(conn, registry: dict, pending: list, args) -> tuple:
+    # Carrega os lotes pendentes que conseguir assumir (os demais estão com outro loader).
+    # Retorna (lotes carregados, eventos inseridos, eventos sem correspondência).
+    loaded = 0
+    total_inserted = 0
+    total_unmatched = 0
+
+    for path, checksum, file_size, already_loaded in pending:
+        if not try_claim_batch(conn, path, file_size):
+            continue
+
+        if already_loaded:
+            # Mesmo conteúdo de um lote já carregado (ex.: reentrega com outro nome): só registra
+            with conn.cursor() as cur:
+                record_batch(cur, path, checksum, file_size, 0, 0)
             conn.commit()
+            release_batch(conn, path)
+            print(f"\n=== Lote {os.path.basename(path)} tem conteúdo idêntico a um lote já carregado, ignorado. ===")
+            continue
+
+        print(f"\n=== Carregando lote: {os.path.basename(path)} ===")
+        event_count, inserted_count, unmatched_count = load_batch_incremental(
+            conn, registry, path, checksum, file_size, args.mode, args.chunk_size, pipeline_options(args)
+        )
+        release_batch(conn, path)
+        skipped = event_count - inserted_count - unmatched_count
+        print(f"✅ {inserted_count} de {event_count} eventos inseridos ({skipped} já existiam no banco).")
+        loaded += 1
+        total_inserted += inserted_count
+        total_unmatched += unmatched_count
+
+    return loaded, total_inserted, total_unmatched
+
+def run_loader_process(pending: list, args) -> tuple:
+    # Um loader de --loaders: conexão e registro próprios, disputando os mesmos lotes pendentes
+    metrics.reset()
+    registry = load_registry()
+    with get_connection() as conn:
+        loaded, inserted_count, unmatched_count = load_pending_batches(conn, registry, pending, args)
+    return loaded, inserted_count, unmatched_count, metrics.snapshot()
+
+def run_incremental(conn, registry: dict, args):
+    # Estratégia incremental: cria só as tabelas que faltam e carrega todo lote ainda não carregado
+    print("Garantindo que as tabelas existem (sem recriar)...")
+    ensure_tables(conn)
+    with conn.cursor() as cur:
+        pending = pending_batches(cur)
+
+    if not pending:
+        print("Nenhum lote novo para carregar.")
+        return
+
+    print(f"\n{len(pending)} lotes novos para carregar (modo '{args.mode}')...")
+    start_time = time.perf_counter()
+
+    if args.loaders > 1:
+        # As partições de todos os lotes pendentes são criadas antes: o DDL trava as tabelas de eventos
+        # inteiras e, no meio das cargas, entraria em deadlock com as leituras dos rollups dos outros loaders
+        with conn.cursor() as cur:
+            ensure_partitions(cur, set().union(*(scan_batch_days(path) for path, *_ in pending)))
+        conn.commit()
+        # Processos 'spawn': cada loader abre a própria conexão, sem herdar a do processo principal
+        loaders = min(args.loaders, len(pending))
+        print(f"Carregando com {loaders} loaders em paralelo.")
+        with ProcessPoolExecutor(max_workers=loaders, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results = list(executor.map(run_loader_process, [pending] * loaders, [args] * loaders))
+        total_inserted = 0
+        total_unmatched = 0
+        for _, inserted_count, unmatched_count, snapshot in results:
+            total_inserted += inserted_count
+            total_unmatched += unmatched_count
+            metrics.merge(snapshot)
+    else:
+        _, total_inserted, total_unmatched = load_pending_batches(conn, registry, pending, args)
+
+    print()
+    print_load_summary(total_inserted, total_unmatched, time.perf_counter() - start_time)
+
+def run_rebuild_rollups(conn):
+    # Recalcula os rollups de todos os dias já carregados (ex.: warehouse anterior aos rollups)
+    ensure_tables(conn)
+    start_time = time.perf_counter()
+    with conn.cursor() as cur:
+        days = refresh_rollups(cur, all_event_days(cur))
+    conn.commit()
+    print(f"✅ Rollups recalculados para {days} dias em {time.perf_counter() - start_time:.2f}s.")
+
+def run_retention(conn, retention_days: int, mode: str):
+    with conn.cursor() as cur:
+        removed = apply_retention(cur, retention_days, mode)
+    conn.commit()
+    action = "desanexadas" if mode == "detach" else "removidas"
+    if removed:
+        print(f"🧹 Retenção de {retention_days} dias: {len(removed)} partições {action}.")
+
+def pipeline_options(args) -> dict:
+    return {"writers": args.writers, "commit_per_table": args.commit_per_table}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Carrega os lotes processados no Data Warehouse.")
+    parser.add_argument("--mode", choices=LOAD_MODES, default="copy",
+                        help="'copy' usa COPY FROM STDIN agrupado por tabela; 'insert' usa um INSERT por evento (modo original).")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_COPY_CHUNK_SIZE,
+                        help="Número máximo de linhas por comando COPY.")
+    parser.add_argument("--writers", type=int, default=DEFAULT_WRITERS,
+                        help="Modo pipeline: número de conexões escrevendo em paralelo (uma ou mais tabelas por conexão).")
+    parser.add_argument("--commit-per-table", action="store_true",
+                        help="Modo pipeline: confirma cada tabela assim que ela termina, em vez de uma vez no fim.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Não recria as tabelas e carrega todos os lotes ainda não registrados no manifesto.")
+    parser.add_argument("--loaders", type=int, default=1,
+                        help="Com --incremental: número de processos carregando lotes (segmentos) pendentes em paralelo; "
+                             "cada lote é assumido por um só loader.")
+    parser.add_argument("--rebuild-rollups", action="store_true",
+                        help="Não carrega nada; recalcula os rollups diários de todos os dias já carregados.")
+    parser.add_argument("--retention-days", type=int, default=None,
+                        help="Depois da carga, remove as partições diárias mais antigas que este número de dias "
+                             "(em relação ao dia mais recente carregado). Sem a opção, nada é removido.")
+    parser.add_argument("--retention-mode", choices=RETENTION_MODES, default="drop",
+                        help="'drop' apaga as partições antigas; 'detach' as desanexa e mantém como tabelas *_detached_<instante>.")
+    parser.add_argument("--metrics-dir", default=DEFAULT_METRICS_DIR,
+                        help="Pasta onde o relatório de métricas (JSON e Prometheus) é gravado ao fim da execução.")
+    args = parser.parse_args(argv)
+    if args.retention_days is not None and args.retention_days < 0:
+        parser.error("--retention-days deve ser maior ou igual a 0.")
+    if args.loaders < 1:
+        parser.error("--loaders deve ser maior ou igual a 1.")
+    if args.loaders > 1 and not args.incremental:
+        parser.error("--loaders só vale com --incremental.")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Registro de rotas construído uma única vez; falha aqui se o DDL não bater com os eventos
+    try:
+        registry = load_registry()
+    except FileNotFoundError:
+        print(f"❌ ERRO: O arquivo '{DDL_PATH}' não foi encontrado.")
+        print("   Verifique se o arquivo está na mesma pasta que o script Python.")
+        sys.exit(1)
+    except ValueError as e:
+        print(f"❌ ERRO: {e}")
+        sys.exit(1)
+
+    # Tentar estabelecer uma conexão
+    try:
+        with get_connection() as conn:
+
+            # Imprimir mensagem de sucesso
+            print("✅ Conexão com o banco de dados PostgreSQL bem-sucedida!")
+
+            if args.rebuild_rollups:
+                run_rebuild_rollups(conn)
+            elif args.incremental:
+                run_incremental(conn, registry, args)
+            else:
+                run_full_refresh(conn, registry, args)
+
+            if args.retention_days is not None:
+                run_retention(conn, args.retention_days, args.retention_mode)
+
+    except FileNotFoundError as e:
+        print(f"❌ ERRO: {e}")
+        sys.exit(1)
+    except psycopg.Error as e:
+        print(f"❌ Erro ao conectar ao PostgreSQL: {e}")
+        sys.exit(1)
+    finally:
+        # O relatório sai mesmo se a carga falhar, com o que foi medido até o erro
+        metrics.write_report(args.metrics_dir, "load")
 
-            print(f"✅ Transação confirmada! Inseridos {inserted_count} eventos com sucesso no banco de dados.")
-            if unmatched_count > 0:
-                print(f"⚠️  {unmatched_count} eventos não tiveram correspondência e foram ignorados.")
-
-except FileNotFoundError:
-    print("❌ ERRO: O arquivo 'create_tables.sql' não foi encontrado.")
-    print("   Verifique se o arquivo está na mesma pasta que o script Python.")
-    sys.exit(1)
-except psycopg.Error as e:
-    print(f"❌ Erro ao conectar ao PostgreSQL: {e}")
-    sys.exit(1)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
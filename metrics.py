@@ -0,0 +1,209 @@
+import bisect
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# =============================================================================
+# INSTRUMENTAÇÃO DO PIPELINE
+# Contadores, histogramas e timers por estágio, baratos o bastante para ficarem
+# ligados em produção: nada de I/O durante a execução, só somas em memória.
+# Ao final de cada execução o relatório sai em JSON e no formato texto do Prometheus.
+# =============================================================================
+
+METRIC_PREFIX = "unframed"
+DEFAULT_METRICS_DIR = "metrics"
+
+# Amostragem dos timers por evento: mede 1 a cada EVENT_SAMPLE_EVERY eventos (potência de 2)
+EVENT_SAMPLE_EVERY = 32
+EVENT_SAMPLE_MASK = EVENT_SAMPLE_EVERY - 1
+
+# Limites (em segundos) dos buckets dos histogramas: de 1µs a ~100s, em passos de ~x3
+HISTOGRAM_BUCKETS = [1e-6 * (10 ** (i / 2)) for i in range(17)]
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+class Histogram:
+    def __init__(self, buckets: list = HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # o último é o +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other: dict):
+        for i, count in enumerate(other["counts"]):
+            self.counts[i] += count
+        self.sum += other["sum"]
+        self.count += other["count"]
+
+    def to_dict(self) -> dict:
+        return {"buckets": self.buckets, "counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+class MetricsRegistry:
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _label_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _label_key(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, stage: str, **labels):
+        # Tempo de uma operação inteira de um estágio (um arquivo, um bloco, um COPY...)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start_time, stage=stage, **labels)
+
+    def observe_stage(self, stage: str, seconds: float, **labels):
+        self.observe("stage_seconds", seconds, stage=stage, **labels)
+
+    def observe_event_stage(self, stage: str, seconds: float):
+        # Duração amostrada de um estágio para um único evento
+        self.observe("event_stage_seconds", seconds, stage=stage)
+
+    # --- Agregação entre processos ---
+
+    def snapshot(self) -> dict:
+        # Representação serializável (pickle/JSON) para workers devolverem ao processo pai
+        return {
+            "counters": [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+            "histograms": [[name, list(labels), histogram.to_dict()] for (name, labels), histogram in self.histograms.items()],
+        }
+
+    def merge(self, snapshot: dict):
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            self.counters[key] = self.counters.get(key, 0) + value
+        for name, labels, data in snapshot["histograms"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(data["buckets"])
+            histogram.merge(data)
+
+    def reset(self):
+        self.counters.clear()
+        self.histograms.clear()
+        self.started_at = time.time()
+
+    # --- Exportação ---
+
+    def to_dict(self, run_name: str) -> dict:
+        return {
+            "run": run_name,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(),
+            "duration_seconds": time.time() - self.started_at,
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ],
+            "histograms": [
+                {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ],
+        }
+
+    def to_prometheus(self, run_name: str) -> str:
+        lines = []
+
+        def render_labels(labels: tuple, extra: tuple = ()) -> str:
+            pairs = (("run", run_name),) + labels + extra
+            return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+        metric = f"{METRIC_PREFIX}_run_duration_seconds"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric}{render_labels(())} {time.time() - self.started_at}")
+
+        for name in sorted({name for name, _ in self.counters}):
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (counter_name, labels), value in sorted(self.counters.items()):
+                if counter_name == name:
+                    lines.append(f"{metric}{render_labels(labels)} {value}")
+
+        for name in sorted({name for name, _ in self.histograms}):
+            metric = f"{METRIC_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            for (histogram_name, labels), histogram in sorted(self.histograms.items()):
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else f"{bound:.6g}"
+                    lines.append(f"{metric}_bucket{render_labels(labels, (('le', le),))} {cumulative}")
+                lines.append(f"{metric}_sum{render_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{render_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, metrics_dir: str, run_name: str, timestamped: bool = True, quiet: bool = False) -> str:
+        # Grava <run>_<timestamp>.json e .prom e devolve o caminho base. Com timestamped=False o nome
+        # é fixo e o arquivo é sobrescrito (útil para daemons lidos pelo textfile collector do Prometheus).
+        os.makedirs(metrics_dir, exist_ok=True)
+        name = run_name
+        if timestamped:
+            name = f"{run_name}_{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}"
+        base_path = os.path.join(metrics_dir, name)
+
+        for extension, content in ((".json", json.dumps(self.to_dict(run_name), indent=2)),
+                                   (".prom", self.to_prometheus(run_name))):
+            temp_path = f"{base_path}{extension}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(temp_path, f"{base_path}{extension}")
+
+        if not quiet:
+            print(f"📈 Métricas da execução salvas em '{base_path}.json' e '{base_path}.prom'")
+        return base_path
+
+# Registro global do processo
+metrics = MetricsRegistry()
+
+# =============================================================================
+# LOG COM LIMITE DE TAXA
+# Mensagens repetitivas do caminho quente saem no máximo uma vez por intervalo;
+# as suprimidas são contadas e resumidas na próxima mensagem ou no fim da execução.
+# =============================================================================
+
+DEFAULT_LOG_INTERVAL = 5.0
+_log_state = {}
+
+def rate_limited_print(key: str, message: str, interval: float = DEFAULT_LOG_INTERVAL):
+    now = time.monotonic()
+    state = _log_state.get(key)
+    if state is None:
+        _log_state[key] = [now, 0]
+        print(message)
+        return
+    if now - state[0] < interval:
+        state[1] += 1
+        return
+    suppressed = state[1]
+    state[0], state[1] = now, 0
+    suffix = f" (+{suppressed} mensagens semelhantes suprimidas)" if suppressed else ""
+    print(f"{message}{suffix}")
+
+def flush_rate_limited_logs():
+    for key, (_, suppressed) in _log_state.items():
+        if suppressed:
+            print(f"... {suppressed} mensagens '{key}' suprimidas desde a última exibição.")
+    _log_state.clear()
@@ -0,0 +1,416 @@
+import gzip
+import io
+import itertools
+import json
+import mmap
+import os
+import re
+import shutil
+
+try:
+    import zstandard
+except ImportError:  # zstd é opcional: sem o pacote, o pipeline lê e grava só gzip e arquivos sem compressão
+    zstandard = None
+
+# Tamanho do bloco lido do disco a cada iteração do parser incremental
+READ_CHUNK_SIZE = 1 << 16
+
+# Extensões aceitas pelas etapas do pipeline (sem compressão, gzip ou zstd)
+JSON_EXTENSIONS = ('.json', '.ndjson', '.json.gz', '.ndjson.gz', '.json.zst', '.ndjson.zst')
+
+# Compressões suportadas na escrita -> extensão adicionada ao nome do arquivo
+COMPRESSION_EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+COMPRESSIONS = ('gzip', 'zstd')
+
+# Bytes mágicos do início de cada formato: a leitura reconhece arquivos comprimidos mesmo sem a extensão
+COMPRESSION_MAGIC = {'gzip': b'\x1f\x8b', 'zstd': b'\x28\xb5\x2f\xfd'}
+
+# Níveis padrão: gzip 6 (o mesmo do módulo gzip da biblioteca padrão), zstd 3 (padrão da libzstd)
+DEFAULT_COMPRESSION_LEVELS = {'gzip': 6, 'zstd': 3}
+
+def compression_from_extension(path: str):
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if extension and path.endswith(extension):
+            return compression
+    return None
+
+def detect_compression(path: str):
+    # Pela extensão e, se ela não disser nada, pelos bytes mágicos do início do arquivo
+    compression = compression_from_extension(path)
+    if compression is not None:
+        return compression
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("Suporte a zstd requer o pacote 'zstandard' (pip install zstandard).")
+
+def open_binary(path: str, mode: str = 'rb', compression: str = None, level: int = None):
+    # Abre um arquivo binário descomprimindo/comprimindo em streaming, bloco a bloco. Sem compression
+    # explícita, a leitura detecta o formato e a escrita usa o da extensão.
+    if compression is None:
+        compression = detect_compression(path) if 'r' in mode else compression_from_extension(path)
+    level = level or DEFAULT_COMPRESSION_LEVELS.get(compression)
+
+    if compression == 'gzip':
+        return gzip.open(path, mode, compresslevel=level)
+    if compression == 'zstd':
+        _require_zstd()
+        raw = open(path, mode)
+        if 'r' in mode:
+            # read_across_frames: arquivos com vários frames concatenados (ver MemberWriter) são lidos inteiros
+            return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return zstandard.ZstdCompressor(level=level).stream_writer(raw, closefd=True)
+    return open(path, mode)
+
+def open_text(path: str, mode: str = 'r', compression: str = None, level: int = None):
+    # Abre um arquivo de texto UTF-8, comprimido (gzip ou zstd) ou não, com as mesmas regras de open_binary
+    if compression is None:
+        compression = detect_compression(path) if 'r' in mode else compression_from_extension(path)
+    if compression is None:
+        return open(path, mode, encoding='utf-8')
+    return io.TextIOWrapper(open_binary(path, mode + 'b', compression, level), encoding='utf-8')
+
+def compress_file(source_path: str, destination_path: str, compression: str, level: int = None):
+    # Comprime um arquivo em streaming para um temporário e publica com os.replace
+    temp_path = f"{destination_path}.tmp"
+    with open(source_path, 'rb') as source, open_binary(temp_path, 'wb', compression, level) as destination:
+        shutil.copyfileobj(source, destination, READ_CHUNK_SIZE)
+    os.replace(temp_path, destination_path)
+
+def _iter_json_array(f, chunk_size: int = READ_CHUNK_SIZE):
+    # Parser incremental de um array JSON: decodifica um elemento por vez sem carregar o arquivo inteiro
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    while True:
+        # Pula espaços e separadores entre os elementos do array
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+
+        if pos >= len(buffer):
+            if eof:
+                raise ValueError("Array JSON terminou sem o ']' de fechamento.")
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Elemento incompleto no buffer: lê mais um bloco e tenta de novo
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        # Um valor que não termina em um separador pode estar truncado (ex.: número cortado no meio do bloco)
+        if not eof and (end == len(buffer) or buffer[end] not in ' \t\r\n,]'):
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+
+        yield record
+        pos = end
+
+        # Descarta o que já foi consumido para manter a memória constante
+        if pos > chunk_size:
+            buffer, pos = buffer[pos:], 0
+
+def iter_json_records(f, chunk_size: int = READ_CHUNK_SIZE):
+    # Lê registros de um arquivo aberto em modo texto, um por vez.
+    # Aceita NDJSON (um objeto por linha) e o formato antigo (um único array JSON).
+    first_char = ''
+    while True:
+        first_char = f.read(1)
+        if not first_char or not first_char.isspace():
+            break
+
+    if not first_char:
+        return
+
+    if first_char == '[':
+        yield from _iter_json_array(f, chunk_size)
+        return
+
+    # NDJSON: a primeira linha já teve o primeiro caractere consumido
+    for line in itertools.chain([first_char + f.readline()], f):
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def iter_json_file(path: str):
+    # Atalho para ler os registros de um arquivo a partir do caminho
+    with open_text(path) as f:
+        yield from iter_json_records(f)
+
+# --- Leitura de um arquivo grande em trechos (um worker por trecho) ---
+
+# Primeiro caractere que não é espaço (decide entre NDJSON e array JSON)
+_FIRST_TOKEN = re.compile(rb'\S')
+# Fronteira candidata entre dois elementos de um array: '}' , '{'
+_ARRAY_BOUNDARY = re.compile(rb'\}\s*,\s*\{')
+
+def split_record_ranges(path: str, range_bytes: int, offset: int = None) -> list:
+    # Índice de fronteiras de registros de um arquivo sem compressão, via mmap: devolve trechos
+    # (início, fim) em bytes de cerca de range_bytes, cada um com registros inteiros, na ordem do arquivo.
+    # offset (fim de um trecho já processado) faz o índice começar nele em vez de no primeiro registro.
+    # Só as fronteiras dos trechos são procuradas (um find a partir de cada alvo), sem percorrer o arquivo.
+    # NDJSON: o trecho termina depois de um '\n' (uma string JSON não contém quebra de linha crua).
+    # Array JSON: o trecho termina em um '}' seguido de ',' e '{'. Em um elemento com lista de objetos essa
+    # fronteira pode cair dentro dele; os dois trechos vizinhos ficam desbalanceados e falham no parse,
+    # então quem divide deve reprocessar o arquivo inteiro quando algum trecho falhar.
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            first = _FIRST_TOKEN.search(mm)
+            if first is None:
+                return []
+            start = first.start()
+            end = size
+            is_array = mm[start:start + 1] == b'['
+            if is_array:
+                start = _FIRST_TOKEN.search(mm, start + 1).start()
+                end = mm.rfind(b']')
+                if mm[start:start + 1] == b']':
+                    return []
+            if offset is not None:
+                start = offset
+                if start >= end:
+                    return []
+
+            ranges = []
+            while end - start > range_bytes:
+                target = start + range_bytes
+                if is_array:
+                    boundary = _ARRAY_BOUNDARY.search(mm, target, end)
+                    if boundary is None:
+                        break
+                    range_end, next_start = boundary.start() + 1, boundary.end() - 1
+                else:
+                    newline = mm.find(b'\n', target, end)
+                    if newline < 0:
+                        break
+                    range_end = next_start = newline + 1
+                ranges.append((start, range_end))
+                start = next_start
+            ranges.append((start, end))
+            return ranges
+
+def is_json_array_file(path: str) -> bool:
+    # Formato antigo (um único array JSON) em vez de NDJSON
+    with open_text(path) as f:
+        first_char = f.read(1)
+        while first_char and first_char.isspace():
+            first_char = f.read(1)
+    return first_char == '['
+
+def iter_json_range(path: str, start: int, end: int):
+    # Registros de um trecho devolvido por split_record_ranges. NDJSON é lido linha a linha direto do
+    # mmap; um trecho de array é decodificado de uma vez (só o trecho, não o arquivo) e lido elemento a elemento.
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if _FIRST_TOKEN.search(mm).group() != b'[':
+            mm.seek(start)
+            while mm.tell() < end:
+                line = mm.readline().strip()
+                if line:
+                    yield json.loads(line)
+            return
+        text = mm[start:end].decode('utf-8')
+
+    decoder = json.JSONDecoder()
+    pos = 0
+    while True:
+        while pos < len(text) and text[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(text):
+            return
+        record, pos = decoder.raw_decode(text, pos)
+        yield record
+
+def iter_json_lines(path: str, byte_range: tuple = None):
+    # Linhas cruas (bytes, sem decodificar) de um arquivo NDJSON, ou só do trecho byte_range dele, para quem
+    # decodifica com o próprio backend JSON (ver event_decoder). Arrays JSON continuam com iter_json_file.
+    if byte_range is not None:
+        start, end = byte_range
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mm.seek(start)
+            while mm.tell() < end:
+                line = mm.readline().strip()
+                if line:
+                    yield line
+        return
+
+    with open_binary(path) as f:
+        # O leitor de zstd não lê linha a linha sozinho: o BufferedReader faz a divisão em linhas
+        lines = io.BufferedReader(f) if detect_compression(path) == 'zstd' else f
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line
+
+def dump_ndjson_record(record: dict) -> str:
+    # Serialização compacta (sem indentação) de um registro NDJSON
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+def encoded_size(line: str) -> int:
+    # Bytes da linha em UTF-8 (o que vai para o arquivo antes da compressão). Com ensure_ascii=False um
+    # caractere pode ocupar até 4 bytes; linhas só ASCII, o caso comum, não precisam ser codificadas.
+    return len(line) if line.isascii() else len(line.encode('utf-8'))
+
+class RotatingNdjsonWriter:
+    # Grava registros NDJSON em arquivos numerados (<prefixo>_00000.ndjson, _00001, ...),
+    # trocando de arquivo ao atingir max_events ou max_bytes (bytes antes da compressão).
+    # Cada arquivo é escrito com nome temporário oculto e só é renomeado quando fechado,
+    # então quem lista a pasta nunca enxerga um arquivo pela metade.
+    def __init__(self, directory: str, prefix: str, max_events: int = None, max_bytes: int = None,
+                 compression: str = None, first_sequence: int = 0):
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Compressão não suportada: {compression}")
+        self.directory = directory
+        self.prefix = prefix
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        if compression == 'zstd':
+            _require_zstd()
+        self.compression = compression
+        self.extension = ".ndjson" + COMPRESSION_EXTENSIONS[compression]
+        self.sequence = first_sequence
+        self.completed_files = []
+        self.total_events = 0
+        self._file = None
+        self._temp_path = None
+        self._file_events = 0
+        self._file_bytes = 0
+
+    def _current_path(self) -> str:
+        return os.path.join(self.directory, f"{self.prefix}_{self.sequence:05d}{self.extension}")
+
+    def _open(self):
+        self._temp_path = os.path.join(self.directory, f".{self.prefix}_{self.sequence:05d}{self.extension}.tmp")
+        # O nome temporário não termina em .gz/.zst, então a compressão é passada explicitamente
+        self._file = open_text(self._temp_path, 'w', self.compression)
+        self._file_events = 0
+        self._file_bytes = 0
+
+    def rotate(self):
+        # Fecha o arquivo atual (se houver algo nele) e publica com o nome definitivo
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        final_path = self._current_path()
+        os.replace(self._temp_path, final_path)
+        self.completed_files.append(final_path)
+        self.sequence += 1
+
+    def write(self, record: dict):
+        if self._file is None:
+            self._open()
+        line = dump_ndjson_record(record)
+        self._file.write(line)
+        self._file_events += 1
+        self._file_bytes += encoded_size(line)
+        self.total_events += 1
+
+        if (self.max_events and self._file_events >= self.max_events) or \
+           (self.max_bytes and self._file_bytes >= self.max_bytes):
+            self.rotate()
+
+    def close(self) -> list:
+        self.rotate()
+        return self.completed_files
+
+    def abort(self):
+        # Descarta o arquivo em andamento sem publicá-lo
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class MemberWriter:
+    # Saída de texto escrita em membros: cada membro é comprimido de forma independente (gzip e zstd
+    # aceitam membros/frames concatenados em um mesmo arquivo), então o trecho de um arquivo de origem
+    # com erro é descartado truncando o arquivo no início do seu membro, como em um arquivo sem compressão.
+    # write só existe com um membro aberto (begin). Com position, reabre um arquivo já escrito
+    # truncado nessa posição (um savepoint de begin) para continuar depois dele.
+    def __init__(self, path: str, compression: str = None, level: int = None, position: int = None):
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Compressão não suportada: {compression}")
+        if compression == 'zstd':
+            _require_zstd()
+        self.path = path
+        self.compression = compression
+        self.level = level or DEFAULT_COMPRESSION_LEVELS.get(compression)
+        if position is None:
+            self._raw = open(path, 'wb')
+        else:
+            self._raw = open(path, 'r+b')
+            self._raw.seek(position)
+            self._raw.truncate()
+        self._member = None
+
+    def _open_member(self):
+        if self.compression == 'gzip':
+            return gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=self.level)
+        if self.compression == 'zstd':
+            return zstandard.ZstdCompressor(level=self.level).stream_writer(self._raw, closefd=False)
+        return self._raw
+
+    def begin(self) -> int:
+        # Fecha o membro atual e abre outro; devolve a posição onde ele começa (savepoint)
+        self.end()
+        position = self._raw.tell()
+        self._member = io.TextIOWrapper(self._open_member(), encoding='utf-8')
+        self.write = self._member.write
+        return position
+
+    def end(self):
+        if self._member is None:
+            return
+        self._member.flush()
+        binary = self._member.detach()
+        if binary is not self._raw:
+            binary.close()  # grava o fim do membro comprimido sem fechar o arquivo
+        self._member = None
+        del self.write
+
+    def rollback_to(self, position: int):
+        self.end()
+        self._raw.seek(position)
+        self._raw.truncate()
+
+    def close(self):
+        self.end()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()